@@ -1,6 +1,7 @@
 import os
+import time
 from pathlib import Path
-from flask import Flask, send_from_directory, jsonify, abort
+from flask import Flask, send_from_directory, send_file, jsonify, abort, request, g
 from flask_cors import CORS
 
 BASE_DIR = Path(__file__).resolve().parent
@@ -21,80 +22,187 @@ except Exception as e:
     # log simples para facilitar debug se a importação falhar
     print("Falha ao importar blueprints de projeto.app.routes:", e)
 
-# Paths
+# Métricas no formato do Prometheus em /metrics (latência por rota + caminhos quentes)
+from projeto.app.routes import metrics as metrics_mod
+app.register_blueprint(metrics_mod.bp, url_prefix="/metrics")
+
+# Perfis cProfile opcionais (X-Profile: 1 / ?profile=1 / PROFILE_SAMPLE_RATE), salvos em runs/logs
+from projeto.app.routes import profiling as profiling_mod
+app.register_blueprint(profiling_mod.bp, url_prefix="/profiles")
+
+# Histórico indexado de treinos e predições (runs/history.sqlite)
+from projeto.app.routes import history as history_mod
+app.register_blueprint(history_mod.bp, url_prefix="/history")
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _observe_request_latency(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        # rótulo pelo padrão da rota (/predictions/<path:filename>), não pela URL, para não explodir a cardinalidade
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        metrics_mod.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started, route=route, method=request.method, status=response.status_code)
+    return response
+
+# Warm-up opcional do cache de modelos (MODEL_CACHE_WARMUP=1): pré-carrega custom/models em segundo plano.
+# Com `python app.py` (debug/reloader) só o processo filho carrega, para não duplicar memória no processo pai;
+# processos do pool de avaliação (spawn, __mp_main__) também não carregam.
+_is_reloader_parent = __name__ == "__main__" and os.environ.get("WERKZEUG_RUN_MAIN") != "true"
+if os.environ.get("MODEL_CACHE_WARMUP", "").lower() in ("1", "true", "yes"):
+    if not _is_reloader_parent and __name__ != "__mp_main__":
+        try:
+            from projeto.app.routes.model_cache import MODEL_CACHE
+            MODEL_CACHE.warm_up_async()
+        except Exception as e:
+            print("Falha ao iniciar warm-up do cache de modelos:", e)
+
+# Artefatos de predição: índice em memória das execuções (reescaneia só quando o mtime
+# da pasta muda), manifesto JSON por execução e miniaturas em cache
+from projeto.app.routes.run_index import get_run_index, RUN_PREFIX, PREDICTIONS_DIR
+
+# Histórico de execuções: abre o banco na inicialização; se estiver vazio, as execuções
+# anteriores são importadas em segundo plano (mesmas regras do warm-up acima)
+if not _is_reloader_parent and __name__ != "__mp_main__":
+    try:
+        from projeto.app.routes.history import get_history
+        get_history()
+    except Exception as e:
+        print("Falha ao abrir o histórico de execuções:", e)
+
+# Paths (a pasta de predições é a mesma usada pelo /predict/run)
 project_root = BASE_DIR
-predictions_dir = (project_root / "predictions").resolve()
-models_storage_dir = (project_root / "custom" / "models").resolve()
+predictions_dir = PREDICTIONS_DIR.resolve()
 
 predictions_dir.mkdir(parents=True, exist_ok=True)
 
-# Serve arquivos dentro de predictions
+from projeto.app.routes.run_manifest import ensure_manifest, MANIFEST_NAME
+from projeto.app.routes.thumbnails import get_thumbnail, normalize_width, source_tag, THUMB_EXT
+from projeto.app.routes.model_registry import get_registry
+run_index = get_run_index(predictions_dir)
+
+
+# Artefatos de uma execução não mudam depois de gravados: cache longo e imutável no navegador
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+
+def _send_artifact(path, etag, immutable):
+    # conditional=True: If-None-Match/If-Modified-Since -> 304 e Range -> 206
+    resp = send_file(str(path), conditional=True, etag=etag, max_age=0)
+    resp.headers["Cache-Control"] = IMMUTABLE_CACHE if immutable else "no-cache"
+    return resp
+
+
+# Serve arquivos dentro de predictions (?w=<largura> devolve uma miniatura em cache)
 @app.route("/predictions/<path:filename>")
 def serve_prediction_file(filename):
     file_path = predictions_dir / filename
-    if not file_path.exists():
+    # send_from_directory já barrava caminhos fora de predictions; mantém a mesma garantia
+    try:
+        file_path.resolve().relative_to(predictions_dir)
+    except ValueError:
+        abort(404)
+    if not file_path.is_file():
         abort(404)
-    return send_from_directory(str(predictions_dir), filename)
+    # manifest.json pode ser regerado; os demais artefatos de predicao_* são fixos
+    immutable = filename.startswith(RUN_PREFIX) and file_path.name != MANIFEST_NAME
+
+    width = request.args.get("w")
+    if width and file_path.suffix.lower() in THUMB_EXT:
+        try:
+            width = normalize_width(width)
+        except ValueError:
+            abort(400)
+        try:
+            thumb = get_thumbnail(file_path, width)
+        except ModuleNotFoundError:
+            # sem Pillow: serve o original
+            thumb = None
+        except Exception as e:
+            print(f"[WARNING] Falha ao gerar miniatura de {file_path}: {e}")
+            thumb = None
+        if thumb is not None:
+            return _send_artifact(thumb, thumb.stem, immutable)
+
+    return _send_artifact(file_path, source_tag(file_path), immutable)
+
+def _conditional_json(payload, etag):
+    """
+    JSON com ETag; se o cliente mandar If-None-Match igual, responde 304 sem corpo.
+    """
+    resp = jsonify(payload)
+    resp.set_etag(etag)
+    # força a revalidação a cada polling (o 304 é barato)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
+
+
+def _int_arg(name, default=None, minimum=0):
+    value = request.args.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return max(minimum, int(value))
+    except ValueError:
+        abort(400)
+
 
 # last prediction dir
 @app.route("/predictions/last_dir", methods=["GET"])
 def last_prediction_dir():
-    base = predictions_dir
-    if not base.exists() or not base.is_dir():
-        return jsonify({"last_dir": None, "subdirs": [], "full_paths": {}})
-    dirs = sorted(
-        [d for d in base.iterdir() if d.is_dir() and d.name.startswith("predicao_")],
-        key=lambda x: x.stat().st_mtime,
-        reverse=True
-    )
-    if not dirs:
-        return jsonify({"last_dir": None, "subdirs": [], "full_paths": {}})
-    last_dir = dirs[0]
-    subdirs = [d.name for d in last_dir.iterdir() if d.is_dir()]
-    full_paths = {d.name: str(d) for d in last_dir.iterdir() if d.is_dir()}
-    return jsonify({"last_dir": last_dir.name, "subdirs": subdirs, "full_paths": full_paths})
-
-# list runs
+    name, subdirs, etag = run_index.latest()
+    if name is None:
+        return _conditional_json({"last_dir": None, "subdirs": [], "full_paths": {}}, etag)
+    full_paths = {d: str(predictions_dir / name / d) for d in subdirs}
+    return _conditional_json({"last_dir": name, "subdirs": subdirs, "full_paths": full_paths}, etag)
+
+# list runs (?limit=&offset= para paginar; sem limit retorna todas)
 @app.route("/predictions/runs", methods=["GET"])
 def list_prediction_runs():
-    preds = predictions_dir
-    if not preds.exists() or not preds.is_dir():
-        return jsonify({"runs": []})
-    runs = []
-    try:
-        for d in preds.iterdir():
-            if d.is_dir() and d.name.startswith("predicao_"):
-                runs.append((d.name, d.stat().st_mtime))
-    except Exception:
-        return jsonify({"runs": []})
-    runs_sorted = [name for (name, _) in sorted(runs, key=lambda t: t[1], reverse=True)]
-    return jsonify({"runs": runs_sorted})
+    offset = _int_arg("offset", 0)
+    limit = _int_arg("limit", None, minimum=1)
+    runs, total, etag = run_index.list_runs(offset=offset, limit=limit)
+    payload = {"runs": runs, "total": total, "offset": offset, "limit": limit}
+    if limit is not None and offset + limit < total:
+        payload["next_offset"] = offset + limit
+    return _conditional_json(payload, f"{etag}-{offset}-{limit}")
 
 # list models inside run
 @app.route("/predictions/<run_name>/models", methods=["GET"])
 def list_models_in_run(run_name):
-    run_dir = (predictions_dir / run_name).resolve()
-    if not run_dir.exists() or not run_dir.is_dir():
+    if run_name in (".", ".."):
         return jsonify({"models": []})
-    models = []
-    try:
-        for p in run_dir.iterdir():
-            if p.is_dir():
-                models.append(p.name)
-    except Exception:
+    models, etag = run_index.models(run_name)
+    if models is None:
         return jsonify({"models": []})
-    return jsonify({"models": sorted(models)})
+    return _conditional_json({"models": models}, etag)
 
-# list models (from backend storage)
+# manifesto JSON dos artefatos da execução (gerado no fim do /predict/run; ?refresh=1 regera)
+@app.route("/predictions/<run_name>/manifest", methods=["GET"])
+def prediction_run_manifest(run_name):
+    run_dir = predictions_dir / run_name
+    if run_name in (".", "..") or not run_dir.is_dir():
+        abort(404)
+    refresh = request.args.get("refresh", "").lower() in ("1", "true", "yes")
+    target = ensure_manifest(run_dir, refresh=refresh)
+    # send_file com conditional: ETag/Last-Modified do arquivo e 304 para o polling
+    resp = send_file(str(target), mimetype="application/json", conditional=True, max_age=0)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+# list models (registro de custom/models + storage/models_yolo; detalhes em /predict/models)
 @app.route("/models", methods=["GET"])
 def list_models_root():
-    base = models_storage_dir
-    models = []
-    if base.exists():
-        try:
-            models = [f for f in sorted(os.listdir(base)) if os.path.isfile(os.path.join(base, f))]
-        except Exception:
-            models = []
+    try:
+        models = [m["name"] for m in get_registry().list()]
+    except Exception as e:
+        print(f"[WARNING] Falha ao consultar o registro de modelos: {e}")
+        models = []
     return jsonify({"models": models})
 
 # Serve frontend (build preferred, fallback public)
@@ -0,0 +1,231 @@
+import io
+import os
+import time
+import shutil
+from pathlib import Path
+
+from .synthetic import UPLOAD_DATASET, layout, jpeg_template, unique_image
+
+# ============================================================
+# 🔧 Casos de benchmark dos caminhos quentes do backend
+# ============================================================
+#
+# Cada caso roda num processo próprio (ver run.py), com cwd na pasta de
+# trabalho sintética e o Ultralytics falso no sys.path, e devolve um dict de
+# métricas: arquivos/s, percentis de latência (ms) e contagens. O pico de RSS
+# é medido pelo runner no fim do processo.
+
+
+def percentiles(samples_ms):
+    if not samples_ms:
+        return {}
+    ordered = sorted(samples_ms)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))], 3)
+
+    return {
+        "n": len(ordered),
+        "p50_ms": pick(50),
+        "p90_ms": pick(90),
+        "p99_ms": pick(99),
+        "mean_ms": round(sum(ordered) / len(ordered), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def _check(resp, expected=200):
+    if resp.status_code != expected:
+        raise RuntimeError(f"HTTP {resp.status_code}: {resp.get_data(as_text=True)[:300]}")
+    return resp
+
+
+def _reset(*paths):
+    for p in paths:
+        p = Path(p)
+        if p.is_dir():
+            shutil.rmtree(p)
+        elif p.exists():
+            p.unlink()
+
+
+def _cold_catalog():
+    # catálogo e cache de hashes em custom/cache: apagar força o scan + sha256 completos
+    for name in ("image_catalog.sqlite", "content_hashes.sqlite"):
+        for suffix in ("", "-wal", "-shm"):
+            _reset(Path("custom/cache") / f"{name}{suffix}")
+
+
+# ---------------------------------------
+# Casos
+# ---------------------------------------
+
+def case_negative_lines(client, ctx):
+    """GET /train/negative-lines: primeira chamada (catálogo frio) e chamadas seguintes."""
+    _cold_catalog()
+    started = time.perf_counter()
+    _check(client.get("/train/negative-lines"))
+    cold_s = time.perf_counter() - started
+    warm = timed(lambda: _check(client.get("/train/negative-lines")), ctx["repeat"])
+    files = ctx["data"]["catalog_files"]
+    return {
+        "cold_s": round(cold_s, 3),
+        "cold_files_per_s": round(files / cold_s, 1) if cold_s else None,
+        "warm": percentiles(warm),
+        "files": files,
+    }
+
+
+def case_conf_dataset(client, ctx):
+    """conf_dataset: build frio (catálogo + split + negativos + cópia) e reaproveitamento pela build_key."""
+    from projeto.app.routes.training import conf_dataset
+    from projeto.app.routes.dataset_build import read_build_info
+
+    _cold_catalog()
+    _reset("custom/datasets_custom")
+    upload = layout(".")["upload"]
+    config = {
+        "train_percent": 70, "val_percent": 20, "test_percent": 10, "seed": 1,
+        "types_to_include": ["Cone", "Hex Externo", "Hex Interno"],
+        "random_count": max(1, ctx["data"]["catalog_files"] // 200),
+        "materialize_mode": ctx.get("materialize_mode", "copy"),
+    }
+    started = time.perf_counter()
+    out = conf_dataset(dict(config), str(upload))
+    cold_s = time.perf_counter() - started
+    info = read_build_info(out) or {}
+    files = sum(1 for _root, _dirs, fs in os.walk(out) for f in fs if f.lower().endswith(".jpg"))
+    reuse = timed(lambda: conf_dataset(dict(config), str(upload)), max(1, ctx["repeat"] // 4))
+    _reset("custom/datasets_custom")
+    return {
+        "cold_s": round(cold_s, 3),
+        "files": files,
+        "files_per_s": round(files / cold_s, 1) if cold_s else None,
+        "strategy": info.get("strategy"),
+        "reuse": percentiles(reuse),
+    }
+
+
+def case_upload_folder(client, ctx):
+    """POST /train/upload-folder em lotes (multipart), com dedup por sha256 ligado."""
+    dataset = "BENCH-UP"
+    _reset(Path("custom/upload_folder_image/uploads") / dataset)
+    total = min(ctx["data"]["upload_files"], ctx.get("upload_limit", 5000))
+    batch = ctx.get("upload_batch", 200)
+    template = jpeg_template()
+    start_index = 10 ** 9
+    samples = []
+    sent_bytes = 0
+    started = time.perf_counter()
+    for offset in range(0, total, batch):
+        count = min(batch, total - offset)
+        files = []
+        for i in range(count):
+            payload = unique_image(template, start_index + offset + i)
+            sent_bytes += len(payload)
+            files.append((io.BytesIO(payload), f"{dataset}/up_{offset + i:07d}.jpg"))
+        t0 = time.perf_counter()
+        _check(client.post("/train/upload-folder", data={"dataset_name": dataset, "dedup": "sha256", "files": files},
+                           content_type="multipart/form-data"))
+        samples.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - started
+    _reset(Path("custom/upload_folder_image/uploads") / dataset)
+    return {
+        "files": total,
+        "batch": batch,
+        "files_per_s": round(total / elapsed, 1) if elapsed else None,
+        "mb_per_s": round(sent_bytes / elapsed / 1e6, 2) if elapsed else None,
+        "request": percentiles(samples),
+    }
+
+
+def case_dataset_info(client, ctx):
+    """GET /train/dataset-info/<upload>: contagem de imagens do upload."""
+    url = f"/train/dataset-info/{UPLOAD_DATASET}"
+    count = _check(client.get(url)).get_json()["count"]
+    samples = timed(lambda: _check(client.get(url)), ctx["repeat"])
+    stats = percentiles(samples)
+    return {
+        "files": count,
+        "files_per_s": round(count / (stats["p50_ms"] / 1000), 1) if stats.get("p50_ms") else None,
+        "request": stats,
+    }
+
+
+def case_log_stream(client, ctx):
+    """GET /train/logs/<job> (SSE): replay do buffer de um job encerrado para vários assinantes."""
+    from projeto.app.routes.training import LOGS_DIR
+    from projeto.app.routes.log_broadcast import LOG_BROADCASTS
+
+    lines = ctx.get("log_lines", 20000)
+    job_id = "bench_log_job"
+    LOGS_DIR.mkdir(parents=True, exist_ok=True)
+    log_path = LOGS_DIR / f"{job_id}.log"
+    _reset(log_path)
+    broadcaster = LOG_BROADCASTS.get(job_id, log_path)
+    started = time.perf_counter()
+    for i in range(lines):
+        broadcaster.write(f"Epoch {i // 100 + 1}/100  loss=0.{i % 1000:03d}  top1=0.9  {'#' * 40}\n")
+    write_s = time.perf_counter() - started
+    LOG_BROADCASTS.close(job_id)
+
+    received = []
+
+    def subscribe():
+        body = client.get(f"/train/logs/{job_id}?from=0").get_data(as_text=True)
+        received.append(body.count("\ndata: "))
+
+    samples = timed(subscribe, ctx.get("log_subscribers", 4))
+    stats = percentiles(samples)
+    _reset(log_path)
+    return {
+        "lines": lines,
+        "write_lines_per_s": round(lines / write_s, 1) if write_s else None,
+        "replay_lines_per_s": round(lines / (stats["p50_ms"] / 1000), 1) if stats.get("p50_ms") else None,
+        "received_lines": min(received) if received else 0,
+        "subscriber": stats,
+    }
+
+
+def case_run_predict(client, ctx):
+    """POST /predict/run com o YOLO falso no dataset sintético (registro, avaliação, manifesto)."""
+    from projeto.app.routes.model_cache import MODELS_DIR
+
+    # o registro só aceita pesos das pastas de modelos (caminhos arbitrários são recusados)
+    MODELS_DIR.mkdir(parents=True, exist_ok=True)
+    model = MODELS_DIR / "bench_model.pt"
+    model.write_bytes(b"bench-weights" * 1024)
+    payload = {"models": [str(model)], "options": {"path": str(layout(".")["yolo"].resolve())}}
+    runs = []
+
+    def call():
+        body = _check(client.post("/predict/run", json=payload)).get_json()
+        runs.append(body.get("run"))
+
+    samples = timed(call, max(1, ctx["repeat"] // 2))
+    from projeto.app.routes.run_index import PREDICTIONS_DIR
+
+    for run in runs:
+        if run:
+            _reset(PREDICTIONS_DIR / run)
+    _reset(model)
+    return {"request": percentiles(samples), "test_images": ctx["data"]["yolo_files"]}
+
+
+CASES = {
+    "negative_lines": case_negative_lines,
+    "conf_dataset": case_conf_dataset,
+    "upload_folder": case_upload_folder,
+    "dataset_info": case_dataset_info,
+    "log_stream": case_log_stream,
+    "run_predict": case_run_predict,
+}
@@ -0,0 +1,72 @@
+import sys
+import json
+import argparse
+
+# ============================================================
+# 🔧 Comparação de dois resultados de benchmark (JSON do run.py)
+# ============================================================
+#
+#   python -m benchmarks.compare benchmarks/results/antes.json benchmarks/results/depois.json
+#
+# Lista cada métrica numérica presente nos dois arquivos com a variação em %.
+# Métricas em que "maior é melhor" (arquivos/s, linhas/s, MB/s) aparecem com o
+# sinal invertido na coluna de piora, para que regressões fiquem sempre positivas.
+
+HIGHER_IS_BETTER = ("_per_s", "mb_per_s")
+
+
+def _flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(f"{prefix}.{k}" if prefix else k, v, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+    return out
+
+
+def compare(old, new, threshold=10.0):
+    """
+    [(métrica, antes, depois, variação %, regressão?)] para as métricas dos casos em comum.
+    """
+    rows = []
+    for case in sorted(set(old.get("cases", {})) & set(new.get("cases", {}))):
+        a = _flatten(case, old["cases"][case], {})
+        b = _flatten(case, new["cases"][case], {})
+        for key in sorted(set(a) & set(b)):
+            before, after = a[key], b[key]
+            if before == 0:
+                continue
+            change = (after - before) / abs(before) * 100
+            worse = -change if key.endswith(HIGHER_IS_BETTER) else change
+            tracked = key.endswith(HIGHER_IS_BETTER) or key.endswith(("_ms", "_s", "_mb"))
+            rows.append((key, before, after, round(change, 1), tracked and worse > threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara dois resultados de benchmark.")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="piora (%%) marcada como regressão")
+    args = parser.parse_args(argv)
+
+    with open(args.before, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.after, "r", encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"antes:  {old['meta'].get('commit', '')[:10]} ({old['meta'].get('created_at')})")
+    print(f"depois: {new['meta'].get('commit', '')[:10]} ({new['meta'].get('created_at')})\n")
+    rows = compare(old, new, args.threshold)
+    width = max((len(r[0]) for r in rows), default=10)
+    regressions = 0
+    for key, before, after, change, regression in rows:
+        flag = "  <-- regressão" if regression else ""
+        regressions += regression
+        print(f"{key:<{width}}  {before:>12.3f}  {after:>12.3f}  {change:>+8.1f}%{flag}")
+    print(f"\n{regressions} regressão(ões) acima de {args.threshold}%")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+from pathlib import Path
+from datetime import datetime
+
+# ============================================================
+# 🔧 Runner dos benchmarks
+# ============================================================
+#
+#   python -m benchmarks.run --files 10000                 # todos os casos
+#   python -m benchmarks.run --files 100000 --cases conf_dataset,negative_lines
+#   python -m benchmarks.compare antes.json depois.json
+#
+# Os dados sintéticos ficam em --workdir (padrão: <tmp>/implant_bench_<files>) e
+# são reaproveitados entre execuções da mesma escala. Cada caso roda num
+# subprocesso (cwd = workdir, benchmarks/stub no PYTHONPATH) para que o pico de
+# RSS seja só dele. O resultado vai para benchmarks/results/<data>_<commit>.json.
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+STUB_DIR = Path(__file__).resolve().parent / "stub"
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def peak_rss_mb():
+    """
+    Pico de memória residente do processo atual (None se a plataforma não expõe).
+    """
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return round(psutil.Process().memory_info().peak_wset / 1e6, 1)
+        except Exception:
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KiB; macOS, bytes
+    return round(peak / 1e6 if sys.platform == "darwin" else peak * 1024 / 1e6, 1)
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True, timeout=30).stdout.strip()
+    except Exception:
+        return ""
+
+
+def _run_child(case, workdir, data, options, result_path):
+    """
+    Executado dentro do subprocesso: importa o app com cwd na pasta sintética e roda um caso.
+    """
+    os.chdir(workdir)
+    from .cases import CASES
+
+    rss_before_import = peak_rss_mb()
+    import app as app_module
+
+    client = app_module.app.test_client()
+    rss_after_import = peak_rss_mb()
+    ctx = {"data": data, **options}
+    started = time.perf_counter()
+    metrics = CASES[case](client, ctx)
+    metrics["wall_s"] = round(time.perf_counter() - started, 3)
+    metrics["peak_rss_mb"] = peak_rss_mb()
+    metrics["import_rss_mb"] = rss_after_import
+    metrics["baseline_rss_mb"] = rss_before_import
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(metrics, f)
+
+
+def run_case(case, workdir, data, options, verbose=False):
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+        result_path = tmp.name
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([str(STUB_DIR), str(REPO_ROOT)] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else []))
+    env.setdefault("TRAIN_LOG_BUFFER_LINES", str(options.get("log_lines", 20000)))
+    env["MODEL_CACHE_WARMUP"] = "0"
+    cmd = [
+        sys.executable, "-m", "benchmarks.run", "--child", case,
+        "--workdir", str(workdir), "--child-data", json.dumps(data),
+        "--child-options", json.dumps(options), "--child-result", result_path,
+    ]
+    proc = subprocess.run(cmd, cwd=REPO_ROOT, env=env, capture_output=not verbose, text=True)
+    try:
+        if proc.returncode != 0:
+            tail = (proc.stderr or "")[-2000:] if not verbose else ""
+            return {"error": f"exit {proc.returncode}", "stderr": tail}
+        with open(result_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.unlink(result_path)
+
+
+def main(argv=None):
+    from .cases import CASES
+    from .synthetic import generate
+
+    parser = argparse.ArgumentParser(description="Benchmarks dos caminhos quentes do backend.")
+    parser.add_argument("--files", type=int, default=10000, help="total de arquivos sintéticos (10k a 1M)")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"casos separados por vírgula ({', '.join(CASES)})")
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--repeat", type=int, default=20, help="requisições por caso nas medidas de latência")
+    parser.add_argument("--upload-limit", type=int, default=5000)
+    parser.add_argument("--upload-batch", type=int, default=200)
+    parser.add_argument("--log-lines", type=int, default=20000)
+    parser.add_argument("--log-subscribers", type=int, default=4)
+    parser.add_argument("--materialize-mode", default="copy")
+    parser.add_argument("--out", default=None, help="arquivo JSON de saída")
+    parser.add_argument("--verbose", action="store_true", help="mostra a saída do backend")
+    # uso interno (subprocesso de cada caso)
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--child-data", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--child-options", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--child-result", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        _run_child(args.child, args.workdir, json.loads(args.child_data), json.loads(args.child_options), args.child_result)
+        return 0
+
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        parser.error(f"casos desconhecidos: {', '.join(unknown)}")
+
+    workdir = Path(args.workdir or Path(tempfile.gettempdir()) / f"implant_bench_{args.files}").resolve()
+    print(f"[INFO] Gerando/validando dados sintéticos em {workdir} ({args.files} arquivos)...")
+    data = generate(workdir, args.files)
+    print(f"[INFO] Dados prontos: {data['total_files']} arquivos (geração: {data['generate_s']}s)")
+
+    options = {
+        "repeat": args.repeat,
+        "upload_limit": args.upload_limit,
+        "upload_batch": args.upload_batch,
+        "log_lines": args.log_lines,
+        "log_subscribers": args.log_subscribers,
+        "materialize_mode": args.materialize_mode,
+    }
+    commit = _git("rev-parse", "HEAD")
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "commit": commit,
+            "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "files": args.files,
+            "data": data,
+            "options": options,
+        },
+        "cases": {},
+    }
+
+    for case in cases:
+        print(f"[INFO] Rodando {case}...")
+        result = run_case(case, workdir, data, options, verbose=args.verbose)
+        report["cases"][case] = result
+        if "error" in result:
+            print(f"[ERROR] {case}: {result['error']}\n{result.get('stderr', '')}")
+        else:
+            print(f"[INFO] {case}: {json.dumps(result, ensure_ascii=False)}")
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{(commit or 'nogit')[:10]}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[INFO] Resultados salvos em {out}")
+    return 1 if any("error" in r for r in report["cases"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import os
+import shutil
+import time
+
+# ============================================================
+# 🔧 Ultralytics falso para os benchmarks
+# ============================================================
+#
+# Só entra no sys.path dos processos de benchmark (benchmarks/stub). Imita a
+# superfície usada pelo backend (YOLO(...).val/predict/export/train) sem torch:
+# o val percorre as imagens do split e grava os mesmos artefatos do Ultralytics,
+# então o custo medido é o do backend (I/O, rotas, cache), não o do modelo.
+# BENCH_STUB_FORWARD_MS simula o tempo de um forward por lote (padrão 0).
+
+_PNG = (
+    b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x00\x00\x00\x00:~\x9bU"
+    b"\x00\x00\x00\nIDATx\x9cc`\x00\x00\x00\x02\x00\x01H\xaf\xa4q\x00\x00\x00\x00IEND\xaeB`\x82"
+)
+_ARTIFACTS = ("confusion_matrix.png", "confusion_matrix_normalized.png", "val_batch0_labels.jpg", "val_batch0_pred.jpg")
+
+
+def _forward_delay():
+    try:
+        ms = float(os.environ.get("BENCH_STUB_FORWARD_MS", "0") or 0)
+    except ValueError:
+        ms = 0.0
+    if ms > 0:
+        time.sleep(ms / 1000.0)
+
+
+class _Probs:
+    def __init__(self, data):
+        self.data = data
+        self.top1 = max(range(len(data)), key=lambda i: data[i])
+
+
+class _Result:
+    def __init__(self, names):
+        values = [1.0 / (len(names) + 1)] * len(names)
+        values[0] += 1.0 / (len(names) + 1)
+        self.probs = _Probs(values)
+        self.names = names
+
+
+class _Metrics:
+    def __init__(self, images):
+        self.top1 = 0.5
+        self.top5 = 1.0
+        self.images = images
+        self.results_dict = {"metrics/accuracy_top1": self.top1, "metrics/accuracy_top5": self.top5}
+
+
+class YOLO:
+    def __init__(self, model="yolo11n-cls.pt", task=None, verbose=False):
+        self.model_path = str(model)
+        self.task = task or "classify"
+        self.names = {0: "CM", 1: "HE", 2: "HI"}
+
+    def val(self, data=None, split="val", project="runs/classify", name="val", **kwargs):
+        split_dir = os.path.join(str(data), split)
+        if not os.path.isdir(split_dir) and split == "val":
+            split_dir = os.path.join(str(data), "valid")
+        images = 0
+        for _root, _dirs, files in os.walk(split_dir):
+            images += len(files)
+        _forward_delay()
+        save_dir = os.path.join(str(project), str(name))
+        os.makedirs(save_dir, exist_ok=True)
+        for artifact in _ARTIFACTS:
+            with open(os.path.join(save_dir, artifact), "wb") as f:
+                f.write(_PNG)
+        return _Metrics(images)
+
+    def predict(self, source=None, **kwargs):
+        items = source if isinstance(source, (list, tuple)) else [source]
+        _forward_delay()
+        return [_Result(self.names) for _ in items]
+
+    def export(self, format="onnx", imgsz=224, **kwargs):
+        base = os.path.splitext(self.model_path)[0]
+        if format == "openvino":
+            out = f"{base}_openvino_model"
+            os.makedirs(out, exist_ok=True)
+            return out
+        out = f"{base}.{format}"
+        shutil.copyfile(self.model_path, out)
+        return out
+
+    def train(self, **kwargs):
+        return _Metrics(0)
@@ -0,0 +1,133 @@
+import io
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+# ============================================================
+# 🔧 Gerador de dados sintéticos para os benchmarks
+# ============================================================
+#
+# Reproduz, numa pasta de trabalho, o layout que o backend lê:
+#   projeto/app/storage/imagens_implates/<TIPO>/<LINHA>/*.jpg   (negativos / catálogo)
+#   projeto/app/storage/datasets_yolo/CM/01/<split>/<classe>/*.jpg (avaliação)
+#   custom/upload_folder_image/uploads/BENCH-POS/*.jpg          (upload do usuário)
+# Todos os arquivos são o mesmo JPEG pequeno com um sufixo único depois do EOI:
+# continuam decodificáveis, mas têm sha256 distintos (o dedup não os descarta).
+# Gerar 1M de arquivos leva alguns minutos; o marcador .bench_data.json evita
+# regerar quando a pasta já tem a mesma escala.
+
+TYPES = ("CM", "HE", "HI")
+SPLITS = (("train", 0.7), ("valid", 0.2), ("test", 0.1))
+UPLOAD_DATASET = "BENCH-POS"
+MARKER = ".bench_data.json"
+
+# Fração do total de arquivos em cada área
+SHARE_CATALOG = 0.6
+SHARE_YOLO = 0.2
+SHARE_UPLOAD = 0.2
+
+
+def jpeg_template(size=32):
+    """
+    JPEG mínimo válido (Pillow se disponível; senão um cabeçalho JFIF basta para o stub).
+    """
+    try:
+        from PIL import Image
+    except ModuleNotFoundError:
+        return b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00\xff\xd9"
+    buf = io.BytesIO()
+    Image.new("L", (size, size), 128).save(buf, format="JPEG", quality=75)
+    return buf.getvalue()
+
+
+def unique_image(template, index):
+    return template + index.to_bytes(8, "little")
+
+
+def _write_many(folder, prefix, count, template, start):
+    folder.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        with open(folder / f"{prefix}_{i:07d}.jpg", "wb") as f:
+            f.write(unique_image(template, start + i))
+    return start + count
+
+
+def layout(workdir):
+    root = Path(workdir)
+    return {
+        "catalog": root / "projeto" / "app" / "storage" / "imagens_implates",
+        "yolo": root / "projeto" / "app" / "storage" / "datasets_yolo" / "CM" / "01",
+        "upload": root / "custom" / "upload_folder_image" / "uploads" / UPLOAD_DATASET,
+    }
+
+
+def generate(workdir, files=10000, lines_per_type=12, classes=3, force=False):
+    """
+    Gera ~`files` imagens em workdir. Retorna o resumo (contagens por área).
+    """
+    workdir = Path(workdir)
+    marker = workdir / MARKER
+    spec = {"files": int(files), "lines_per_type": lines_per_type, "classes": classes}
+    if marker.exists() and not force:
+        try:
+            info = json.loads(marker.read_text())
+            if info.get("spec") == spec:
+                return info
+        except ValueError:
+            pass
+
+    import shutil
+    for path in layout(workdir).values():
+        if path.exists():
+            shutil.rmtree(path)
+
+    started = time.perf_counter()
+    template = jpeg_template()
+    paths = layout(workdir)
+    counter = 0
+
+    # catálogo: TIPOS x LINHAS
+    catalog_files = int(files * SHARE_CATALOG)
+    per_line = max(1, catalog_files // (len(TYPES) * lines_per_type))
+    for tipo in TYPES:
+        for line in range(lines_per_type):
+            counter = _write_many(paths["catalog"] / tipo / f"{tipo}-LINHA-{line:02d}", "img", per_line, template, counter)
+    catalog_total = per_line * len(TYPES) * lines_per_type
+
+    # dataset YOLO: split/classe
+    yolo_files = int(files * SHARE_YOLO)
+    yolo_total = 0
+    for split, share in SPLITS:
+        per_class = max(1, int(yolo_files * share) // classes)
+        for c in range(classes):
+            counter = _write_many(paths["yolo"] / split / f"CM-CLASSE-{c}", split, per_class, template, counter)
+            yolo_total += per_class
+
+    # upload plano (entrada do conf_dataset)
+    upload_total = max(1, int(files * SHARE_UPLOAD))
+    counter = _write_many(paths["upload"], "pos", upload_total, template, counter)
+
+    info = {
+        "spec": spec,
+        "catalog_files": catalog_total,
+        "yolo_files": yolo_total,
+        "upload_files": upload_total,
+        "total_files": catalog_total + yolo_total + upload_total,
+        "bytes_per_file": len(template) + 8,
+        "generate_s": round(time.perf_counter() - started, 2),
+    }
+    workdir.mkdir(parents=True, exist_ok=True)
+    marker.write_text(json.dumps(info, indent=2))
+    return info
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos para os benchmarks.")
+    parser.add_argument("workdir")
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+    print(json.dumps(generate(args.workdir, args.files, force=args.force), indent=2))
+    sys.exit(0)
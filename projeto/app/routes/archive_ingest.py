@@ -0,0 +1,235 @@
+import os
+import hashlib
+import stat
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+from .chunked_upload import UploadError, upload_target, PART_SUFFIX
+from .image_catalog import IMG_EXT
+from .content_hash import admit_incoming, get_hash_cache
+
+# ============================================================
+# 🔧 Ingestão de datasets compactados (zip / tar / tar.gz / tar.bz2 / tar.xz)
+# ============================================================
+#
+# O tar é lido em modo stream ('r|*'): cada membro é extraído assim que chega,
+# sem guardar o arquivo inteiro. O zip precisa do diretório central no fim do
+# arquivo, então o corpo é copiado em blocos para um temporário em disco antes
+# da extração. Os caminhos passam pelas mesmas regras do upload de pastas
+# (upload_target: secure_filename + checagem de path traversal) e só imagens
+# são gravadas.
+# A extração é tudo ou nada: os membros vão primeiro para uma pasta de staging
+# (<uploads>/.ingest_*) e só entram no dataset depois que o arquivo inteiro foi
+# lido sem erro. Um 413 ou um membro corrompido no meio não deixa nada no dataset.
+
+
+def _max_bytes_from_env():
+    value = os.environ.get("UPLOAD_ARCHIVE_MAX_MB")
+    try:
+        mb = int(value) if value else 10240
+    except ValueError:
+        print(f"[WARNING] UPLOAD_ARCHIVE_MAX_MB='{value}' inválido. Usando 10240.")
+        mb = 10240
+    return mb * 1024 * 1024 if mb > 0 else None
+
+
+# Limite do total descompactado (proteção contra zip bomb); 0 desliga
+MAX_EXTRACTED_BYTES = _max_bytes_from_env()
+
+COPY_BUFFER = 1024 * 1024
+ZIP_MAGIC = b"PK\x03\x04"
+
+
+def detect_format(filename, head):
+    """
+    'zip' ou 'tar' a partir do nome e/ou dos primeiros bytes do corpo.
+    """
+    name = (filename or "").lower()
+    if name.endswith(".zip") or head.startswith(ZIP_MAGIC):
+        return "zip"
+    if name.endswith((".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")):
+        return "tar"
+    # gzip / bzip2 / xz / tar "ustar" no offset 257
+    if head[:2] == b"\x1f\x8b" or head[:3] == b"BZh" or head[:6] == b"\xfd7zXZ\x00" or head[257:262] == b"ustar":
+        return "tar"
+    return None
+
+
+def _is_junk(name):
+    base = os.path.basename(name.rstrip("/"))
+    return "__MACOSX/" in name or base.startswith("._") or base in (".DS_Store", "Thumbs.db")
+
+
+class _Stats:
+    def __init__(self):
+        self.extracted = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.duplicates = []
+        self.rejected = []
+        self.by_folder = {}
+        # (nome no arquivo, caminho no staging, destino, sha256, bytes)
+        self.staged = []
+        self.staged_bytes = 0
+
+    def as_dict(self):
+        return {
+            "extracted": self.extracted,
+            "bytes": self.bytes,
+            "skipped_non_images": self.skipped,
+            "duplicates": len(self.duplicates),
+            "duplicate_examples": self.duplicates[:50],
+            "rejected": self.rejected,
+            "by_folder": self.by_folder,
+        }
+
+
+class _PrefixedStream:
+    """
+    Devolve os bytes já lidos para detectar o formato antes do resto do stream.
+    """
+
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
+
+    def read(self, size=-1):
+        if self.head:
+            if size is None or size < 0:
+                data, self.head = self.head + self.stream.read(), b""
+                return data
+            data, self.head = self.head[:size], self.head[size:]
+            if len(data) < size:
+                data += self.stream.read(size - len(data))
+            return data
+        return self.stream.read(size)
+
+
+def _write_member(src, name, base_root, safe_dataset, stats, staging):
+    """
+    Grava um membro no staging (o limite de UPLOAD_ARCHIVE_MAX_MB conta tudo o
+    que foi descompactado, inclusive duplicatas).
+    """
+    if _is_junk(name) or os.path.splitext(name)[1].lower() not in IMG_EXT:
+        stats.skipped += 1
+        return
+    try:
+        target = upload_target(base_root, safe_dataset, name)
+    except UploadError as e:
+        stats.rejected.append({"file": name, "error": str(e)})
+        return
+
+    part = os.path.join(staging, f"{len(stats.staged)}{PART_SUFFIX}")
+    written = 0
+    digest = hashlib.sha256()
+    try:
+        with open(part, "wb") as out:
+            for chunk in iter(lambda: src.read(COPY_BUFFER), b""):
+                written += len(chunk)
+                if MAX_EXTRACTED_BYTES and stats.staged_bytes + written > MAX_EXTRACTED_BYTES:
+                    raise UploadError("Conteúdo descompactado excede UPLOAD_ARCHIVE_MAX_MB.", status=413)
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+    stats.staged.append((name, part, target, digest.hexdigest(), written))
+    stats.staged_bytes += written
+
+
+def _commit(base_root, safe_dataset, stats, dedup=None):
+    """
+    Move os membros do staging para o dataset, na ordem do arquivo. Com dedup,
+    o mesmo conteúdo já presente no dataset (ou antes no próprio arquivo) é
+    descartado sem entrar no dataset.
+    """
+    root = os.path.join(base_root, safe_dataset)
+    for name, part, target, sha256, written in stats.staged:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        original = admit_incoming(dedup, root, part, target, sha256)
+        if original is not None:
+            stats.duplicates.append({"file": name, "duplicate_of": original})
+            continue
+        stats.extracted += 1
+        stats.bytes += written
+        folder = os.path.relpath(os.path.dirname(target), base_root).replace("\\", "/")
+        stats.by_folder[folder] = stats.by_folder.get(folder, 0) + 1
+
+
+def _extract_tar(stream, base_root, safe_dataset, stats, staging):
+    try:
+        with tarfile.open(fileobj=stream, mode="r|*") as tar:
+            for member in tar:
+                # só arquivos regulares: links, devices e fifos são ignorados
+                if member.isdir():
+                    continue
+                if not member.isfile():
+                    stats.rejected.append({"file": member.name, "error": "Tipo de membro não suportado."})
+                    continue
+                src = tar.extractfile(member)
+                if src is not None:
+                    _write_member(src, member.name, base_root, safe_dataset, stats, staging)
+    except tarfile.TarError as e:
+        raise UploadError(f"Arquivo tar inválido: {e}")
+
+
+def _extract_zip(stream, base_root, safe_dataset, stats, staging):
+    with tempfile.TemporaryFile(prefix="upload_archive_") as spool:
+        shutil.copyfileobj(stream, spool, COPY_BUFFER)
+        spool.seek(0)
+        try:
+            archive = zipfile.ZipFile(spool)
+        except zipfile.BadZipFile as e:
+            raise UploadError(f"Arquivo zip inválido: {e}")
+        with archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                if stat.S_ISLNK(info.external_attr >> 16):
+                    stats.rejected.append({"file": info.filename, "error": "Links simbólicos não são aceitos."})
+                    continue
+                try:
+                    with archive.open(info) as src:
+                        _write_member(src, info.filename, base_root, safe_dataset, stats, staging)
+                except zipfile.BadZipFile as e:
+                    raise UploadError(f"Arquivo zip inválido: {e}")
+
+
+def ingest_archive(stream, filename, base_root, safe_dataset, dedup=None):
+    """
+    Extrai um zip/tar vindo de `stream` para base_root/<safe_dataset>/...
+    Com `dedup` (DuplicateIndex do dataset), imagens de conteúdo repetido são descartadas.
+    Se a extração falhar no meio (UploadError, arquivo corrompido), nada é gravado no dataset.
+    Retorna as contagens (extraídos, ignorados, duplicados, rejeitados, por pasta).
+    """
+    head = b""
+    while len(head) < 512:
+        chunk = stream.read(512 - len(head))
+        if not chunk:
+            break
+        head += chunk
+    kind = detect_format(filename, head)
+    if kind is None:
+        raise UploadError("Formato não suportado: envie .zip, .tar, .tar.gz, .tar.bz2 ou .tar.xz.", status=415)
+
+    stats = _Stats()
+    body = _PrefixedStream(head, stream)
+    os.makedirs(base_root, exist_ok=True)
+    # mesmo disco que o dataset: entrar no dataset é só um os.replace por arquivo
+    staging = tempfile.mkdtemp(prefix=".ingest_", dir=base_root)
+    try:
+        if kind == "zip":
+            _extract_zip(body, base_root, safe_dataset, stats, staging)
+        else:
+            _extract_tar(body, base_root, safe_dataset, stats, staging)
+        _commit(base_root, safe_dataset, stats, dedup)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+        if dedup is not None and dedup.mode != "off":
+            get_hash_cache().flush()
+    result = stats.as_dict()
+    result["format"] = kind
+    return result
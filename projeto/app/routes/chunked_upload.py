@@ -0,0 +1,168 @@
+import os
+import hashlib
+import threading
+
+from werkzeug.utils import secure_filename
+
+# ============================================================
+# 🔧 Upload de datasets em blocos (retomável)
+# ============================================================
+#
+# Protocolo usado pelo frontend (api.js -> uploadDatasetChunked):
+#   1. POST /train/upload/init com a lista {path, size, sha256} dos arquivos;
+#      o servidor responde, para cada um, se já está completo (pula), parcial
+#      (retoma do offset) ou novo.
+#   2. PUT /train/upload/chunk com os bytes de um bloco no corpo; o bloco é
+#      gravado direto em <destino>.part no offset informado, sem multipart.
+#   3. Quando o .part atinge o tamanho total, o sha256 é conferido e o arquivo
+#      é renomeado para o destino final. Com dedup, o arquivo montado passa antes
+#      pelo índice de conteúdo do dataset: duplicata não entra no dataset.
+
+
+def uploads_root():
+    """
+    Raiz dos uploads (custom/upload_folder_image/uploads), criada se necessário.
+    """
+    base_root = os.path.abspath(os.path.join(os.getcwd(), 'custom', 'upload_folder_image', 'uploads'))
+    os.makedirs(base_root, exist_ok=True)
+    return base_root
+
+
+PART_SUFFIX = '.part'
+COPY_BUFFER = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Erro do protocolo de upload; `status` é o código HTTP sugerido."""
+
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+def upload_target(base_root, safe_dataset, filename):
+    """
+    Caminho final de um arquivo enviado (mesma regra do /train/upload-folder):
+    partes do caminho relativo passam por secure_filename, '..' é descartado e
+    o nome do dataset é prefixado se ainda não for a pasta de topo.
+    """
+    rel = (filename or '').replace('\\', '/').lstrip('/')
+    parts = [p for p in rel.split('/') if p and p != '..']
+
+    if not parts:
+        # fallback simple filename
+        fname = secure_filename(filename or '') or 'file'
+        return os.path.join(base_root, fname) if not safe_dataset else os.path.join(base_root, safe_dataset, fname)
+
+    # If frontend provided dataset_name and the uploaded relative path already includes it as top folder,
+    # do not duplicate the folder name. Otherwise, prefix with dataset_name so files land under uploads/<dataset_name>/...
+    if safe_dataset:
+        target_parts = parts if parts[0] == safe_dataset else [safe_dataset] + parts
+    else:
+        target_parts = parts
+    safe_parts = [secure_filename(p) or '_' for p in target_parts]
+    target = os.path.join(base_root, *safe_parts)
+
+    # secure_filename já remove separadores; a checagem final garante que nada escapa da raiz
+    if os.path.commonpath([os.path.abspath(target), os.path.abspath(base_root)]) != os.path.abspath(base_root):
+        raise UploadError(f"Caminho inválido: {filename}")
+    return target
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_BUFFER), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def file_state(target, size, sha256=None):
+    """
+    Estado de um arquivo no servidor: ('complete', size) se o destino já existe
+    com o mesmo tamanho (e hash, se informado); ('partial', offset) se há um .part;
+    senão ('new', 0).
+    """
+    existing = _file_size(target)
+    if existing is not None and existing == size:
+        if not sha256 or _sha256(target) == sha256.lower():
+            return 'complete', size
+    part_size = _file_size(target + PART_SUFFIX)
+    if part_size is not None and part_size <= size:
+        return 'partial', part_size
+    if part_size is not None:
+        # .part maior que o arquivo: sobra de outro envio, recomeça
+        os.remove(target + PART_SUFFIX)
+    return 'new', 0
+
+
+_LOCKS = {}
+_LOCKS_GUARD = threading.Lock()
+
+
+def _target_lock(target):
+    with _LOCKS_GUARD:
+        lock = _LOCKS.get(target)
+        if lock is None:
+            lock = _LOCKS[target] = threading.Lock()
+        return lock
+
+
+def write_chunk(target, offset, total_size, stream, sha256=None, admit=None):
+    """
+    Grava os bytes de `stream` em <target>.part a partir de `offset` e, quando
+    o arquivo fica completo, confere o hash e publica o destino final.
+    Com `admit(part, target, sha256)` (ex.: content_hash.admit_incoming do dataset),
+    a publicação fica com ele: se retornar a chave de um original, o arquivo era
+    duplicata e o status é 'duplicate'.
+    Retorna (status, offset_atual).
+    """
+    lock = _target_lock(target)
+    if not lock.acquire(blocking=False):
+        raise UploadError("Outro bloco deste arquivo está sendo gravado.", status=409)
+    try:
+        part = target + PART_SUFFIX
+        # repetição do último bloco (resposta perdida na rede): o arquivo já foi publicado
+        if offset == total_size and not os.path.exists(part) and _file_size(target) == total_size:
+            return 'complete', total_size
+
+        current = _file_size(part) or 0
+        if offset != current:
+            raise UploadError("Offset fora de ordem.", status=409, offset=current)
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        written = current
+        with open(part, 'ab') as f:
+            while True:
+                chunk = stream.read(COPY_BUFFER)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > total_size:
+                    f.truncate(current)
+                    raise UploadError("Bloco ultrapassa o tamanho declarado do arquivo.", offset=current)
+                f.write(chunk)
+
+        if written < total_size:
+            return 'partial', written
+
+        digest = _sha256(part) if sha256 or admit is not None else None
+        if sha256 and digest != sha256.lower():
+            os.remove(part)
+            raise UploadError("Checksum não confere; o arquivo será reenviado.", status=422, offset=0)
+        if admit is None:
+            os.replace(part, target)
+            return 'complete', written
+        if admit(part, target, digest) is not None:
+            return 'duplicate', written
+        return 'complete', written
+    finally:
+        lock.release()
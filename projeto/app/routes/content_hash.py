@@ -0,0 +1,324 @@
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from .image_catalog import CACHE_DIR, IMG_EXT, hash_file
+
+# ============================================================
+# 🔧 Hash de conteúdo (sha256) e hash perceptual (dHash) com cache
+# ============================================================
+#
+# Os hashes de cada arquivo são calculados uma vez e guardados em
+# custom/cache/content_hashes.sqlite, indexados pelo caminho e validados por
+# (tamanho, mtime). O DuplicateIndex usa esses hashes para achar a mesma
+# imagem com outro nome: idêntica (sha256) ou quase idêntica (dHash a poucos
+# bits de distância, ex.: reexportada com outra compressão).
+#
+# A deduplicação é opcional (padrão 'off'): descartar imagens muda o dataset,
+# então só acontece com dedup="sha256"/"phash" (ou dedup=true) explícito.
+
+HASH_DB = CACHE_DIR / 'content_hashes.sqlite'
+
+DEDUP_MODES = ('off', 'sha256', 'phash')
+DEFAULT_DEDUP_MODE = 'off'
+# Modo usado quando o cliente só liga a deduplicação (dedup=true)
+ENABLED_DEDUP_MODE = 'sha256'
+TRUTHY = ('1', 'true', 'yes', 'on')
+FALSY = ('0', 'false', 'no', '')
+
+# Linhas do cache de hashes gravadas por transação
+STORE_BATCH = 500
+
+# Distância de Hamming máxima (em 64 bits) para considerar duas imagens iguais no modo phash
+DEFAULT_PHASH_DISTANCE = 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT,
+    dhash TEXT
+);
+"""
+
+
+def normalize_dedup_mode(mode):
+    if mode is None:
+        return DEFAULT_DEDUP_MODE
+    if mode is True:
+        return ENABLED_DEDUP_MODE
+    if mode is False:
+        return 'off'
+    mode = str(mode).strip().lower()
+    if mode in TRUTHY:
+        return ENABLED_DEDUP_MODE
+    if mode in FALSY:
+        return 'off'
+    if mode not in DEDUP_MODES:
+        print(f"[WARNING] dedup '{mode}' inválido. Usando '{DEFAULT_DEDUP_MODE}'.")
+        return DEFAULT_DEDUP_MODE
+    return mode
+
+
+def compute_dhash(path):
+    """
+    dHash de 64 bits (gradiente horizontal numa miniatura 9x8 em tons de cinza).
+    Retorna None se o Pillow não estiver instalado ou a imagem não abrir.
+    """
+    try:
+        from PIL import Image
+    except ModuleNotFoundError:
+        return None
+    try:
+        with Image.open(path) as im:
+            pixels = list(im.convert('L').resize((9, 8)).getdata())
+    except Exception as e:
+        print(f"[WARNING] Não foi possível calcular dHash de {path}: {e}")
+        return None
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+class HashCache:
+    """
+    Cache (path -> sha256/dhash) em SQLite. As gravações ficam pendentes em
+    memória e vão para o banco em lotes (executemany + um commit a cada
+    STORE_BATCH linhas ou em flush()), não um commit por arquivo.
+    """
+
+    def __init__(self, db_path=HASH_DB):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def _row(self, key, st):
+        row = self._pending.get(key)
+        if row is None:
+            row = self._conn.execute("SELECT size, mtime_ns, sha256, dhash FROM hashes WHERE path = ?", (key,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row
+        return None
+
+    def _store(self, key, st, sha256=None, dhash=None):
+        self._pending[key] = (st.st_size, st.st_mtime_ns, sha256, dhash)
+        if len(self._pending) >= STORE_BATCH:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        rows = [(key, *row) for key, row in self._pending.items()]
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, sha256, dhash) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+        self._conn.commit()
+        self._pending.clear()
+
+    def flush(self):
+        """
+        Grava no banco os hashes ainda pendentes (fim de um diretório/lote).
+        """
+        with self._lock:
+            self._flush()
+
+    def remember(self, path, sha256, dhash=None):
+        """
+        Registra hashes já conhecidos (ex.: calculados durante o upload) sem reler o arquivo.
+        """
+        key = str(Path(path).resolve())
+        st = os.stat(key)
+        with self._lock:
+            self._store(key, st, sha256, f"{dhash:016x}" if dhash is not None else None)
+
+    def hashes(self, path, perceptual=False):
+        """
+        (sha256, dhash) do arquivo; dhash só é calculado com perceptual=True.
+        """
+        key = str(Path(path).resolve())
+        st = os.stat(key)
+        with self._lock:
+            row = self._row(key, st)
+        sha256 = row[2] if row else None
+        dhash = row[3] if row else None
+        changed = False
+        if sha256 is None:
+            sha256 = hash_file(key)
+            changed = True
+        if perceptual and dhash is None:
+            value = compute_dhash(key)
+            if value is not None:
+                dhash = f"{value:016x}"
+                changed = True
+        if changed:
+            with self._lock:
+                self._store(key, st, sha256, dhash)
+        return sha256, (int(dhash, 16) if dhash else None)
+
+    def sha256(self, path):
+        return self.hashes(path)[0]
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_hash_cache():
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = HashCache()
+        return _CACHE
+
+
+class DuplicateIndex:
+    """
+    Conjunto de imagens já aceitas. `check_add` retorna a chave da imagem
+    equivalente já vista (duplicata) ou registra a nova e retorna None.
+    No modo phash, o dHash de 64 bits é dividido em faixas: pelo princípio da
+    casa dos pombos, duas imagens a distância <= max_distance coincidem em pelo
+    menos uma faixa, então só esses candidatos são comparados.
+    """
+
+    def __init__(self, mode=DEFAULT_DEDUP_MODE, max_distance=DEFAULT_PHASH_DISTANCE):
+        self.mode = normalize_dedup_mode(mode)
+        self.max_distance = max(0, int(max_distance))
+        self.by_sha = {}
+        self.bands = max(1, self.max_distance + 1)
+        self._band_bits = -(-64 // self.bands)
+        self._band_tables = [dict() for _ in range(self.bands)]
+
+    @property
+    def perceptual(self):
+        return self.mode == 'phash'
+
+    def _band_keys(self, dhash):
+        mask = (1 << self._band_bits) - 1
+        return [(dhash >> (i * self._band_bits)) & mask for i in range(self.bands)]
+
+    def find(self, sha256, dhash=None):
+        if self.mode == 'off':
+            return None
+        if sha256 in self.by_sha:
+            return self.by_sha[sha256]
+        if self.perceptual and dhash is not None:
+            for table, band in zip(self._band_tables, self._band_keys(dhash)):
+                for other_hash, other_key in table.get(band, ()):
+                    if bin(other_hash ^ dhash).count('1') <= self.max_distance:
+                        return other_key
+        return None
+
+    def add(self, key, sha256, dhash=None):
+        self.by_sha.setdefault(sha256, key)
+        if self.perceptual and dhash is not None:
+            for table, band in zip(self._band_tables, self._band_keys(dhash)):
+                table.setdefault(band, []).append((dhash, key))
+
+    def discard(self, key):
+        for sha256 in [sha for sha, other in self.by_sha.items() if other == key]:
+            del self.by_sha[sha256]
+        if self.perceptual:
+            for table in self._band_tables:
+                for band, entries in table.items():
+                    table[band] = [e for e in entries if e[1] != key]
+
+    def check_add(self, key, sha256, dhash=None):
+        existing = self.find(sha256, dhash)
+        if existing is None:
+            self.add(key, sha256, dhash)
+        return existing
+
+
+def _walk_index(root, mode, cache=None):
+    index = DuplicateIndex(mode)
+    if index.mode == 'off' or not root.is_dir():
+        return index
+    cache = cache or get_hash_cache()
+    for dirpath, _dirs, files in os.walk(root):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() not in IMG_EXT:
+                continue
+            path = Path(dirpath) / name
+            try:
+                sha256, dhash = cache.hashes(path, perceptual=index.perceptual)
+            except OSError:
+                continue
+            index.add(path.relative_to(root).as_posix(), sha256, dhash)
+        # um commit por diretório, não por arquivo
+        cache.flush()
+    return index
+
+
+# (raiz, modo) -> DuplicateIndex do dataset, mantido em memória entre uploads
+_DIR_INDEXES = {}
+_DIR_INDEXES_LOCK = threading.Lock()
+
+
+def index_directory(root, mode=DEFAULT_DEDUP_MODE, cache=None, refresh=False):
+    """
+    DuplicateIndex com as imagens já existentes em `root` (chaves relativas a root).
+    O dataset é percorrido uma vez por processo; os uploads seguintes reaproveitam
+    o índice, que admit_incoming mantém atualizado (refresh=True percorre de novo,
+    ex.: depois de mudanças feitas por fora das rotas de upload).
+    """
+    root = Path(root)
+    mode = normalize_dedup_mode(mode)
+    if mode == 'off':
+        return DuplicateIndex(mode)
+    key = (str(root.resolve()), mode)
+    with _DIR_INDEXES_LOCK:
+        index = None if refresh else _DIR_INDEXES.get(key)
+        if index is None:
+            index = _DIR_INDEXES[key] = _walk_index(root, mode, cache)
+        return index
+
+
+def find_existing(index, root, sha256, dhash=None):
+    """
+    Chave da imagem de `root` com o mesmo conteúdo, ou None. Como o índice fica
+    em memória, um original que não existe mais no disco é esquecido.
+    """
+    with _DIR_INDEXES_LOCK:
+        while True:
+            original = index.find(sha256, dhash)
+            if original is None or os.path.isfile(os.path.join(root, original)):
+                return original
+            index.discard(original)
+
+
+def admit_incoming(index, root, part, target, sha256, cache=None):
+    """
+    Decide se um arquivo recebido (ainda em `part`, fora do dataset) entra em `target`.
+    Duplicata de uma imagem do dataset: apaga `part` e retorna a chave do original,
+    sem gravar nada no dataset. Senão move `part` para `target`, registra no índice
+    e no cache de hashes (sha256 calculado por quem recebeu os bytes) e retorna None.
+    """
+    if index is None or index.mode == 'off':
+        os.replace(part, target)
+        return None
+    key = Path(target).relative_to(root).as_posix()
+    dhash = compute_dhash(part) if index.perceptual else None
+    original = find_existing(index, root, sha256, dhash)
+    if original is not None and original != key:
+        os.remove(part)
+        return original
+    with _DIR_INDEXES_LOCK:
+        index.add(key, sha256, dhash)
+    os.replace(part, target)
+    try:
+        (cache or get_hash_cache()).remember(target, sha256, dhash)
+    except OSError:
+        pass
+    return None
@@ -0,0 +1,388 @@
+import os
+import json
+import errno
+import time
+import hashlib
+import shutil
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# ============================================================
+# 🔧 Materialização de arquivos do dataset (copy/hardlink/reflink/symlink)
+# ============================================================
+
+# Modos aceitos em dataset_config["materialize_mode"].
+# "auto" tenta reflink -> hardlink -> copy (nunca symlink, que depende do caminho de origem).
+MATERIALIZE_MODES = ("copy", "hardlink", "reflink", "symlink", "auto")
+DEFAULT_MATERIALIZE_MODE = "copy"
+
+# Ordem de tentativas para cada modo; "copy" é sempre o último recurso.
+_FALLBACK_CHAIN = {
+    "copy": ("copy",),
+    "hardlink": ("hardlink", "copy"),
+    "reflink": ("reflink", "copy"),
+    "symlink": ("symlink", "copy"),
+    "auto": ("reflink", "hardlink", "copy"),
+}
+
+# ioctl FICLONE (Linux: btrfs, xfs, ...). Em outros sistemas o reflink cai para o próximo da cadeia.
+_FICLONE = 0x40049409
+
+# Erros que indicam que a estratégia não funciona neste destino (vale para todos os
+# arquivos): entre discos, sem permissão para links, sistema de arquivos sem suporte.
+# Qualquer outro erro (origem sumiu, disco cheio...) é do arquivo e não mexe na cadeia.
+_CAPABILITY_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP}
+# O ioctl FICLONE também responde EINVAL/ENOTTY quando o sistema de arquivos não clona
+_REFLINK_CAPABILITY_ERRNOS = {errno.EINVAL, errno.ENOTTY}
+
+# Falhas por arquivo guardadas no relatório do build (o total fica em `errors`)
+MAX_REPORTED_FAILURES = 50
+
+# Intervalo mínimo entre dois relatórios de progresso (segundos)
+PROGRESS_INTERVAL = 0.5
+
+
+class BuildCancelled(Exception):
+    """O build do dataset foi cancelado pelo usuário (/train/cancel)."""
+
+
+def default_workers():
+    """
+    Tamanho padrão do pool de materialização (I/O bound, mesmo critério do ThreadPoolExecutor).
+    """
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def normalize_mode(mode):
+    """
+    Normaliza o modo vindo do frontend. Valores desconhecidos viram o padrão (copy).
+    """
+    if not mode:
+        return DEFAULT_MATERIALIZE_MODE
+    mode = str(mode).strip().lower()
+    if mode not in MATERIALIZE_MODES:
+        print(f"[WARNING] materialize_mode '{mode}' inválido. Usando '{DEFAULT_MATERIALIZE_MODE}'.")
+        return DEFAULT_MATERIALIZE_MODE
+    return mode
+
+
+def _reflink(src, dst):
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def _hardlink(src, dst):
+    os.link(src, dst)
+
+
+def _symlink(src, dst):
+    os.symlink(os.path.abspath(src), dst)
+
+
+def _copy(src, dst):
+    shutil.copy(src, dst)
+
+
+_STRATEGIES = {
+    "reflink": _reflink,
+    "hardlink": _hardlink,
+    "symlink": _symlink,
+    "copy": _copy,
+}
+
+
+def _is_capability_error(strategy, error):
+    if isinstance(error, (ImportError, NotImplementedError)):
+        return True
+    if not isinstance(error, OSError):
+        return False
+    if error.errno in _CAPABILITY_ERRNOS:
+        return True
+    return strategy == "reflink" and error.errno in _REFLINK_CAPABILITY_ERRNOS
+
+
+class Materializer:
+    """
+    Cria os arquivos do dataset (train/val/test) a partir das imagens de origem
+    usando o modo escolhido, com fallback automático (ex.: hardlink entre sistemas
+    de arquivos diferentes cai para copy). Guarda quais estratégias foram usadas.
+    """
+
+    def __init__(self, mode=None):
+        self.mode = normalize_mode(mode)
+        self.chain = list(_FALLBACK_CHAIN[self.mode])
+        self.used = {}
+        self.errors = 0
+        self.failures = []
+        self.throughput = {}
+        self._lock = threading.Lock()
+
+    def place(self, src, dst):
+        """
+        Materializa src em dst. Retorna o nome da estratégia usada.
+        Uma estratégia só sai da cadeia (para as próximas chamadas) quando o erro é de
+        capacidade (ex.: hardlink entre discos falha para todos os arquivos); erros do
+        próprio arquivo são registrados em `failures` e repassados a quem chamou.
+        """
+        src, dst = Path(src), Path(dst)
+        try:
+            if dst.exists() or dst.is_symlink():
+                dst.unlink()
+        except OSError as e:
+            self._fail(src, dst, e)
+            raise
+
+        last_error = None
+        for strategy in list(self.chain):
+            try:
+                _STRATEGIES[strategy](src, dst)
+            except (OSError, NotImplementedError, ImportError) as e:
+                last_error = e
+                if not _is_capability_error(strategy, e):
+                    break
+                with self._lock:
+                    if strategy != "copy" and strategy in self.chain and len(self.chain) > 1:
+                        print(f"[INFO] Estratégia '{strategy}' indisponível ({e}). Usando fallback.")
+                        self.chain.remove(strategy)
+                continue
+            with self._lock:
+                self.used[strategy] = self.used.get(strategy, 0) + 1
+            return strategy
+
+        self._fail(src, dst, last_error)
+        raise last_error
+
+    def _fail(self, src, dst, error):
+        with self._lock:
+            self.errors += 1
+            if len(self.failures) < MAX_REPORTED_FAILURES:
+                self.failures.append({"src": str(src), "dst": str(dst), "error": str(error)})
+
+    def place_many(self, tasks, workers=None, max_files_per_sec=None, max_mb_per_sec=None,
+                   progress_callback=None, cancel_event=None):
+        """
+        Materializa uma lista de (src, dst) num pool de threads limitado.
+
+        - workers: tamanho do pool (padrão: default_workers()).
+        - max_files_per_sec / max_mb_per_sec: teto de vazão opcional (None/0 = sem limite).
+        - progress_callback(progress): chamado no máximo a cada PROGRESS_INTERVAL
+          segundos e uma última vez ao final, com arquivos/bytes feitos, total e ETA.
+        - cancel_event: threading.Event; quando setado, interrompe com BuildCancelled.
+
+        Falhas individuais são registradas em `errors`/`failures` e não interrompem o build.
+        """
+        tasks = [(Path(src), Path(dst)) for src, dst in tasks]
+        sizes = []
+        for src, _ in tasks:
+            try:
+                sizes.append(src.stat().st_size)
+            except OSError:
+                sizes.append(0)
+
+        progress = _Progress(len(tasks), sum(sizes), progress_callback)
+        throttle = _Throttle(max_files_per_sec, max_mb_per_sec)
+        workers = max(1, int(workers or default_workers()))
+
+        def work(index):
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            src, dst = tasks[index]
+            throttle.wait(sizes[index])
+            try:
+                self.place(src, dst)
+            except Exception as e:
+                print(f"[ERROR] materializando {src} -> {e}")
+            progress.advance(sizes[index])
+
+        progress.report(force=True)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="materialize") as pool:
+            # map consome o iterador e propaga exceções inesperadas dos workers
+            list(pool.map(work, range(len(tasks))))
+
+        if cancel_event is not None and cancel_event.is_set():
+            raise BuildCancelled("Build do dataset cancelado.")
+
+        final = progress.report(force=True)
+        self.throughput = {
+            "workers": workers,
+            "files": final["files_done"],
+            "bytes": final["bytes_done"],
+            "files_per_s": final["files_per_s"],
+            "mb_per_s": final["mb_per_s"],
+        }
+        return final
+
+    @property
+    def strategy(self):
+        """
+        Estratégia mais usada no build (o detalhamento por estratégia fica em `used`).
+        """
+        if not self.used:
+            return None
+        return max(self.used.items(), key=lambda kv: kv[1])[0]
+
+    def report(self):
+        """
+        Resumo gravado em build_info.json e devolvido por /train/start.
+        """
+        return {
+            "requested_mode": self.mode,
+            "strategy": self.strategy,
+            "strategies_used": dict(self.used),
+            "errors": self.errors,
+            "failures": list(self.failures),
+            "throughput": dict(self.throughput),
+        }
+
+
+class _Throttle:
+    """
+    Limita a vazão agregada de todas as threads (arquivos/s e MB/s): cada arquivo
+    só começa quando o acumulado cabe no tempo decorrido desde o início.
+    """
+
+    def __init__(self, max_files_per_sec=None, max_mb_per_sec=None):
+        self.max_fps = float(max_files_per_sec) if max_files_per_sec else None
+        self.max_bps = float(max_mb_per_sec) * 1024 * 1024 if max_mb_per_sec else None
+        self.files = 0
+        self.bytes = 0
+        self.start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self, nbytes):
+        if self.max_fps is None and self.max_bps is None:
+            return
+        with self._lock:
+            self.files += 1
+            self.bytes += nbytes
+            due = 0.0
+            if self.max_fps:
+                due = max(due, (self.files - 1) / self.max_fps)
+            if self.max_bps:
+                due = max(due, (self.bytes - nbytes) / self.max_bps)
+            delay = self.start + due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class _Progress:
+    """
+    Contadores de progresso compartilhados entre as threads do pool.
+    """
+
+    def __init__(self, files_total, bytes_total, callback=None, phase="materialize"):
+        self.phase = phase
+        self.files_total = files_total
+        self.bytes_total = bytes_total
+        self.files_done = 0
+        self.bytes_done = 0
+        self.callback = callback
+        self.start = time.monotonic()
+        self._last_report = 0.0
+        self._lock = threading.Lock()
+
+    def advance(self, nbytes):
+        with self._lock:
+            self.files_done += 1
+            self.bytes_done += nbytes
+        self.report()
+
+    def snapshot(self):
+        with self._lock:
+            files_done, bytes_done = self.files_done, self.bytes_done
+        elapsed = time.monotonic() - self.start
+        files_per_s = files_done / elapsed if elapsed > 0 else 0.0
+        remaining = self.files_total - files_done
+        eta = remaining / files_per_s if files_per_s > 0 else None
+        return {
+            "phase": self.phase,
+            "files_done": files_done,
+            "files_total": self.files_total,
+            "bytes_done": bytes_done,
+            "bytes_total": self.bytes_total,
+            "elapsed_s": round(elapsed, 3),
+            "files_per_s": round(files_per_s, 1),
+            "mb_per_s": round(bytes_done / elapsed / (1024 * 1024), 2) if elapsed > 0 else 0.0,
+            "eta_s": round(eta, 1) if eta is not None else None,
+        }
+
+    def report(self, force=False):
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_report < PROGRESS_INTERVAL:
+                return None
+            self._last_report = now
+        snap = self.snapshot()
+        if self.callback:
+            try:
+                self.callback(snap)
+            except Exception as e:
+                print(f"[WARNING] progress_callback falhou: {e}")
+        return snap
+
+
+BUILD_INFO_FILE = "build_info.json"
+
+
+def write_build_info(output_root, info):
+    """
+    Grava o resumo do build ao lado das pastas train/val/test.
+    """
+    with open(Path(output_root) / BUILD_INFO_FILE, "w", encoding="utf-8") as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+
+
+def read_build_info(output_root):
+    """
+    Lê o build_info.json de um dataset materializado (ou None se não existir/for inválido).
+    """
+    try:
+        with open(Path(output_root) / BUILD_INFO_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# ============================================================
+# 🔧 Cache de builds (chave de conteúdo)
+# ============================================================
+
+# Incrementar quando a forma de montar o dataset mudar (invalida builds antigos)
+BUILD_KEY_VERSION = 2
+
+_BUILD_LOCKS = {}
+_BUILD_LOCKS_GUARD = threading.Lock()
+
+
+def compute_build_key(manifest):
+    """
+    sha256 do JSON canônico do manifesto do build (fontes + config + semente).
+    """
+    payload = json.dumps(
+        {"version": BUILD_KEY_VERSION, **manifest},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def build_lock(key):
+    """
+    Lock por chave/destino: evita que dois jobs materializem o mesmo dataset ao mesmo tempo.
+    """
+    with _BUILD_LOCKS_GUARD:
+        lock = _BUILD_LOCKS.get(key)
+        if lock is None:
+            lock = _BUILD_LOCKS[key] = threading.Lock()
+        return lock
@@ -0,0 +1,342 @@
+import os
+import sys
+import json
+import mmap
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+
+from .image_catalog import CACHE_DIR, IMG_EXT
+
+# ============================================================
+# 🔧 Shards empacotados do dataset (blob contíguo + índice, leitura via mmap)
+# ============================================================
+#
+# Um dataset de classificação (split/classe/imagem.jpg) vira, por split:
+#   shards/<split>.bin       bytes de todas as imagens, concatenados
+#   shards/<split>.idx.json  classes e registros [caminho, classe, offset, tamanho]
+# Ler uma época vira uma leitura sequencial do .bin em vez de milhares de
+# open()/read() pequenos. ShardReader expõe as amostras via mmap; a avaliação
+# (train_models.function_test_yolo com use_shards) lê direto dele, sem extrair.
+# O treino roda pela CLI do YOLO num subprocesso, que só lê pastas: para ele,
+# rehydrate() recria as pastas (uma passada sequencial) numa cópia local. Isso
+# não muda o padrão de leitura das épocas (continuam sendo arquivos pequenos);
+# serve só para tirar o treino de um disco de origem lento/remoto.
+# A cópia vai para custom/cache/shard_extract (SHARD_EXTRACT_DIR troca o destino;
+# SHARD_EXTRACT_TMPFS=1 usa /dev/shm, que ocupa RAM). Só a cópia mais recente de
+# cada dataset é mantida: as de shards antigos são apagadas após reidratar, menos
+# as que têm lease ativo (um job de treino ainda lendo a cópia).
+
+SHARDS_DIRNAME = "shards"
+SHARD_FORMAT_VERSION = 1
+# Splits reconhecidos (datasets do Roboflow usam "valid")
+SPLIT_NAMES = ("train", "val", "valid", "test")
+FINGERPRINT_FILE = ".shards_fingerprint"
+# Tamanho do prefixo do fingerprint no nome da cópia (<dataset>_<fingerprint>)
+FINGERPRINT_CHARS = 12
+# <cópia>/.leases/<dono>: o pid do processo que está usando a cópia
+LEASES_DIRNAME = ".leases"
+# Imagens por model.predict na avaliação direto dos shards
+EVAL_BATCH = 32
+
+# Reidratação, leases e remoção de cópias antigas são serializadas no processo
+_EXTRACT_LOCK = threading.Lock()
+
+
+def _default_extract_root():
+    """
+    Destino padrão da reidratação: SHARD_EXTRACT_DIR, senão /dev/shm se
+    SHARD_EXTRACT_TMPFS=1 (e gravável), senão custom/cache/shard_extract.
+    """
+    env = os.environ.get("SHARD_EXTRACT_DIR")
+    if env:
+        return Path(env)
+    tmpfs = os.environ.get("SHARD_EXTRACT_TMPFS", "").strip().lower() in ("1", "true", "yes", "on")
+    if tmpfs and os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return Path("/dev/shm") / "implant_shards"
+    return CACHE_DIR / "shard_extract"
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.path.isdir("/proc"):
+        return os.path.exists(f"/proc/{pid}")
+    # sem /proc não dá para saber sem arriscar sinais: considera vivo
+    return True
+
+
+def _in_use(copy_root):
+    """
+    True se alguma lease da cópia pertence a um processo vivo. Leases de processos
+    que morreram (servidor reiniciado no meio de um treino) são ignoradas.
+    """
+    leases = Path(copy_root) / LEASES_DIRNAME
+    if not leases.is_dir():
+        return False
+    for lease in leases.iterdir():
+        try:
+            pid = int(lease.read_text().strip())
+        except (OSError, ValueError):
+            continue
+        if _pid_alive(pid):
+            return True
+    return False
+
+
+def _lease_file(copy_root, owner):
+    safe = "".join(c if c.isalnum() or c in "._-" else "_" for c in str(owner))
+    return Path(copy_root) / LEASES_DIRNAME / safe
+
+
+def release_lease(copy_root, owner):
+    """
+    Libera a lease de `owner` sobre uma cópia reidratada (ver rehydrate).
+    """
+    if not copy_root:
+        return
+    with _EXTRACT_LOCK:
+        try:
+            _lease_file(copy_root, owner).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _evict_old_copies(extract_root, dataset_name, keep):
+    """
+    Apaga as cópias reidratadas do mesmo dataset feitas a partir de shards antigos
+    (<dataset>_<outro fingerprint>), mantendo `keep` e as que estão em uso.
+    Chamar com _EXTRACT_LOCK.
+    """
+    if not extract_root.is_dir():
+        return
+    for entry in extract_root.iterdir():
+        name = entry.name
+        if entry == keep or not entry.is_dir() or len(name) <= FINGERPRINT_CHARS + 1:
+            continue
+        prefix, suffix = name[:-FINGERPRINT_CHARS - 1], name[-FINGERPRINT_CHARS - 1:]
+        if prefix != dataset_name or suffix[0] != "_" or not (entry / FINGERPRINT_FILE).exists():
+            continue
+        if _in_use(entry):
+            print(f"[INFO] Cópia reidratada antiga mantida (em uso por um job): {entry}")
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
+        print(f"[INFO] Cópia reidratada antiga removida: {entry}")
+
+
+def shard_paths(dataset_root, split):
+    base = Path(dataset_root) / SHARDS_DIRNAME
+    return base / f"{split}.bin", base / f"{split}.idx.json"
+
+
+def has_shards(dataset_root):
+    base = Path(dataset_root) / SHARDS_DIRNAME
+    return base.is_dir() and any(base.glob("*.idx.json"))
+
+
+def shard_split(dataset_root, split):
+    """
+    Nome do split empacotado para `split`, aceitando val/valid como sinônimos
+    (datasets do Roboflow usam "valid"). FileNotFoundError se não houver shard.
+    """
+    candidates = [split] + [s for s in ("val", "valid") if split in ("val", "valid") and s != split]
+    for candidate in candidates:
+        if shard_paths(dataset_root, candidate)[1].is_file():
+            return candidate
+    raise FileNotFoundError(f"Split '{split}' sem shard em {Path(dataset_root) / SHARDS_DIRNAME}")
+
+
+def _split_dirs(dataset_root):
+    root = Path(dataset_root)
+    return [root / s for s in SPLIT_NAMES if (root / s).is_dir()]
+
+
+def export_shards(dataset_root, chunk_size=1024 * 1024):
+    """
+    Empacota cada split de dataset_root em shards/<split>.bin + .idx.json.
+    As amostras ficam ordenadas por classe e nome. Retorna o resumo por split.
+    """
+    dataset_root = Path(dataset_root)
+    out_dir = dataset_root / SHARDS_DIRNAME
+    out_dir.mkdir(parents=True, exist_ok=True)
+    summary = {}
+
+    for split_dir in _split_dirs(dataset_root):
+        split = split_dir.name
+        classes = sorted(d.name for d in split_dir.iterdir() if d.is_dir())
+        blob_path, index_path = shard_paths(dataset_root, split)
+        tmp_blob = blob_path.with_suffix(".bin.tmp")
+        records = []
+        digest = hashlib.sha256()
+        offset = 0
+
+        with open(tmp_blob, "wb") as out:
+            for class_idx, class_name in enumerate(classes):
+                files = sorted(
+                    f for f in (split_dir / class_name).iterdir()
+                    if f.is_file() and f.suffix.lower() in IMG_EXT
+                )
+                for f in files:
+                    length = 0
+                    with open(f, "rb") as src:
+                        for chunk in iter(lambda: src.read(chunk_size), b""):
+                            out.write(chunk)
+                            digest.update(chunk)
+                            length += len(chunk)
+                    records.append([f"{class_name}/{f.name}", class_idx, offset, length])
+                    offset += length
+
+        index = {
+            "version": SHARD_FORMAT_VERSION,
+            "split": split,
+            "classes": classes,
+            "bytes": offset,
+            "sha256": digest.hexdigest(),
+            "records": records,
+        }
+        os.replace(tmp_blob, blob_path)
+        with open(index_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+        summary[split] = {"samples": len(records), "classes": len(classes), "bytes": offset}
+
+    return summary
+
+
+class ShardReader:
+    """
+    Acesso às amostras de um split empacotado. Os bytes vêm de um mmap do .bin,
+    então iterar em ordem é leitura sequencial e o page cache do SO faz o resto.
+
+        with ShardReader(root, "train") as shard:
+            for rel, class_idx, data in shard:
+                ...
+    """
+
+    def __init__(self, dataset_root, split):
+        self.blob_path, self.index_path = shard_paths(dataset_root, split)
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") != SHARD_FORMAT_VERSION:
+            raise ValueError(f"Versão de shard não suportada: {index.get('version')}")
+        self.split = split
+        self.classes = index["classes"]
+        self.records = index["records"]
+        self.sha256 = index.get("sha256")
+        size = self.blob_path.stat().st_size
+        if size != index["bytes"]:
+            raise ValueError(f"Shard incompleto: {self.blob_path} tem {size} bytes, índice espera {index['bytes']}.")
+        self._file = open(self.blob_path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        if self._mm is not None and hasattr(self._mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            self._mm.madvise(mmap.MADV_SEQUENTIAL)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, i):
+        """
+        (caminho relativo "classe/arquivo", índice da classe, bytes da imagem)
+        """
+        rel, class_idx, offset, length = self.records[i]
+        data = self._mm[offset:offset + length] if self._mm is not None else b""
+        return rel, class_idx, data
+
+    def __iter__(self):
+        for i in range(len(self.records)):
+            yield self[i]
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def rehydrate(dataset_root, target_root=None, lease=None):
+    """
+    Recria as pastas split/classe/imagem a partir dos shards em target_root
+    (padrão: _default_extract_root()/<nome do dataset>_<hash>). Se o destino já
+    corresponde aos mesmos shards, é reaproveitado; no destino padrão, as cópias
+    de shards antigos do mesmo dataset são apagadas (exceto as em uso).
+    Com `lease` (ex.: o job_id), a cópia fica reservada para esse dono até
+    release_lease(). Retorna o caminho POSIX.
+    """
+    with _EXTRACT_LOCK:
+        return _rehydrate(Path(dataset_root), target_root, lease)
+
+
+def _rehydrate(dataset_root, target_root, lease):
+    splits = sorted(p.name[:-len(".idx.json")] for p in (dataset_root / SHARDS_DIRNAME).glob("*.idx.json"))
+    if not splits:
+        raise FileNotFoundError(f"Nenhum shard encontrado em {dataset_root / SHARDS_DIRNAME}")
+
+    readers = [ShardReader(dataset_root, s) for s in splits]
+    try:
+        fingerprint = hashlib.sha256("|".join(f"{r.split}:{r.sha256}" for r in readers).encode()).hexdigest()
+        default_target = target_root is None
+        if default_target:
+            target_root = _default_extract_root() / f"{dataset_root.name}_{fingerprint[:FINGERPRINT_CHARS]}"
+        target_root = Path(target_root)
+        marker = target_root / FINGERPRINT_FILE
+        if marker.exists() and marker.read_text().strip() == fingerprint:
+            _take_lease(target_root, lease)
+            return str(target_root).replace("\\", "/")
+
+        if target_root.exists():
+            shutil.rmtree(target_root)
+        try:
+            for reader in readers:
+                split_dir = target_root / reader.split
+                for class_name in reader.classes:
+                    (split_dir / class_name).mkdir(parents=True, exist_ok=True)
+                for rel, _class_idx, data in reader:
+                    with open(split_dir / rel, "wb") as f:
+                        f.write(data)
+            marker.write_text(fingerprint)
+        except BaseException:
+            # cópia incompleta não fica ocupando disco/RAM
+            shutil.rmtree(target_root, ignore_errors=True)
+            raise
+    finally:
+        for reader in readers:
+            reader.close()
+    print(f"[INFO] Dataset reidratado a partir dos shards em {target_root}")
+    _take_lease(target_root, lease)
+    if default_target:
+        _evict_old_copies(target_root.parent, dataset_root.name, target_root)
+    return str(target_root).replace("\\", "/")
+
+
+def _take_lease(copy_root, owner):
+    if owner is None:
+        return
+    path = _lease_file(copy_root, owner)
+    path.parent.mkdir(exist_ok=True)
+    path.write_text(str(os.getpid()))
+
+
+def resolve_dataset_path(dataset_path, use_shards=False, lease=None):
+    """
+    Pasta que a CLI do YOLO deve ler no treino: com use_shards e shards presentes,
+    a cópia reidratada (local, reservada para `lease`); senão o próprio dataset_path.
+    """
+    if use_shards and dataset_path and has_shards(dataset_path):
+        return rehydrate(dataset_path, lease=lease)
+    return dataset_path
+
+
+if __name__ == "__main__":
+    # Empacota datasets já existentes (ex.: storage/datasets_yolo/CM/01):
+    #   python -m projeto.app.routes.dataset_shards <pasta_do_dataset> [...]
+    if len(sys.argv) < 2:
+        print("Uso: python -m projeto.app.routes.dataset_shards <pasta_do_dataset> [...]")
+        sys.exit(1)
+    for arg in sys.argv[1:]:
+        print(arg, json.dumps(export_shards(arg), ensure_ascii=False))
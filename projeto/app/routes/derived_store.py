@@ -0,0 +1,130 @@
+import os
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from .image_catalog import CACHE_DIR
+from .dataset_build import BuildCancelled, _Progress
+
+# ============================================================
+# 🔧 Store de imagens derivadas (pré-redimensionadas para o imgsz do treino)
+# ============================================================
+#
+# O treino roda em imgsz pequeno (224 por padrão), mas as fontes são JPEGs em
+# resolução cheia: cada época decodifica e reduz o original de novo. Com
+# dataset_config["resize_imgsz"], o build grava versões com o menor lado igual
+# ao imgsz em custom/cache/derived/<imgsz>_q<quality>/<sha[:2]>/<sha>.jpg.
+# A chave é (sha256 da fonte, imgsz, qualidade), então a mesma imagem é
+# redimensionada uma vez e reaproveitada por todos os builds seguintes.
+
+DERIVED_DIR = CACHE_DIR / 'derived'
+DEFAULT_QUALITY = 90
+DERIVED_EXT = '.jpg'
+
+
+def derived_path(sha256, imgsz, quality, root=DERIVED_DIR):
+    return Path(root) / f"{int(imgsz)}_q{int(quality)}" / sha256[:2] / f"{sha256}{DERIVED_EXT}"
+
+
+def derived_name(name):
+    """
+    Nome do arquivo no dataset: mantém .jpg/.jpeg e acrescenta .jpg aos demais
+    (a.png -> a.png.jpg), para não colidir com um a.jpg da mesma pasta.
+    """
+    return name if name.lower().endswith(('.jpg', '.jpeg')) else f"{name}{DERIVED_EXT}"
+
+
+def resize_image(src, dst, imgsz, quality=DEFAULT_QUALITY):
+    """
+    Grava em dst a imagem com o menor lado = imgsz (sem ampliar imagens menores).
+    Tons de cinza (raio-X) continuam com 1 canal.
+    """
+    from PIL import Image
+
+    with Image.open(src) as im:
+        # JPEG: decodifica já reduzido (DCT scaling), mantendo os dois lados >= imgsz
+        im.draft(None, (imgsz, imgsz))
+        if im.mode.startswith('I'):
+            # 16 bits (PNG/TIFF de raio-X) -> 8 bits, como o cv2 faz ao ler para o treino
+            im = im.convert('I').point(lambda v: v / 256).convert('L')
+        elif im.mode not in ('L', 'RGB'):
+            im = im.convert('L' if im.mode in ('1', 'LA') else 'RGB')
+        w, h = im.size
+        scale = imgsz / min(w, h)
+        if scale < 1:
+            im = im.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.LANCZOS)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(f"{dst.name}.{threading.get_ident()}.tmp")
+        try:
+            im.save(tmp, format='JPEG', quality=int(quality), optimize=True)
+        except Exception:
+            tmp.unlink(missing_ok=True)
+            raise
+    os.replace(tmp, dst)
+
+
+def derive_many(items, imgsz, quality=DEFAULT_QUALITY, workers=None, progress_callback=None, cancel_event=None,
+                root=DERIVED_DIR):
+    """
+    Garante a versão derivada de cada (src, sha256). Retorna ({sha256: caminho_derivado}, resumo).
+    Imagens que falham (arquivo corrompido, formato não suportado) ficam fora do mapa:
+    quem chama usa a original.
+    """
+    unique = {}
+    for src, sha256 in items:
+        unique.setdefault(sha256, Path(src))
+
+    result = {}
+    todo = []
+    for sha256, src in unique.items():
+        dst = derived_path(sha256, imgsz, quality, root)
+        if dst.exists():
+            result[sha256] = dst
+        else:
+            todo.append((sha256, src, dst))
+
+    summary = {"imgsz": int(imgsz), "quality": int(quality), "reused": len(result), "generated": 0, "failed": 0}
+    lock = threading.Lock()
+    sizes = []
+    for _, src, _ in todo:
+        try:
+            sizes.append(src.stat().st_size)
+        except OSError:
+            sizes.append(0)
+    progress = _Progress(len(todo), sum(sizes), progress_callback, phase="resize")
+
+    def work(index):
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        sha256, src, dst = todo[index]
+        try:
+            resize_image(src, dst, imgsz, quality)
+            with lock:
+                result[sha256] = dst
+                summary["generated"] += 1
+        except Exception as e:
+            print(f"[WARNING] Falha ao redimensionar {src}: {e}. Usando a imagem original.")
+            with lock:
+                summary["failed"] += 1
+        progress.advance(sizes[index])
+
+    if todo:
+        progress.report(force=True)
+        # PIL libera o GIL na decodificação/redimensionamento; o pool usa os núcleos disponíveis
+        workers = max(1, int(workers or os.cpu_count() or 1))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="derive") as pool:
+            list(pool.map(work, range(len(todo))))
+        if cancel_event is not None and cancel_event.is_set():
+            raise BuildCancelled("Build do dataset cancelado.")
+        progress.report(force=True)
+
+    source_bytes = derived_bytes = 0
+    for sha256, dst in result.items():
+        try:
+            source_bytes += unique[sha256].stat().st_size
+            derived_bytes += dst.stat().st_size
+        except OSError:
+            pass
+    summary["source_bytes"] = source_bytes
+    summary["derived_bytes"] = derived_bytes
+    return result, summary
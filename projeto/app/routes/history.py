@@ -0,0 +1,516 @@
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify, abort
+
+from .train_metrics import find_save_dir, MetricsReader, RESULTS_FILE
+from .run_manifest import build_manifest, manifest_path
+from .run_index import RUN_PREFIX, PREDICTIONS_DIR, PROJECT_ROOT
+from .job_scheduler import JOBS_DIR
+
+# ============================================================
+# 🔧 Histórico de execuções (treinos e predições) em SQLite
+# ============================================================
+#
+# Cada job de treino (ao terminar) e cada /predict/run grava uma linha em
+# runs/history.sqlite: configuração, build_key do dataset, durações, métricas
+# finais (top1/top5) e caminhos dos artefatos. As colunas usadas em filtros e
+# ordenação têm índice próprio, então a UI pagina milhares de execuções sem
+# varrer pastas. Execuções anteriores (runs/jobs, runs/logs, predictions/) entram
+# pelo backfill: automático (em segundo plano, na inicialização) quando o banco é
+# criado vazio, ou POST /history/backfill. Caminhos ancorados na raiz do projeto,
+# não no diretório de onde o servidor foi iniciado.
+
+HISTORY_DB = PROJECT_ROOT / "runs" / "history.sqlite"
+LOGS_DIR = PROJECT_ROOT / "runs" / "logs"
+
+TRAIN = "train"
+PREDICT = "predict"
+
+# colunas aceitas em ?sort= (todas indexadas ou baratas de ordenar)
+SORT_FIELDS = ("created_at", "finished_at", "duration_s", "build_s", "top1", "top5", "name", "status", "dataset")
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+STATUS_ALIASES = {"completed": "complete"}
+
+# marcadores gravados no log pelos jobs (usados no backfill de logs sem runs/jobs/<id>.json)
+LOG_MARKERS = (
+    ("TREINAMENTO_COMPLETO", "complete"),
+    ("TREINAMENTO CANCELADO", "cancelled"),
+    ("ERRO_TREINAMENTO", "error"),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    status TEXT,
+    dataset TEXT,
+    build_key TEXT,
+    models TEXT,
+    created_at REAL,
+    started_at REAL,
+    finished_at REAL,
+    duration_s REAL,
+    build_s REAL,
+    top1 REAL,
+    top5 REAL,
+    config TEXT,
+    metrics TEXT,
+    artifacts TEXT,
+    source TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_created ON runs (created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_runs_kind_created ON runs (kind, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_runs_status_created ON runs (status, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_runs_dataset_created ON runs (dataset, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_runs_build_key ON runs (build_key);
+CREATE INDEX IF NOT EXISTS idx_runs_top1 ON runs (top1 DESC);
+CREATE INDEX IF NOT EXISTS idx_runs_duration ON runs (duration_s);
+"""
+
+COLUMNS = (
+    "run_id", "kind", "name", "status", "dataset", "build_key", "models", "created_at", "started_at",
+    "finished_at", "duration_s", "build_s", "top1", "top5", "config", "metrics", "artifacts", "source", "updated_at",
+)
+JSON_COLUMNS = ("models", "config", "metrics", "artifacts")
+# a listagem não carrega os JSONs grandes (config/métricas/artefatos): ficam no GET de uma execução
+SUMMARY_COLUMNS = tuple(c for c in COLUMNS if c not in ("config", "metrics", "artifacts"))
+
+
+def run_id(kind, name):
+    return f"{kind}:{name}"
+
+
+def _duration(started, finished):
+    if started and finished and finished >= started:
+        return round(finished - started, 3)
+    return None
+
+
+def _number(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def summarize_metrics(result):
+    """
+    top1/top5 de um resultado de model.val (objeto do Ultralytics ou dict). None se ausentes.
+    """
+    if isinstance(result, dict):
+        return {"top1": _number(result.get("top1")), "top5": _number(result.get("top5"))}
+    return {"top1": _number(getattr(result, "top1", None)), "top5": _number(getattr(result, "top5", None))}
+
+
+def _final_epoch(save_dir):
+    if save_dir is None or not (Path(save_dir) / RESULTS_FILE).exists():
+        return None
+    rows = MetricsReader(Path(save_dir) / RESULTS_FILE).poll()
+    return dict(rows[-1]) if rows else None
+
+
+def _weights(save_dir):
+    if save_dir is None:
+        return {}
+    weights = Path(save_dir) / "weights"
+    return {name: str(weights / f"{name}.pt") for name in ("best", "last") if (weights / f"{name}.pt").is_file()}
+
+
+def training_record(job):
+    """
+    Linha do histórico para um job de runs/jobs (registro do JobScheduler).
+    """
+    config = job.get("config") or {}
+    payload = job.get("payload") or {}
+    build = job.get("dataset_build") or {}
+    lineage = job.get("lineage") or {}
+    save_dir = find_save_dir(job)
+    final = _final_epoch(save_dir)
+    artifacts = {
+        "log": job.get("log_path"),
+        "save_dir": str(save_dir) if save_dir else None,
+        "weights": _weights(save_dir),
+        "dataset": config.get("data"),
+        "profile_url": job.get("profile_url"),
+    }
+    return {
+        "kind": TRAIN,
+        "name": job["job_id"],
+        "status": job.get("status"),
+        "dataset": payload.get("dataset"),
+        "build_key": build.get("build_key"),
+        "models": [lineage.get("parent_model") or payload["modelo_base"]] if payload.get("modelo_base") else [],
+        "created_at": job.get("created_at"),
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+        "duration_s": _duration(job.get("started_at"), job.get("finished_at")),
+        "build_s": build.get("elapsed_s"),
+        "top1": final.get("top1") if final else None,
+        "top5": final.get("top5") if final else None,
+        "config": {"train": config or payload.get("full_config"), "dataset": payload.get("dataset_config"),
+                   "priority": job.get("priority"), "return_code": job.get("return_code"), "message": job.get("message"),
+                   "lineage": lineage or None},
+        "metrics": {"final_epoch": final, "dataset_build": build or None},
+        "artifacts": artifacts,
+    }
+
+
+def prediction_record(run_dir, evaluation=None, started_at=None, finished_at=None, status=None):
+    """
+    Linha do histórico para predictions/predicao_*. `evaluation` é o bloco gravado
+    no manifesto (modelos, dataset, métricas por modelo).
+    """
+    run_dir = Path(run_dir)
+    evaluation = evaluation or {}
+    per_model = evaluation.get("metrics") or {}
+    top1 = [m["top1"] for m in per_model.values() if m.get("top1") is not None]
+    top5 = [m["top5"] for m in per_model.values() if m.get("top5") is not None]
+    created_at = started_at
+    if created_at is None:
+        try:
+            created_at = datetime.strptime(run_dir.name[len(RUN_PREFIX):], "%Y%m%d_%H%M%S").timestamp()
+        except ValueError:
+            created_at = run_dir.stat().st_mtime if run_dir.exists() else None
+    artifacts = {"dir": str(run_dir), "manifest_url": f"/predictions/{run_dir.name}/manifest", "models": {}}
+    models = evaluation.get("evaluated")
+    if run_dir.is_dir():
+        manifest = build_manifest(run_dir)
+        for model in manifest["models"]:
+            artifacts["models"][model["name"]] = {
+                "url": model["url"],
+                "confusion_matrices": model["confusion_matrices"],
+                "files": model["file_count"],
+                "bytes": model["bytes"],
+            }
+        if models is None:
+            models = [m["name"] for m in manifest["models"]]
+    return {
+        "kind": PREDICT,
+        "name": run_dir.name,
+        # o /predict/run grava "completed"; o histórico usa os mesmos status dos jobs de treino
+        "status": status or STATUS_ALIASES.get(evaluation.get("status"), evaluation.get("status"))
+                  or ("complete" if artifacts["models"] else "unknown"),
+        "dataset": evaluation.get("dataset_path"),
+        "build_key": None,
+        "models": models or [],
+        "created_at": created_at,
+        "started_at": started_at,
+        "finished_at": finished_at,
+        "duration_s": _duration(started_at, finished_at),
+        "build_s": None,
+        "top1": max(top1) if top1 else None,
+        "top5": max(top5) if top5 else None,
+        "config": {k: evaluation.get(k) for k in ("split", "backend", "missing") if k in evaluation},
+        "metrics": per_model,
+        "artifacts": artifacts,
+    }
+
+
+class HistoryStore:
+    def __init__(self, db_path=HISTORY_DB):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    # ---------------------------------------
+    # Escrita
+    # ---------------------------------------
+    def record(self, entry, source="live", replace=True):
+        """
+        Grava (ou atualiza) uma execução. replace=False mantém a linha existente
+        (backfill não sobrescreve o que foi gravado ao vivo).
+        """
+        row = dict(entry)
+        row["run_id"] = run_id(row["kind"], row["name"])
+        row["source"] = source
+        row["updated_at"] = time.time()
+        for column in JSON_COLUMNS:
+            row[column] = json.dumps(row.get(column), ensure_ascii=False, default=str)
+        values = [row.get(c) for c in COLUMNS]
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self._lock:
+            cur = self._conn.execute(
+                f"{verb} INTO runs ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", values)
+            self._conn.commit()
+            return cur.rowcount > 0
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM runs LIMIT 1").fetchone() is None
+
+    # ---------------------------------------
+    # Consulta
+    # ---------------------------------------
+    @staticmethod
+    def _row(row, columns):
+        out = {c: row[c] for c in columns}
+        for column in JSON_COLUMNS:
+            if column in out and out[column] is not None:
+                out[column] = json.loads(out[column])
+        return out
+
+    def get(self, kind, name):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id(kind, name),)).fetchone()
+        return self._row(row, COLUMNS) if row else None
+
+    def query(self, kind=None, status=None, dataset=None, build_key=None, q=None, since=None, until=None,
+              min_top1=None, sort="created_at", order="desc", limit=DEFAULT_LIMIT, offset=0):
+        """
+        Execuções filtradas e ordenadas. Retorna (linhas resumidas, total filtrado).
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"sort deve ser um de {', '.join(SORT_FIELDS)}")
+        direction = "ASC" if str(order).lower() == "asc" else "DESC"
+        where, params = [], []
+        for column, value in (("kind", kind), ("status", status), ("dataset", dataset), ("build_key", build_key)):
+            if value:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if q:
+            where.append("name LIKE ? ESCAPE '\\'")
+            params.append("%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        if since is not None:
+            where.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("created_at < ?")
+            params.append(until)
+        if min_top1 is not None:
+            where.append("top1 >= ?")
+            params.append(min_top1)
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        # nulos sempre por último, nos dois sentidos
+        ordering = f"({sort} IS NULL), {sort} {direction}, run_id {direction}"
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM runs {clause}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM runs {clause} ORDER BY {ordering} LIMIT ? OFFSET ?",
+                params + [int(limit), int(offset)],
+            ).fetchall()
+        return [self._row(r, SUMMARY_COLUMNS) for r in rows], total
+
+    def facets(self):
+        """
+        Valores distintos (com contagem) para os filtros da UI.
+        """
+        with self._lock:
+            out = {}
+            for column in ("kind", "status", "dataset"):
+                rows = self._conn.execute(
+                    f"SELECT {column}, COUNT(*) FROM runs WHERE {column} IS NOT NULL GROUP BY {column} ORDER BY 2 DESC"
+                ).fetchall()
+                out[column] = {r[0]: r[1] for r in rows}
+            return out
+
+    # ---------------------------------------
+    # Backfill
+    # ---------------------------------------
+    def backfill(self, jobs_dir=JOBS_DIR, logs_dir=LOGS_DIR, predictions_dir=PREDICTIONS_DIR, force=False):
+        """
+        Importa execuções anteriores: runs/jobs/*.json, logs de treino sem registro
+        de job (runs/logs/*.log) e pastas predictions/predicao_*. Com force=False
+        linhas já existentes são mantidas. Retorna as contagens importadas.
+        """
+        started = time.perf_counter()
+        imported = {TRAIN: 0, PREDICT: 0, "errors": 0}
+        known_jobs = set()
+
+        def _import(build, *args):
+            try:
+                entry = build(*args)
+                if entry is not None and self.record(entry, source="backfill", replace=force):
+                    imported[entry["kind"]] += 1
+            except Exception as e:
+                imported["errors"] += 1
+                print(f"[WARNING] Backfill do histórico ignorou {args[0]}: {e}")
+
+        for path in sorted(Path(jobs_dir).glob("*.json")) if Path(jobs_dir).is_dir() else []:
+            known_jobs.add(path.stem)
+            _import(_job_from_file, path)
+        for path in sorted(Path(logs_dir).glob("*.log")) if Path(logs_dir).is_dir() else []:
+            if path.stem not in known_jobs:
+                _import(_job_from_log, path)
+        if Path(predictions_dir).is_dir():
+            for entry in sorted(Path(predictions_dir).iterdir()):
+                if entry.is_dir() and entry.name.startswith(RUN_PREFIX):
+                    _import(_prediction_from_dir, entry)
+
+        imported["elapsed_s"] = round(time.perf_counter() - started, 3)
+        print(f"[INFO] Backfill do histórico: {imported}")
+        return imported
+
+
+def _job_from_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        job = json.load(f)
+    return training_record(job) if job.get("job_id") else None
+
+
+def _job_from_log(path):
+    """
+    Log de treino sem runs/jobs/<id>.json (anterior à fila de jobs): status pelos
+    marcadores do fim do log, datas pelo arquivo e métricas pelo results.csv, se houver.
+    """
+    st = path.stat()
+    with open(path, "rb") as f:
+        f.seek(max(0, st.st_size - 4096))
+        tail = f.read().decode("utf-8", errors="replace")
+    status = next((s for marker, s in LOG_MARKERS if marker in tail), "unknown")
+    created = getattr(st, "st_birthtime", None) or st.st_ctime
+    job = {
+        "job_id": path.stem,
+        "status": status,
+        "created_at": min(created, st.st_mtime),
+        "started_at": min(created, st.st_mtime),
+        "finished_at": st.st_mtime if status != "unknown" else None,
+        "log_path": str(path),
+        "config": {"name": path.stem},
+    }
+    return training_record(job)
+
+
+def _prediction_from_dir(run_dir):
+    evaluation = None
+    target = manifest_path(run_dir)
+    if target.is_file():
+        with open(target, "r", encoding="utf-8") as f:
+            evaluation = json.load(f).get("evaluation")
+    return prediction_record(run_dir, evaluation)
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+_BACKFILL_THREAD = None
+
+
+def _background_backfill(store):
+    try:
+        store.backfill()
+    except Exception as e:
+        print(f"[WARNING] Backfill do histórico falhou: {e}")
+
+
+def get_history():
+    """
+    Instância única do histórico. Na criação do banco (vazio), as execuções existentes
+    são importadas numa thread em segundo plano: nenhuma requisição espera o backfill.
+    """
+    global _STORE, _BACKFILL_THREAD
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = HistoryStore()
+            if _STORE.is_empty():
+                _BACKFILL_THREAD = threading.Thread(
+                    target=_background_backfill, args=(_STORE,), name="history-backfill", daemon=True)
+                _BACKFILL_THREAD.start()
+        return _STORE
+
+
+def backfill_running():
+    return _BACKFILL_THREAD is not None and _BACKFILL_THREAD.is_alive()
+
+
+def record_training_job(job):
+    """
+    Grava o job encerrado no histórico. Falhas só geram aviso: o histórico nunca derruba um job.
+    """
+    if not job:
+        return
+    try:
+        get_history().record(training_record(job))
+    except Exception as e:
+        print(f"[WARNING] Não foi possível gravar o job {job.get('job_id')} no histórico: {e}")
+
+
+def record_prediction_run(run_dir, evaluation, started_at=None, finished_at=None, status=None):
+    try:
+        get_history().record(prediction_record(run_dir, evaluation, started_at, finished_at, status))
+    except Exception as e:
+        print(f"[WARNING] Não foi possível gravar a predição {Path(run_dir).name} no histórico: {e}")
+
+
+# ---------------------------------------
+# Rotas (/history)
+# ---------------------------------------
+bp = Blueprint("history", __name__)
+
+
+def _arg(name, cast):
+    value = request.args.get(name)
+    if value is None or value == "":
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        abort(400)
+
+
+@bp.route("", methods=["GET"])
+def list_history():
+    """
+    ?kind=train|predict &status= &dataset= &build_key= &q=<nome> &since=/&until=<epoch>
+    &min_top1= &sort=<campo> &order=asc|desc &limit= &offset=
+    """
+    limit = min(_arg("limit", int) or DEFAULT_LIMIT, MAX_LIMIT)
+    offset = max(0, _arg("offset", int) or 0)
+    try:
+        runs, total = get_history().query(
+            kind=request.args.get("kind"),
+            status=request.args.get("status"),
+            dataset=request.args.get("dataset"),
+            build_key=request.args.get("build_key"),
+            q=request.args.get("q"),
+            since=_arg("since", float),
+            until=_arg("until", float),
+            min_top1=_arg("min_top1", float),
+            sort=request.args.get("sort") or "created_at",
+            order=request.args.get("order") or "desc",
+            limit=max(1, limit),
+            offset=offset,
+        )
+    except ValueError as e:
+        return jsonify({"detail": str(e)}), 400
+    next_offset = offset + len(runs) if offset + len(runs) < total else None
+    return jsonify({"runs": runs, "total": total, "offset": offset, "next_offset": next_offset,
+                    "backfilling": backfill_running()})
+
+
+@bp.route("/facets", methods=["GET"])
+def history_facets():
+    return jsonify(get_history().facets())
+
+
+@bp.route("/<kind>/<name>", methods=["GET"])
+def get_history_run(kind, name):
+    run = get_history().get(kind, name)
+    if run is None:
+        return jsonify({"detail": f"Execução não encontrada: {kind}/{name}"}), 404
+    return jsonify(run)
+
+
+@bp.route("/backfill", methods=["POST"])
+def backfill_history():
+    """{"force": true} reimporta também execuções já registradas."""
+    body = request.get_json(silent=True) or {}
+    return jsonify(get_history().backfill(force=bool(body.get("force"))))
+
+
+if __name__ == "__main__":
+    # python -m projeto.app.routes.history [--force]
+    import sys
+    HistoryStore().backfill(force="--force" in sys.argv)
@@ -0,0 +1,280 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+
+# ============================================================
+# 🔧 Catálogo persistente de storage/imagens_implates
+# ============================================================
+#
+# Guarda tipo, linha, caminho, tamanho, mtime e hash (sha256) de cada imagem
+# num SQLite em custom/cache. A revalidação é incremental: só diretórios cujo
+# mtime mudou são relistados, então contar linhas ou sortear negativos vira
+# uma consulta ao índice em vez de um rglob no disco.
+
+# Ancorados na raiz do projeto (routes -> app -> projeto -> raiz), não no cwd do servidor
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+IMAGENS_BASE = PROJECT_ROOT / 'projeto' / 'app' / 'storage' / 'imagens_implates'
+CACHE_DIR = PROJECT_ROOT / 'custom' / 'cache'
+CATALOG_DB = CACHE_DIR / 'image_catalog.sqlite'
+
+IMG_EXT = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff'}
+
+# Pastas de tipo -> nomes legíveis usados pelo frontend
+TYPE_MAP = {
+    'CM': 'Cone',
+    'HE': 'Hex Externo',
+    'HI': 'Hex Interno'
+}
+TYPE_DIRS = {name: short for short, name in TYPE_MAP.items()}
+
+# Linha usada para imagens soltas diretamente na pasta do tipo
+ROOT_LINE = 'root'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    rel TEXT PRIMARY KEY,
+    parent TEXT,
+    depth INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_dirs_parent ON dirs(parent);
+CREATE TABLE IF NOT EXISTS images (
+    rel TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    type TEXT NOT NULL,
+    line TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_images_type_line ON images(type, line);
+CREATE INDEX IF NOT EXISTS idx_images_dir ON images(dir);
+CREATE INDEX IF NOT EXISTS idx_images_sha ON images(sha256);
+"""
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """
+    sha256 do conteúdo do arquivo, lido em blocos.
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _classify(rel):
+    """
+    Retorna (tipo, linha) para um caminho relativo à base, ou None se o arquivo
+    estiver fora de uma pasta de tipo.
+    """
+    parts = rel.split('/')
+    if len(parts) < 2:
+        return None
+    if len(parts) == 2:
+        return parts[0], ROOT_LINE
+    return parts[0], parts[1]
+
+
+class ImageCatalog:
+    def __init__(self, base=IMAGENS_BASE, db_path=CATALOG_DB):
+        self.base = Path(base)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    # ---------------------------------------
+    # Revalidação incremental
+    # ---------------------------------------
+    def refresh(self):
+        """
+        Revalida o catálogo. Cada diretório conhecido custa um stat(); apenas os
+        diretórios com mtime alterado são relistados (e só os arquivos novos ou
+        modificados têm o hash recalculado).
+        Retorna o número de diretórios relistados.
+        """
+        with self._lock:
+            if not self.base.is_dir():
+                self._conn.execute("DELETE FROM dirs")
+                self._conn.execute("DELETE FROM images")
+                self._conn.commit()
+                return 0
+
+            rescanned = 0
+            stack = [('', None, 0)]
+            while stack:
+                rel, parent, depth = stack.pop()
+                abs_dir = self.base / rel if rel else self.base
+                try:
+                    mtime_ns = abs_dir.stat().st_mtime_ns
+                except OSError:
+                    self._drop_dir(rel)
+                    continue
+
+                row = self._conn.execute("SELECT mtime_ns FROM dirs WHERE rel = ?", (rel,)).fetchone()
+                if row and row[0] == mtime_ns:
+                    children = self._conn.execute("SELECT rel FROM dirs WHERE parent = ?", (rel,)).fetchall()
+                    stack.extend((c[0], rel, depth + 1) for c in children)
+                    continue
+
+                subdirs = self._rescan_dir(rel, abs_dir)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO dirs (rel, parent, depth, mtime_ns) VALUES (?, ?, ?, ?)",
+                    (rel, parent, depth, mtime_ns),
+                )
+                stack.extend((s, rel, depth + 1) for s in subdirs)
+                rescanned += 1
+
+            self._conn.commit()
+            return rescanned
+
+    def _rescan_dir(self, rel, abs_dir):
+        """
+        Relista um diretório: atualiza as imagens diretas dele e remove do índice
+        subdiretórios que sumiram. Retorna os subdiretórios atuais (relativos).
+        """
+        prefix = f"{rel}/" if rel else ""
+        known = {
+            r[0]: (r[1], r[2], r[3])
+            for r in self._conn.execute("SELECT rel, size, mtime_ns, sha256 FROM images WHERE dir = ?", (rel,))
+        }
+        seen_files = set()
+        subdirs = []
+
+        with os.scandir(abs_dir) as it:
+            for entry in it:
+                child = prefix + entry.name
+                try:
+                    if entry.is_dir():
+                        subdirs.append(child)
+                        continue
+                    if not entry.is_file() or os.path.splitext(entry.name)[1].lower() not in IMG_EXT:
+                        continue
+                    kind = _classify(child)
+                    if kind is None:
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+
+                seen_files.add(child)
+                old = known.get(child)
+                if old and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+                    continue
+                try:
+                    digest = hash_file(entry.path)
+                except OSError as e:
+                    print(f"[WARNING] Não foi possível calcular hash de {entry.path}: {e}")
+                    digest = None
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO images (rel, dir, type, line, size, mtime_ns, sha256) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (child, rel, kind[0], kind[1], st.st_size, st.st_mtime_ns, digest),
+                )
+
+        removed = [(r,) for r in known if r not in seen_files]
+        if removed:
+            self._conn.executemany("DELETE FROM images WHERE rel = ?", removed)
+
+        current = set(subdirs)
+        for (old_sub,) in self._conn.execute("SELECT rel FROM dirs WHERE parent = ?", (rel,)).fetchall():
+            if old_sub not in current:
+                self._drop_dir(old_sub)
+        return subdirs
+
+    def _drop_dir(self, rel):
+        if not rel:
+            self._conn.execute("DELETE FROM dirs")
+            self._conn.execute("DELETE FROM images")
+            return
+        like = rel.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '/%'
+        self._conn.execute("DELETE FROM dirs WHERE rel = ? OR rel LIKE ? ESCAPE '\\'", (rel, like))
+        self._conn.execute("DELETE FROM images WHERE dir = ? OR dir LIKE ? ESCAPE '\\'", (rel, like))
+
+    # ---------------------------------------
+    # Consultas
+    # ---------------------------------------
+    def line_counts(self):
+        """
+        Retorna { "Cone": {"LINHA": 123, ...}, ... }. Linhas sem imagens aparecem
+        com 0; a linha 'root' só aparece quando há imagens soltas na pasta do tipo.
+        """
+        self.refresh()
+        with self._lock:
+            result = {}
+            for (short,) in self._conn.execute("SELECT rel FROM dirs WHERE depth = 1 ORDER BY rel"):
+                lines = {}
+                for (sub,) in self._conn.execute("SELECT rel FROM dirs WHERE parent = ? ORDER BY rel", (short,)):
+                    lines[sub.split('/', 1)[1]] = 0
+                result[TYPE_MAP.get(short, short)] = lines
+            for short, line, count in self._conn.execute(
+                "SELECT type, line, COUNT(*) FROM images GROUP BY type, line"
+            ):
+                lines = result.setdefault(TYPE_MAP.get(short, short), {})
+                lines[line] = count
+            return result
+
+    def images_by_line(self, type_short):
+        """
+        Retorna { linha: [Path, ...] } para um tipo (CM/HE/HI), em ordem estável.
+        """
+        self.refresh()
+        with self._lock:
+            lines = {}
+            for rel, line in self._conn.execute(
+                "SELECT rel, line FROM images WHERE type = ? ORDER BY rel", (type_short,)
+            ):
+                lines.setdefault(line, []).append(self.base / rel)
+            return lines
+
+    def manifest(self, type_short):
+        """
+        Lista estável de (caminho relativo, sha256) das imagens de um tipo; usada
+        para compor a chave de cache dos builds de dataset.
+        """
+        self.refresh()
+        with self._lock:
+            return [
+                (rel, digest)
+                for rel, digest in self._conn.execute(
+                    "SELECT rel, sha256 FROM images WHERE type = ? ORDER BY rel", (type_short,)
+                )
+            ]
+
+    def sha_map(self, type_short):
+        """
+        { Path: sha256 } das imagens de um tipo (hashes já calculados pelo refresh).
+        """
+        self.refresh()
+        with self._lock:
+            return {
+                self.base / rel: digest
+                for rel, digest in self._conn.execute("SELECT rel, sha256 FROM images WHERE type = ?", (type_short,))
+            }
+
+    def has_type(self, type_short):
+        self.refresh()
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM dirs WHERE rel = ? AND depth = 1", (type_short,)).fetchone()
+            return row is not None
+
+
+_CATALOG = None
+_CATALOG_LOCK = threading.Lock()
+
+
+def get_catalog():
+    """
+    Instância única do catálogo (criada sob demanda).
+    """
+    global _CATALOG
+    with _CATALOG_LOCK:
+        if _CATALOG is None:
+            _CATALOG = ImageCatalog()
+        return _CATALOG
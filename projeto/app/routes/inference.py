@@ -0,0 +1,216 @@
+import io
+import os
+import queue
+import time
+import threading
+from concurrent.futures import Future
+
+from .model_cache import MODEL_CACHE
+from .metrics import REGISTRY, INFERENCE_SECONDS, INFERENCE_QUEUE_SECONDS, INFERENCE_BATCH_SIZE
+
+# ============================================================
+# 🔧 Inferência online com micro-batching
+# ============================================================
+#
+# Cada modelo tem uma fila e uma thread própria. A thread pega a primeira
+# imagem que chegar, espera até PREDICT_MAX_WAIT_MS por outras (ou até
+# PREDICT_MAX_BATCH) e faz um único model.predict para todas. Sob carga o
+# custo do forward é dividido entre as requisições; sem carga a latência
+# extra é no máximo a janela de espera.
+
+
+def _env_number(name, default, cast=int):
+    value = os.environ.get(name)
+    if value is None or str(value).strip() == "":
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        print(f"[WARNING] Variável {name}='{value}' inválida. Usando {default}.")
+        return default
+
+
+MAX_BATCH = max(1, _env_number("PREDICT_MAX_BATCH", 16))
+MAX_WAIT_MS = max(0.0, _env_number("PREDICT_MAX_WAIT_MS", 5.0, float))
+MAX_QUEUE = max(1, _env_number("PREDICT_MAX_QUEUE", 256))
+REQUEST_TIMEOUT_S = max(1.0, _env_number("PREDICT_TIMEOUT_S", 30.0, float))
+DEFAULT_TOP_K = 5
+
+
+class QueueFull(Exception):
+    """A fila de inferência do modelo está cheia (cliente deve tentar de novo)."""
+
+
+def decode_image(data):
+    """
+    Bytes de imagem -> PIL.Image RGB. Feito na thread da requisição, fora do lote.
+    """
+    try:
+        from PIL import Image
+    except ModuleNotFoundError as e:
+        raise ModuleNotFoundError("Package 'Pillow' is not installed. Install with: pip install pillow") from e
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image.convert("RGB")
+
+
+def top_k(result, k):
+    """
+    Top-k classes de um resultado de classificação do ultralytics.
+    """
+    probs = getattr(result, "probs", None)
+    if probs is None:
+        raise ValueError("O modelo não é de classificação (resultado sem 'probs').")
+    data = getattr(probs, "data", probs)
+    try:
+        values = data.float().cpu().tolist()
+    except AttributeError:
+        values = [float(v) for v in data]
+    names = getattr(result, "names", None) or {}
+    order = sorted(range(len(values)), key=lambda i: values[i], reverse=True)[:max(1, k)]
+    return [
+        {"class_id": i, "class": names.get(i, str(i)), "confidence": round(float(values[i]), 6)}
+        for i in order
+    ]
+
+
+class MicroBatcher:
+    def __init__(self, model_path, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, max_queue=MAX_QUEUE, cache=MODEL_CACHE):
+        self.model_path = str(model_path)
+        self.label = os.path.basename(self.model_path)
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.cache = cache
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                name = f"infer-{os.path.basename(self.model_path)}"
+                self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+                self._thread.start()
+
+    def submit(self, image, k=DEFAULT_TOP_K):
+        """
+        Enfileira uma imagem já decodificada; retorna um Future com o top-k.
+        """
+        self._ensure_thread()
+        future = Future()
+        try:
+            self._queue.put_nowait((image, k, future, time.perf_counter()))
+        except queue.Full:
+            raise QueueFull(f"Fila de inferência cheia para {os.path.basename(self.model_path)}.")
+        return future
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._run(batch)
+
+    def _run(self, batch):
+        # Requisições que já desistiram (timeout) não ocupam o forward
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            with self.cache.use(self.model_path) as model:
+                results = model.predict([item[0] for item in batch], verbose=False)
+            forward_ms = (time.perf_counter() - started) * 1000
+            INFERENCE_SECONDS.observe(forward_ms / 1000, model=self.label)
+            INFERENCE_BATCH_SIZE.observe(len(batch), model=self.label)
+            for (_, k, future, enqueued), result in zip(batch, results):
+                INFERENCE_QUEUE_SECONDS.observe(started - enqueued, model=self.label)
+                future.set_result({
+                    "predictions": top_k(result, k),
+                    "batch_size": len(batch),
+                    "queue_ms": round((started - enqueued) * 1000, 2),
+                    "forward_ms": round(forward_ms, 2),
+                })
+        except Exception as e:
+            for item in batch:
+                if not item[2].done():
+                    item[2].set_exception(e)
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "model": self.model_path,
+                "queued": self._queue.qsize(),
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else None,
+                "largest_batch": self.largest_batch,
+            }
+
+
+_BATCHERS = {}
+_BATCHERS_LOCK = threading.Lock()
+
+
+def get_batcher(model_path):
+    """
+    Batcher único por arquivo de modelo (criado sob demanda).
+    """
+    key = os.path.realpath(model_path)
+    with _BATCHERS_LOCK:
+        batcher = _BATCHERS.get(key)
+        if batcher is None:
+            batcher = _BATCHERS[key] = MicroBatcher(key)
+        return batcher
+
+
+def predict_images(model_path, images, k=DEFAULT_TOP_K, timeout=REQUEST_TIMEOUT_S):
+    """
+    Classifica uma ou mais imagens decodificadas. As imagens entram na fila
+    individualmente e podem ser agrupadas com as de outras requisições.
+    """
+    batcher = get_batcher(model_path)
+    futures = []
+    deadline = time.monotonic() + timeout
+    results = []
+    try:
+        for image in images:
+            futures.append(batcher.submit(image, k))
+        for future in futures:
+            results.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+    finally:
+        for future in futures:
+            future.cancel()
+    return results
+
+
+def batcher_stats():
+    with _BATCHERS_LOCK:
+        batchers = list(_BATCHERS.values())
+    return {
+        "max_batch": MAX_BATCH,
+        "max_wait_ms": MAX_WAIT_MS,
+        "batchers": [b.stats() for b in batchers],
+    }
+
+
+@REGISTRY.add_collector
+def _queue_metrics():
+    with _BATCHERS_LOCK:
+        batchers = list(_BATCHERS.values())
+    return [
+        ("inference_queue_depth", "gauge", "Imagens aguardando na fila de inferência.",
+         [({"model": b.label}, b._queue.qsize()) for b in batchers]),
+    ]
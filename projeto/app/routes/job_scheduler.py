@@ -0,0 +1,442 @@
+import os
+import json
+import time
+import re
+import heapq
+import signal
+import threading
+from pathlib import Path
+
+from .log_broadcast import LOG_BROADCASTS, append_log
+
+# ============================================================
+# 🔧 Fila de jobs de treinamento (substitui o TRAINING_STATE global)
+# ============================================================
+#
+# Cada job é um dict persistido em runs/jobs/<job_id>.json (fila, estado, log,
+# progresso). Um dispatcher em thread própria inicia até `max_concurrent` jobs
+# por vez, em ordem de prioridade (maior primeiro) e depois de chegada.
+
+JOBS_DIR = Path(__file__).resolve().parents[3] / "runs" / "jobs"
+
+# O job_id vira nome de arquivo (runs/jobs, runs/logs, perfis): só [A-Za-z0-9._-]
+_JOB_ID_UNSAFE = re.compile(r"[^A-Za-z0-9._-]")
+JOB_ID_MAX_CHARS = 100
+
+
+def safe_job_id(raw):
+    """
+    job_id seguro para nome de arquivo a partir de um texto do usuário (exp_name):
+    caracteres fora de [A-Za-z0-9._-] viram "_" e pontos no início são removidos
+    (sem "." / ".." nem arquivos ocultos). None se não sobrar nada.
+    """
+    job_id = _JOB_ID_UNSAFE.sub("_", str(raw or "")).lstrip(".")[:JOB_ID_MAX_CHARS]
+    return job_id or None
+
+
+def is_safe_job_id(job_id):
+    return isinstance(job_id, str) and bool(job_id) and safe_job_id(job_id) == job_id
+
+
+def parse_priority(value):
+    """
+    Prioridade do job como int (None/"" -> 0). ValueError para valores não inteiros.
+    """
+    if value is None or value == "":
+        return 0
+    if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+        raise ValueError(f"Prioridade inválida: {value!r} (use um inteiro).")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Prioridade inválida: {value!r} (use um inteiro).") from None
+
+QUEUED = "queued"
+STARTING = "starting"
+PREPARING = "preparing"
+RUNNING = "running"
+COMPLETE = "complete"
+ERROR = "error"
+CANCELLED = "cancelled"
+
+ACTIVE_STATES = (STARTING, PREPARING, RUNNING)
+FINAL_STATES = (COMPLETE, ERROR, CANCELLED)
+
+# O treino roda numa sessão própria (POSIX): cancelar encerra o grupo inteiro,
+# não só o processo filho direto (workers do dataloader, etc.)
+NEW_SESSION = os.name == "posix"
+
+
+def _env_int(name, default=None):
+    value = os.environ.get(name)
+    if value is None or str(value).strip() == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        print(f"[WARNING] Variável {name}='{value}' inválida. Usando {default}.")
+        return default
+
+
+def _physical_memory_mb():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def compute_max_concurrent():
+    """
+    Limite de jobs simultâneos:
+    - TRAIN_MAX_CONCURRENT fixa o valor diretamente;
+    - senão, o menor entre núcleos / TRAIN_CPUS_PER_JOB (padrão 4) e
+      TRAIN_MEMORY_BUDGET_MB (padrão 75% da RAM) / TRAIN_MEMORY_PER_JOB_MB (padrão 4096).
+    """
+    explicit = _env_int("TRAIN_MAX_CONCURRENT")
+    if explicit:
+        return max(1, explicit)
+
+    cpus_per_job = max(1, _env_int("TRAIN_CPUS_PER_JOB", 4))
+    slots = max(1, (os.cpu_count() or 1) // cpus_per_job)
+
+    mem_total = _physical_memory_mb()
+    budget = _env_int("TRAIN_MEMORY_BUDGET_MB", int(mem_total * 0.75) if mem_total else None)
+    if budget:
+        per_job = max(1, _env_int("TRAIN_MEMORY_PER_JOB_MB", 4096))
+        slots = min(slots, max(1, budget // per_job))
+    return slots
+
+
+def _pid_is_training(pid):
+    """
+    True se o pid ainda existe e parece ser um processo de treino (cmdline com 'yolo').
+    Sem /proc (Windows/macOS) não arriscamos: retorna False.
+    """
+    cmdline = Path(f"/proc/{pid}/cmdline")
+    try:
+        return b"yolo" in cmdline.read_bytes()
+    except OSError:
+        return False
+
+
+def _signal_group(pid, sig):
+    """
+    Envia sig ao grupo de processos do treino (ou só ao pid, sem grupos de processos).
+    """
+    if NEW_SESSION:
+        try:
+            os.killpg(pid, sig)
+            return
+        except OSError:
+            pass
+    os.kill(pid, sig)
+
+
+def terminate_process(process, timeout=10):
+    """
+    SIGTERM no grupo do processo de treino; depois de `timeout` segundos, SIGKILL.
+    """
+    try:
+        _signal_group(process.pid, signal.SIGTERM)
+    except OSError:
+        pass
+    try:
+        process.wait(timeout=timeout)
+    except Exception:
+        pass
+    if process.poll() is None:
+        try:
+            _signal_group(process.pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+        except OSError:
+            pass
+        process.wait()
+    elif NEW_SESSION:
+        # o líder saiu, mas filhos do grupo podem ter ficado para trás
+        try:
+            os.killpg(process.pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+        except OSError:
+            pass
+
+
+class JobScheduler:
+    def __init__(self, jobs_dir=JOBS_DIR, runner=None, max_concurrent=None):
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.runner = runner
+        self.max_concurrent = max_concurrent or compute_max_concurrent()
+        self.jobs = {}
+        self._runtime = {}
+        self._queue = []
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._dispatcher = None
+        self._loaded = False
+
+    # ---------------------------------------
+    # Persistência
+    # ---------------------------------------
+    def _job_file(self, job_id):
+        if not is_safe_job_id(job_id):
+            raise ValueError(f"job_id inválido: {job_id!r}")
+        path = self.jobs_dir / f"{job_id}.json"
+        if path.resolve().parent != self.jobs_dir.resolve():
+            raise ValueError(f"job_id fora de {self.jobs_dir}: {job_id!r}")
+        return path
+
+    def _persist(self, job):
+        path = self._job_file(job["job_id"])
+        tmp = path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(tmp, path)
+
+    def _load(self):
+        """
+        Recarrega os jobs do disco. Jobs na fila voltam para a fila; jobs que
+        estavam em execução quando o servidor caiu são reenfileirados (o processo
+        órfão, se ainda existir, é encerrado para não duplicar o treino).
+        """
+        for path in sorted(self.jobs_dir.glob("*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[WARNING] Job ignorado ({path.name}): {e}")
+                continue
+            job_id = job.get("job_id")
+            if not job_id:
+                continue
+            if not is_safe_job_id(job_id) or path.name != f"{job_id}.json":
+                print(f"[WARNING] Job ignorado ({path.name}): job_id inválido {job_id!r}")
+                continue
+
+            if job.get("status") in ACTIVE_STATES:
+                pid = job.get("pid")
+                if pid and _pid_is_training(pid):
+                    try:
+                        _signal_group(pid, signal.SIGTERM)
+                    except OSError:
+                        pass
+                job["status"] = QUEUED
+                job["pid"] = None
+                job["progress"] = None
+                job["restarts"] = int(job.get("restarts", 0)) + 1
+                self._append_log(job, "\n--- SERVIDOR REINICIADO: JOB REENFILEIRADO ---")
+                self._persist(job)
+
+            self.jobs[job_id] = job
+            if job.get("status") == QUEUED:
+                self._push(job)
+
+    def _append_log(self, job, text):
+        log_path = job.get("log_path")
+        if not log_path:
+            return
+        try:
+            append_log(job["job_id"], log_path, text)
+        except OSError:
+            pass
+
+    # ---------------------------------------
+    # Fila
+    # ---------------------------------------
+    def _push(self, job):
+        self._seq += 1
+        heapq.heappush(self._queue, (-int(job.get("priority", 0)), job.get("created_at", 0), self._seq, job["job_id"]))
+
+    def unique_job_id(self, job_id):
+        """
+        job_id livre derivado de `job_id` (já saneado com safe_job_id): se existir,
+        ganha o sufixo -2, -3, ...
+        """
+        job_id = safe_job_id(job_id) or f"exp-{int(time.time() * 1000)}"
+        with self._cond:
+            if job_id not in self.jobs and not self._job_file(job_id).exists():
+                return job_id
+            n = 2
+            while f"{job_id}-{n}" in self.jobs or self._job_file(f"{job_id}-{n}").exists():
+                n += 1
+            return f"{job_id}-{n}"
+
+    def submit(self, job_id, priority=0, **fields):
+        """
+        Enfileira um novo job e retorna o registro criado.
+        """
+        self.start()
+        with self._cond:
+            job = {
+                "job_id": job_id,
+                "status": QUEUED,
+                "priority": parse_priority(priority),
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "pid": None,
+                "return_code": None,
+                "progress": None,
+                "dataset_build": None,
+                "message": None,
+                **fields,
+            }
+            self.jobs[job_id] = job
+            self._persist(job)
+            self._push(job)
+            self._cond.notify_all()
+        return job
+
+    def queue_position(self, job_id):
+        with self._cond:
+            ordered = [entry[-1] for entry in sorted(self._queue) if self.jobs.get(entry[-1], {}).get("status") == QUEUED]
+            return ordered.index(job_id) + 1 if job_id in ordered else None
+
+    # ---------------------------------------
+    # Estado dos jobs
+    # ---------------------------------------
+    def get(self, job_id):
+        with self._cond:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self, status=None):
+        with self._cond:
+            jobs = [dict(j) for j in self.jobs.values() if status is None or j.get("status") == status]
+        return sorted(jobs, key=lambda j: j.get("created_at") or 0, reverse=True)
+
+    def update(self, job_id, **fields):
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            self._persist(job)
+            if job.get("status") in FINAL_STATES:
+                self._cond.notify_all()
+            return dict(job)
+
+    def runtime(self, job_id):
+        """
+        Objetos vivos do job (processo, cancel_event) — não persistidos.
+        """
+        with self._cond:
+            return self._runtime.setdefault(job_id, {"process": None, "cancel_event": threading.Event()})
+
+    def attach_process(self, job_id, process, **fields):
+        """
+        Registra o processo de treino recém-iniciado e marca o job como RUNNING, sob o
+        mesmo lock do cancel(). Retorna False (sem mexer no status) se o job foi
+        cancelado enquanto o processo subia: quem chamou deve encerrá-lo.
+        """
+        with self._cond:
+            job = self.jobs.get(job_id)
+            runtime = self._runtime.setdefault(job_id, {"process": None, "cancel_event": threading.Event()})
+            if job is None or job.get("status") == CANCELLED or runtime["cancel_event"].is_set():
+                return False
+            runtime["process"] = process
+            job.update(fields, status=RUNNING, pid=process.pid)
+            self._persist(job)
+            return True
+
+    def is_active(self, job_id):
+        job = self.get(job_id)
+        return bool(job) and job.get("status") in ACTIVE_STATES + (QUEUED,)
+
+    def active_jobs(self):
+        with self._cond:
+            return [dict(j) for j in self.jobs.values() if j.get("status") in ACTIVE_STATES]
+
+    def queue_depth(self):
+        with self._cond:
+            return sum(1 for j in self.jobs.values() if j.get("status") == QUEUED)
+
+    def cancel(self, job_id):
+        """
+        Cancela um job: na fila ele sai direto; preparando o dataset, o build é
+        interrompido; rodando, o processo YOLO é terminado. Retorna o novo status
+        ou None se o job não existe / já terminou.
+        """
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None or job.get("status") in FINAL_STATES:
+                return None
+            runtime = self._runtime.setdefault(job_id, {"process": None, "cancel_event": threading.Event()})
+            previous = job["status"]
+            job["status"] = CANCELLED
+            if previous == QUEUED:
+                job["finished_at"] = time.time()
+            self._persist(job)
+            runtime["cancel_event"].set()
+            process = runtime.get("process")
+            self._cond.notify_all()
+
+        if previous == QUEUED:
+            self._append_log(job, "\n\n--- TREINAMENTO CANCELADO PELO USUÁRIO ---")
+            LOG_BROADCASTS.close(job_id)
+        elif process is not None:
+            terminate_process(process)
+        return CANCELLED
+
+    # ---------------------------------------
+    # Dispatcher
+    # ---------------------------------------
+    def start(self):
+        """
+        Carrega/recupera os jobs do disco e inicia o dispatcher (idempotente).
+        É chamado na primeira requisição, e não no import, para que o processo pai
+        do reloader do Flask e processos filhos (spawn) não mexam na fila.
+        """
+        with self._cond:
+            if not self._loaded:
+                self._loaded = True
+                self._load()
+            if self._dispatcher is not None and self._dispatcher.is_alive():
+                return
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="train-dispatcher", daemon=True)
+            self._dispatcher.start()
+
+    def _running_count(self):
+        return sum(1 for j in self.jobs.values() if j.get("status") in ACTIVE_STATES)
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue or self._running_count() >= self.max_concurrent:
+                    self._cond.wait(timeout=5)
+                _, _, _, job_id = heapq.heappop(self._queue)
+                job = self.jobs.get(job_id)
+                if job is None or job.get("status") != QUEUED:
+                    continue
+                job["status"] = STARTING
+                job["started_at"] = time.time()
+                self._runtime[job_id] = {"process": None, "cancel_event": threading.Event()}
+                self._persist(job)
+
+            worker = threading.Thread(target=self._run_job, args=(job_id,), name=f"train-{job_id}", daemon=True)
+            worker.start()
+
+    def _run_job(self, job_id):
+        try:
+            self.runner(job_id)
+        except Exception as e:
+            print(f"[ERROR] Job {job_id} falhou: {e}")
+            self.update(job_id, status=ERROR, message=str(e))
+        finally:
+            with self._cond:
+                job = self.jobs.get(job_id)
+                if job is not None:
+                    if job.get("status") not in FINAL_STATES:
+                        job["status"] = ERROR
+                    job["finished_at"] = job.get("finished_at") or time.time()
+                    job["pid"] = None
+                    self._persist(job)
+                self._runtime.pop(job_id, None)
+                self._cond.notify_all()
+            # streams SSE do job terminam depois de entregar as últimas linhas
+            LOG_BROADCASTS.close(job_id)
+
+    def summary(self):
+        with self._cond:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "active": self._running_count(),
+                "queued": sum(1 for j in self.jobs.values() if j.get("status") == QUEUED),
+            }
@@ -0,0 +1,177 @@
+import os
+import re
+import threading
+from collections import deque
+
+# ============================================================
+# 🔧 Difusão dos logs de treino (um leitor por job, N assinantes SSE)
+# ============================================================
+#
+# Toda escrita no log de um job passa por um LogBroadcaster: a linha vai para
+# o arquivo em runs/logs e para um buffer circular em memória com número de
+# sequência. A saída do processo YOLO é lida direto do pipe. Os streams SSE
+# apenas esperam numa Condition e leem do buffer — sem abrir o arquivo e sem
+# polling.
+
+
+def _buffer_lines_from_env():
+    value = os.environ.get("TRAIN_LOG_BUFFER_LINES")
+    try:
+        return max(100, int(value)) if value else 2000
+    except ValueError:
+        print(f"[WARNING] TRAIN_LOG_BUFFER_LINES='{value}' inválido. Usando 2000.")
+        return 2000
+
+
+BUFFER_LINES = _buffer_lines_from_env()
+
+# Intervalo do comentário de keepalive no SSE (detecta cliente desconectado)
+KEEPALIVE_S = 15.0
+
+# Quantos broadcasters de jobs já encerrados ficam em memória (reconexões tardias)
+KEEP_CLOSED = 32
+
+# Barras de progresso do YOLO usam \r; cada atualização vira uma linha
+_LINE_SPLIT = re.compile(rb"\r\n|\r|\n")
+
+
+class LogBroadcaster:
+    def __init__(self, log_path, capacity=BUFFER_LINES):
+        self.log_path = str(log_path)
+        self.lines = deque(maxlen=capacity)
+        self.seq = 0
+        self.closed = False
+        self._cond = threading.Condition()
+        self._file_lock = threading.Lock()
+
+    # ---------------------------------------
+    # Escrita
+    # ---------------------------------------
+    def _publish(self, lines):
+        with self._cond:
+            for line in lines:
+                self.seq += 1
+                self.lines.append((self.seq, line))
+            self._cond.notify_all()
+
+    def write(self, text):
+        """
+        Acrescenta texto ao log (arquivo + buffer). Equivalente a f.write(text + "\\n").
+        """
+        with self._file_lock:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(text + "\n")
+        self._publish(text.split("\n"))
+
+    def _publish_lines(self, lines, on_line):
+        self._publish(lines)
+        if on_line is None:
+            return
+        for line in lines:
+            try:
+                on_line(line)
+            except Exception as e:
+                print(f"[WARNING] on_line falhou: {e}")
+
+    def pump(self, stream, on_line=None):
+        """
+        Lê a saída do processo até EOF: os bytes vão inalterados para o arquivo e
+        as linhas decodificadas para o buffer (e para on_line, se informado).
+        """
+        fd = stream.fileno()
+        pending = b""
+        with self._file_lock:
+            f = open(self.log_path, "ab")
+        try:
+            while True:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    break
+                with self._file_lock:
+                    f.write(chunk)
+                    f.flush()
+                pending += chunk
+                # um \r no fim do bloco pode ser a primeira metade de \r\n
+                head, tail = (pending[:-1], pending[-1:]) if pending.endswith(b"\r") else (pending, b"")
+                *complete, rest = _LINE_SPLIT.split(head)
+                pending = rest + tail
+                if complete:
+                    self._publish_lines([c.decode("utf-8", errors="replace") for c in complete], on_line)
+            pending = pending.rstrip(b"\r")
+            if pending:
+                self._publish_lines([pending.decode("utf-8", errors="replace")], on_line)
+        finally:
+            with self._file_lock:
+                f.close()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    # ---------------------------------------
+    # Leitura (assinantes)
+    # ---------------------------------------
+    def last_seq(self):
+        with self._cond:
+            return self.seq
+
+    def follow(self, after=None, keepalive=KEEPALIVE_S):
+        """
+        Gera (seq, linha) a partir de `after` (padrão: só linhas novas) até o
+        broadcaster ser fechado. Gera None a cada `keepalive` segundos sem linhas.
+        """
+        with self._cond:
+            cursor = self.seq if after is None else after
+        while True:
+            with self._cond:
+                if self.seq <= cursor and not self.closed:
+                    self._cond.wait(timeout=keepalive)
+                batch = [item for item in self.lines if item[0] > cursor]
+                finished = self.closed
+            if batch:
+                cursor = batch[-1][0]
+                yield from batch
+            elif finished:
+                return
+            else:
+                yield None
+
+
+class _Registry:
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def get(self, job_id, log_path=None):
+        """
+        Broadcaster do job; com log_path, cria se não existir (ou reabre um já fechado).
+        """
+        with self._lock:
+            bc = self._items.get(job_id)
+            if log_path is None:
+                return bc
+            if bc is None or (bc.closed and bc.log_path != str(log_path)):
+                bc = self._items[job_id] = LogBroadcaster(log_path)
+            elif bc.closed:
+                bc.closed = False
+            return bc
+
+    def close(self, job_id):
+        with self._lock:
+            bc = self._items.get(job_id)
+            if bc is not None:
+                bc.close()
+            closed = [k for k, v in self._items.items() if v.closed]
+            for k in closed[:-KEEP_CLOSED] if len(closed) > KEEP_CLOSED else []:
+                del self._items[k]
+
+
+LOG_BROADCASTS = _Registry()
+
+
+def append_log(job_id, log_path, text):
+    """
+    Escreve no log do job e notifica os streams conectados.
+    """
+    LOG_BROADCASTS.get(job_id, log_path).write(text)
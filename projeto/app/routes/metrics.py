@@ -0,0 +1,248 @@
+import time
+import threading
+from bisect import bisect_left
+
+from flask import Blueprint, Response
+
+# ============================================================
+# 🔧 Métricas no formato de exposição do Prometheus (GET /metrics)
+# ============================================================
+#
+# Implementação mínima e sem dependências (prometheus_client não faz parte do
+# requirements): Counter, Gauge e Histogram com rótulos, mais "coletores" —
+# funções chamadas a cada scrape que leem o estado atual de quem já mantém
+# contadores próprios (cache de modelos, filas de inferência, scheduler).
+# Os caminhos quentes só fazem um observe()/inc() sob um lock curto.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Segundos: de 1 ms (rotas em cache) a alguns minutos (builds de dataset grandes)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Rótulos de {self.name} devem ser {self.labelnames}, recebido {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, None, value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, extra, value in self.samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counter só pode aumentar.")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # contagem por bucket (não cumulativa) + [soma, total]
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        out = []
+        with self._lock:
+            items = [(k, list(s[0]), s[1], s[2]) for k, s in self._values.items()]
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                out.append((f"{self.name}_bucket", key, ("le", _format_value(bound)), cumulative))
+            out.append((f"{self.name}_bucket", key, ("le", "+Inf"), count))
+            out.append((f"{self.name}_sum", key, None, total))
+            out.append((f"{self.name}_count", key, None, count))
+        return out
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Registry:
+    """
+    Métricas nomeadas + coletores. Criar uma métrica com um nome já registrado
+    devolve a existente (reimportações de módulo não duplicam séries).
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Métrica '{name}' já registrada com outro tipo/rótulos.")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_collector(self, fn):
+        """
+        fn() -> [(nome, tipo, ajuda, [(dict de rótulos, valor), ...]), ...], chamada a cada scrape.
+        """
+        with self._lock:
+            if fn not in self._collectors:
+                self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for fn in collectors:
+            try:
+                families = fn() or []
+            except Exception as e:
+                print(f"[WARNING] Coletor de métricas {getattr(fn, '__name__', fn)} falhou: {e}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    names = tuple(labels)
+                    lines.append(f"{name}{_format_labels(names, [labels[n] for n in names])} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ---------------------------------------
+# Métricas dos caminhos quentes (usadas pelos módulos instrumentados)
+# ---------------------------------------
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Latência das requisições HTTP por rota.", ("route", "method", "status"))
+
+BUILD_PHASE_SECONDS = REGISTRY.histogram(
+    "dataset_build_phase_seconds", "Duração de cada fase do build de dataset.", ("phase",), buckets=SLOW_BUCKETS)
+BUILD_FILES = REGISTRY.counter(
+    "dataset_build_files_total", "Arquivos processados por fase do build de dataset.", ("phase",))
+BUILD_BYTES = REGISTRY.counter(
+    "dataset_build_bytes_total", "Bytes gravados na materialização de datasets.")
+BUILDS = REGISTRY.counter(
+    "dataset_builds_total", "Builds de dataset por resultado (built, reused).", ("result",))
+
+MODEL_LOAD_SECONDS = REGISTRY.histogram(
+    "model_load_seconds", "Tempo de carregamento de pesos no cache de modelos.", buckets=SLOW_BUCKETS)
+
+INFERENCE_SECONDS = REGISTRY.histogram(
+    "inference_forward_seconds", "Duração do forward de cada micro-lote.", ("model",))
+INFERENCE_QUEUE_SECONDS = REGISTRY.histogram(
+    "inference_queue_seconds", "Espera na fila até o início do forward, por imagem.", ("model",))
+INFERENCE_BATCH_SIZE = REGISTRY.histogram(
+    "inference_batch_size", "Imagens por micro-lote de inferência.", ("model",), buckets=BATCH_BUCKETS)
+
+
+bp = Blueprint("metrics", __name__)
+
+
+@bp.route("", methods=["GET"])
+def metrics_endpoint():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,219 @@
+import os
+import time
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .metrics import REGISTRY, MODEL_LOAD_SECONDS
+
+# ============================================================
+# 🔧 Cache residente de modelos YOLO (LRU por orçamento de memória)
+# ============================================================
+#
+# Evita pagar a desserialização do torch a cada /predict/run: o modelo fica em
+# memória, indexado pelo caminho, e é recarregado se o arquivo .pt mudar
+# (mtime/tamanho). Quando a soma estimada passa do orçamento, os modelos usados
+# há mais tempo são descartados.
+
+# model_cache.py fica em .../projeto/app/routes, então parents[3] é a raiz do workspace
+MODELS_DIR = (Path(__file__).resolve().parents[3] / "custom" / "models").resolve()
+
+DEFAULT_BUDGET_MB = 2048
+MODEL_EXT = (".pt",)
+
+
+def _budget_from_env():
+    value = os.environ.get("MODEL_CACHE_BUDGET_MB")
+    try:
+        return int(value) if value else DEFAULT_BUDGET_MB
+    except ValueError:
+        print(f"[WARNING] MODEL_CACHE_BUDGET_MB='{value}' inválido. Usando {DEFAULT_BUDGET_MB}.")
+        return DEFAULT_BUDGET_MB
+
+
+def _fingerprint(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _load_yolo(path):
+    # lazy import: ultralytics pode não estar instalado (rotas retornam MOCK nesse caso)
+    try:
+        from ultralytics import YOLO
+    except ModuleNotFoundError as e:
+        raise ModuleNotFoundError("Package 'ultralytics' is not installed. Install with: pip install ultralytics") from e
+    return YOLO(path)
+
+
+def estimate_model_bytes(model, fallback=0):
+    """
+    Bytes de parâmetros + buffers do módulo torch; se não der para medir, usa o fallback
+    (tamanho do arquivo de pesos).
+    """
+    module = getattr(model, "model", model)
+    try:
+        total = sum(p.numel() * p.element_size() for p in module.parameters())
+        total += sum(b.numel() * b.element_size() for b in module.buffers())
+        return int(total) or fallback
+    except Exception:
+        return fallback
+
+
+class _Entry:
+    def __init__(self, model, fingerprint, nbytes, load_time):
+        self.model = model
+        self.fingerprint = fingerprint
+        self.nbytes = nbytes
+        self.load_time = load_time
+        self.lock = threading.RLock()
+
+
+class ModelCache:
+    def __init__(self, budget_mb=None, loader=_load_yolo):
+        self.budget_bytes = int((budget_mb or _budget_from_env()) * 1024 * 1024)
+        self.loader = loader
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+
+    def _key(self, path):
+        return str(Path(path).resolve())
+
+    def _load_lock(self, key):
+        with self._lock:
+            lock = self._load_locks.get(key)
+            if lock is None:
+                lock = self._load_locks[key] = threading.Lock()
+            return lock
+
+    def _entry(self, path):
+        key = self._key(path)
+        fingerprint = _fingerprint(key)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.fingerprint == fingerprint:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        # Um carregamento por caminho por vez; quem chegar depois reaproveita o resultado
+        with self._load_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.fingerprint == fingerprint:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+                reloading = entry is not None
+
+            started = time.perf_counter()
+            model = self.loader(key)
+            load_time = time.perf_counter() - started
+            MODEL_LOAD_SECONDS.observe(load_time)
+            entry = _Entry(model, fingerprint, estimate_model_bytes(model, fallback=fingerprint[1]), load_time)
+
+            with self._lock:
+                self.misses += 1
+                if reloading:
+                    self.reloads += 1
+                    print(f"[INFO] Pesos alterados em disco, recarregando modelo: {key}")
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                self._evict()
+            print(f"[INFO] Modelo carregado no cache em {load_time:.2f}s: {key}")
+            return entry
+
+    def _evict(self):
+        total = sum(e.nbytes for e in self._entries.values())
+        # mantém pelo menos o modelo recém-carregado, mesmo que sozinho estoure o orçamento
+        while total > self.budget_bytes and len(self._entries) > 1:
+            key, entry = self._entries.popitem(last=False)
+            total -= entry.nbytes
+            self.evictions += 1
+            print(f"[INFO] Modelo removido do cache (LRU): {key}")
+
+    def get(self, path):
+        """
+        Retorna o modelo (carregando ou recarregando se necessário).
+        """
+        return self._entry(path).model
+
+    @contextmanager
+    def use(self, path):
+        """
+        Empresta o modelo com exclusividade: o objeto YOLO guarda estado de
+        predictor/validator e não deve ser usado por duas requisições ao mesmo tempo.
+        """
+        entry = self._entry(path)
+        with entry.lock:
+            yield entry.model
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self._key(path), None)
+
+    def warm_up(self, models_dir=MODELS_DIR):
+        """
+        Pré-carrega os modelos encontrados em models_dir (até o orçamento permitir).
+        """
+        models_dir = Path(models_dir)
+        if not models_dir.is_dir():
+            return []
+        loaded = []
+        for f in sorted(models_dir.iterdir()):
+            if f.is_file() and f.suffix.lower() in MODEL_EXT:
+                try:
+                    self.get(f)
+                    loaded.append(f.name)
+                except Exception as e:
+                    print(f"[WARNING] Falha no warm-up do modelo {f}: {e}")
+        return loaded
+
+    def warm_up_async(self, models_dir=MODELS_DIR):
+        thread = threading.Thread(target=self.warm_up, args=(models_dir,), name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "models": [
+                    {"path": k, "bytes": e.nbytes, "load_time_s": round(e.load_time, 3)}
+                    for k, e in self._entries.items()
+                ],
+                "bytes": sum(e.nbytes for e in self._entries.values()),
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+MODEL_CACHE = ModelCache()
+
+
+@REGISTRY.add_collector
+def _cache_metrics():
+    stats = MODEL_CACHE.stats()
+    return [
+        ("model_cache_hits_total", "counter", "Consultas ao cache de modelos atendidas da memória.", [({}, stats["hits"])]),
+        ("model_cache_misses_total", "counter", "Consultas ao cache de modelos que carregaram pesos.", [({}, stats["misses"])]),
+        ("model_cache_reloads_total", "counter", "Recarregamentos por pesos alterados em disco.", [({}, stats["reloads"])]),
+        ("model_cache_evictions_total", "counter", "Modelos descartados por orçamento de memória.", [({}, stats["evictions"])]),
+        ("model_cache_hit_ratio", "gauge", "Fração de consultas atendidas da memória.", [({}, stats["hit_ratio"])]),
+        ("model_cache_models", "gauge", "Modelos residentes no cache.", [({}, len(stats["models"]))]),
+        ("model_cache_bytes", "gauge", "Memória estimada dos modelos residentes.", [({}, stats["bytes"])]),
+        ("model_cache_budget_bytes", "gauge", "Orçamento de memória do cache de modelos.", [({}, stats["budget_bytes"])]),
+    ]
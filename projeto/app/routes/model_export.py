@@ -0,0 +1,307 @@
+import os
+import json
+import time
+import shutil
+import threading
+from pathlib import Path
+from datetime import datetime
+
+from .image_catalog import CACHE_DIR, IMG_EXT
+from .model_registry import get_registry
+
+# ============================================================
+# 🔧 Backends de inferência em CPU (ONNX / OpenVINO) com exportação em cache
+# ============================================================
+#
+# O .pt registrado é exportado uma vez por (sha256 dos pesos, backend, imgsz)
+# para custom/cache/exports/<sha[:16]>/<backend>_<imgsz>/. Como a chave é o hash,
+# pesos sobrescritos geram uma nova exportação e a antiga simplesmente deixa de
+# ser usada. O backend padrão é sempre o .pt: ONNX/OpenVINO só entram quando
+# pedidos explicitamente, por PREDICT_BACKEND (padrão de todo o servidor) ou por
+# options.backend / campo backend em /predict/run, /predict/image e /predict/batch.
+# Se a exportação falhar (ex.: onnx/openvino não instalados), cai para o .pt com
+# um aviso; a falha fica registrada por (sha256, backend, imgsz) e as chamadas
+# seguintes usam o .pt direto, sem tentar exportar de novo (POST /predict/exports
+# com "force": true tenta outra vez).
+
+EXPORTS_DIR = CACHE_DIR / 'exports'
+BACKENDS = ('pt', 'onnx', 'openvino')
+DEFAULT_EXPORT_IMGSZ = 224
+EXPORT_INFO = 'export.json'
+
+_LOCKS = {}
+_LOCKS_GUARD = threading.Lock()
+# (sha256, backend, imgsz) -> mensagem da última falha de exportação
+_FAILED = {}
+
+
+class ExportFailed(RuntimeError):
+    """Exportação que já falhou antes para os mesmos pesos/backend/imgsz."""
+
+
+def normalize_backend(backend):
+    if backend is None or str(backend).strip() == "":
+        backend = os.environ.get("PREDICT_BACKEND", "pt")
+    backend = str(backend).strip().lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend '{backend}' inválido. Use um de: {', '.join(BACKENDS)}.")
+    return backend
+
+
+def _lock_for(key):
+    with _LOCKS_GUARD:
+        lock = _LOCKS.get(key)
+        if lock is None:
+            lock = _LOCKS[key] = threading.Lock()
+        return lock
+
+
+def export_dir(sha256, backend, imgsz, root=EXPORTS_DIR):
+    return Path(root) / sha256[:16] / f"{backend}_{int(imgsz)}"
+
+
+def _read_info(target):
+    try:
+        with open(target / EXPORT_INFO, "r", encoding="utf-8") as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return None
+    output = info.get("output")
+    return info if output and os.path.exists(output) else None
+
+
+def export_model(model_path, backend, imgsz=None, root=EXPORTS_DIR, force=False):
+    """
+    Caminho da versão `backend` dos pesos em model_path, exportando na primeira vez.
+    Retorna o info da exportação ({output, backend, imgsz, sha256, export_s, ...}).
+    Uma exportação que já falhou levanta ExportFailed sem refazer o trabalho (force=True tenta de novo).
+    """
+    backend = normalize_backend(backend)
+    entry = get_registry().lookup(str(Path(model_path).resolve()), verify=True)
+    if entry is None:
+        raise FileNotFoundError(f"Modelo não encontrado: {model_path}")
+    if backend == 'pt':
+        return {"output": entry["path"], "backend": "pt", "sha256": entry["sha256"], "cached": True}
+    imgsz = int(imgsz or entry.get("imgsz") or DEFAULT_EXPORT_IMGSZ)
+    target = export_dir(entry["sha256"], backend, imgsz, root)
+    failure_key = (entry["sha256"], backend, imgsz)
+
+    info = _read_info(target)
+    if info is not None:
+        return {**info, "cached": True}
+    if failure_key in _FAILED and not force:
+        raise ExportFailed(_FAILED[failure_key])
+
+    with _lock_for(str(target)):
+        info = _read_info(target)
+        if info is not None:
+            return {**info, "cached": True}
+        if failure_key in _FAILED and not force:
+            raise ExportFailed(_FAILED[failure_key])
+
+        try:
+            from ultralytics import YOLO
+        except ModuleNotFoundError as e:
+            _FAILED[failure_key] = str(e)
+            raise ModuleNotFoundError("Package 'ultralytics' is not installed. Install with: pip install ultralytics") from e
+
+        # o Ultralytics grava a exportação ao lado dos pesos: trabalha com uma cópia dentro do cache
+        if target.exists():
+            shutil.rmtree(target)
+        target.mkdir(parents=True, exist_ok=True)
+        local_pt = target / entry["name"]
+
+        print(f"[INFO] Exportando {entry['name']} para {backend} (imgsz={imgsz})...")
+        started = time.perf_counter()
+        try:
+            shutil.copy2(entry["path"], local_pt)
+            output = YOLO(str(local_pt)).export(format=backend, imgsz=imgsz)
+        except Exception as e:
+            # não deixa a cópia do .pt nem exportação parcial no cache
+            _FAILED[failure_key] = str(e)
+            shutil.rmtree(target, ignore_errors=True)
+            raise
+        export_s = time.perf_counter() - started
+        local_pt.unlink(missing_ok=True)
+        _FAILED.pop(failure_key, None)
+
+        info = {
+            "output": str(Path(output).resolve()),
+            "backend": backend,
+            "imgsz": imgsz,
+            "sha256": entry["sha256"],
+            "source": entry["path"],
+            "export_s": round(export_s, 3),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        with open(target / EXPORT_INFO, "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+        print(f"[INFO] Exportação concluída em {export_s:.1f}s: {info['output']}")
+        return {**info, "cached": False}
+
+
+def resolve_backend_path(model_path, backend=None, imgsz=None):
+    """
+    Caminho que deve ser carregado para o backend pedido. Falhas de exportação
+    voltam para o .pt (aviso só na primeira falha; depois o .pt é usado direto)
+    em vez de derrubar a requisição.
+    """
+    backend = normalize_backend(backend)
+    if backend == 'pt':
+        return str(model_path)
+    try:
+        return export_model(model_path, backend, imgsz)["output"]
+    except ValueError:
+        raise
+    except ExportFailed:
+        return str(model_path)
+    except Exception as e:
+        print(f"[WARNING] Exportação {backend} indisponível para {model_path}: {e}. Usando o .pt.")
+        return str(model_path)
+
+
+def list_exports(root=EXPORTS_DIR):
+    root = Path(root)
+    result = []
+    if not root.is_dir():
+        return result
+    for info_file in sorted(root.glob(f"*/*/{EXPORT_INFO}")):
+        info = _read_info(info_file.parent)
+        if info is not None:
+            result.append(info)
+    return result
+
+
+# ---------------------------------------
+# Relatório comparativo (latência, throughput, top-1)
+# ---------------------------------------
+
+def _labeled_images(dataset_path, split, limit=None):
+    """
+    [(caminho, classe)] de dataset/<split>/<classe>/*, intercalando as classes
+    para que um limite pequeno ainda cubra todas.
+    """
+    split_dir = Path(dataset_path) / split
+    if not split_dir.is_dir() and split == "val":
+        split_dir = Path(dataset_path) / "valid"
+    if not split_dir.is_dir():
+        raise FileNotFoundError(f"Split '{split}' não encontrado em {dataset_path}")
+    per_class = []
+    for class_dir in sorted(d for d in split_dir.iterdir() if d.is_dir()):
+        files = sorted(f for f in class_dir.iterdir() if f.is_file() and f.suffix.lower() in IMG_EXT)
+        per_class.append([(f, class_dir.name) for f in files])
+    items = []
+    while any(per_class):
+        for bucket in per_class:
+            if bucket:
+                items.append(bucket.pop(0))
+    return items[:limit] if limit else items
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _bench_backend(path, items, warmup, batch_size):
+    from ultralytics import YOLO
+    from .inference import decode_image
+
+    model = YOLO(path, task="classify")
+    images = []
+    for f, _ in items:
+        with open(f, "rb") as fh:
+            images.append(decode_image(fh.read()))
+
+    for img in images[:max(0, warmup)]:
+        model.predict([img], verbose=False)
+
+    latencies = []
+    predictions = []
+    for img in images:
+        started = time.perf_counter()
+        result = model.predict([img], verbose=False)[0]
+        latencies.append((time.perf_counter() - started) * 1000)
+        probs = getattr(result.probs, "data", result.probs)
+        try:
+            values = probs.float().cpu().tolist()
+        except AttributeError:
+            values = [float(v) for v in probs]
+        best = max(range(len(values)), key=lambda i: values[i])
+        predictions.append((result.names or {}).get(best, str(best)))
+
+    started = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        model.predict(images[i:i + batch_size], verbose=False)
+    batch_s = time.perf_counter() - started
+
+    correct = sum(1 for pred, (_, label) in zip(predictions, items) if pred == label)
+    return {
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50), 3),
+            "p95": round(_percentile(latencies, 95), 3),
+            "mean": round(sum(latencies) / len(latencies), 3),
+        },
+        "throughput_img_s": round(len(images) / batch_s, 2) if batch_s > 0 else None,
+        "batch_size": batch_size,
+        "top1": round(correct / len(items), 4),
+        "images": len(items),
+        "predictions": predictions,
+    }
+
+
+def compare_backends(model_path, dataset_path, split="test", backends=("pt", "onnx"), limit=200,
+                     warmup=5, batch_size=16, imgsz=None):
+    """
+    Roda o mesmo conjunto rotulado em cada backend e compara com o .pt: latência
+    (p50/p95 com lote 1), throughput (lote batch_size), top-1 e concordância das
+    predições com o .pt. O relatório também é salvo na pasta de exportações do modelo.
+    """
+    backends = [normalize_backend(b) for b in backends]
+    if "pt" not in backends:
+        backends.insert(0, "pt")
+    items = _labeled_images(dataset_path, split, limit)
+    if not items:
+        raise ValueError(f"Nenhuma imagem rotulada em {dataset_path}/{split}")
+
+    report = {
+        "model": os.path.basename(model_path),
+        "dataset": str(dataset_path),
+        "split": split,
+        "images": len(items),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "backends": {},
+    }
+    baseline = None
+    for backend in backends:
+        try:
+            export = export_model(model_path, backend, imgsz)
+            stats = _bench_backend(export["output"], items, warmup, batch_size)
+        except Exception as e:
+            print(f"[WARNING] Backend {backend} falhou na comparação: {e}")
+            report["backends"][backend] = {"error": str(e)}
+            continue
+        predictions = stats.pop("predictions")
+        stats["path"] = export["output"]
+        stats["export_s"] = export.get("export_s")
+        if backend == "pt":
+            baseline = (stats, predictions)
+        elif baseline is not None:
+            base_stats, base_preds = baseline
+            stats["top1_delta"] = round(stats["top1"] - base_stats["top1"], 4)
+            stats["agreement"] = round(sum(a == b for a, b in zip(predictions, base_preds)) / len(items), 4)
+            stats["speedup_p50"] = round(base_stats["latency_ms"]["p50"] / stats["latency_ms"]["p50"], 3) \
+                if stats["latency_ms"]["p50"] else None
+        report["backends"][backend] = stats
+
+    entry = get_registry().lookup(str(Path(model_path).resolve()))
+    if entry is not None:
+        out = EXPORTS_DIR / entry["sha256"][:16] / f"compare_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        out.parent.mkdir(parents=True, exist_ok=True)
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        report["report_path"] = str(out)
+    return report
@@ -0,0 +1,379 @@
+import os
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+from .image_catalog import CACHE_DIR, hash_file
+from .model_cache import MODELS_DIR, MODEL_EXT
+
+# ============================================================
+# 🔧 Registro de modelos (custom/models + storage/models_yolo legado)
+# ============================================================
+#
+# Cada arquivo de pesos entra no registro uma vez, com sha256, tamanho, classes,
+# task, imgsz e o treino de origem (lidos do checkpoint). O registro fica em
+# custom/cache/model_registry.sqlite, validado por (tamanho, mtime), e em memória
+# em dicionários por id, nome de arquivo e nome sem extensão: resolver um modelo
+# é uma consulta exata, sem listdir nem busca por substring (nem stat: quem
+# mantém o registro em dia é o watcher, que relê as pastas por polling quando o
+# mtime delas muda; uploads registram direto). Só quem vai carregar os pesos
+# (resolve, lookup(verify=True)) confere o arquivo com um stat().
+# Caminhos absolutos só são aceitos dentro das raízes ou de runs/ (checkpoints
+# gravados pelos treinos, usados como modelo_base); os de runs/ são resolvidos
+# sem entrar no registro (não aparecem em list()).
+
+LEGACY_MODELS_DIR = (Path(__file__).resolve().parent.parent / "storage" / "models_yolo").resolve()
+REGISTRY_DB = CACHE_DIR / 'model_registry.sqlite'
+# Saídas dos treinos (runs/classify/<job>/weights/*.pt)
+RUN_OUTPUTS_DIR = (Path(__file__).resolve().parents[3] / "runs").resolve()
+
+# Tamanho do id (prefixo do sha256); colisões caem para o nome do arquivo
+MODEL_ID_LEN = 12
+# Checkpoints gravados por nós (repositório e treinos locais): podem ser lidos com
+# pickle completo. Os de custom/models chegam por upload e só são lidos com
+# torch.load(weights_only=True)
+TRUSTED_CHECKPOINT_DIRS = (LEGACY_MODELS_DIR, RUN_OUTPUTS_DIR)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    meta TEXT
+);
+"""
+
+
+def _poll_interval_from_env():
+    value = os.environ.get("MODEL_REGISTRY_POLL_S")
+    try:
+        return float(value) if value else 10.0
+    except ValueError:
+        print(f"[WARNING] MODEL_REGISTRY_POLL_S='{value}' inválido. Usando 10.")
+        return 10.0
+
+
+def _is_trusted_checkpoint(path):
+    path = Path(path).resolve()
+    return any(d == path.parent or d in path.parents for d in TRUSTED_CHECKPOINT_DIRS)
+
+
+def read_checkpoint_meta(path):
+    """
+    Classes, task, imgsz, treino e dataset de origem gravados pelo Ultralytics no
+    checkpoint (.pt). Sem torch instalado (ou checkpoint ilegível) os campos
+    ficam None; o arquivo continua registrado pelo hash.
+    O checkpoint é lido com weights_only=True; o pickle completo (necessário para
+    os objetos do Ultralytics) só é usado em TRUSTED_CHECKPOINT_DIRS, nunca em
+    arquivos enviados por upload.
+    """
+    meta = {"names": None, "task": None, "imgsz": None, "train_run": None, "train_data": None, "train_date": None}
+    try:
+        import torch
+    except ModuleNotFoundError:
+        return meta
+    try:
+        ckpt = torch.load(str(path), map_location="cpu", weights_only=True)
+    except Exception as e:
+        if not _is_trusted_checkpoint(path):
+            print(f"[WARNING] Checkpoint {path} não pôde ser lido com weights_only=True; metadados ignorados: {e}")
+            return meta
+        try:
+            ckpt = torch.load(str(path), map_location="cpu", weights_only=False)
+        except Exception as e:
+            print(f"[WARNING] Não foi possível ler o checkpoint {path}: {e}")
+            return meta
+    if not isinstance(ckpt, dict):
+        return meta
+    args = ckpt.get("train_args") or {}
+    model = ckpt.get("ema") or ckpt.get("model")
+    names = getattr(model, "names", None)
+    if isinstance(names, dict):
+        names = [names[k] for k in sorted(names)]
+    meta["names"] = list(names) if names is not None else None
+    meta["task"] = args.get("task") or getattr(model, "task", None)
+    meta["imgsz"] = args.get("imgsz")
+    save_dir = args.get("save_dir")
+    if not save_dir and args.get("project") and args.get("name"):
+        save_dir = f"{args['project']}/{args['name']}"
+    meta["train_run"] = str(save_dir).replace("\\", "/") if save_dir else None
+    meta["train_data"] = str(args["data"]).replace("\\", "/") if args.get("data") else None
+    meta["train_date"] = ckpt.get("date")
+    return meta
+
+
+class ModelRegistry:
+    def __init__(self, roots=(MODELS_DIR, LEGACY_MODELS_DIR), db_path=REGISTRY_DB, meta_reader=read_checkpoint_meta,
+                 extra_dirs=(RUN_OUTPUTS_DIR,)):
+        # a ordem das raízes define a prioridade em nomes repetidos (custom/models primeiro)
+        self.roots = [Path(r) for r in roots]
+        # pastas de onde um caminho absoluto é aceito sem ser registrado
+        self.extra_dirs = [Path(d).resolve() for d in extra_dirs]
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.meta_reader = meta_reader
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._root_mtimes = {}
+        self._entries = {}
+        # (por id, por nome de arquivo, por nome sem extensão): trocado de uma vez em _reindex
+        self._index = ({}, {}, {})
+        self._watcher = None
+        self._stop = threading.Event()
+        self.scans = 0
+
+    # ---------------------------------------
+    # Varredura
+    # ---------------------------------------
+    def _root_mtime(self, root):
+        try:
+            return root.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _describe(self, path, st):
+        """
+        Entrada do registro para um arquivo: reaproveita o SQLite se (tamanho, mtime)
+        não mudaram; senão calcula hash e metadados.
+        """
+        key = str(path)
+        row = self._conn.execute("SELECT size, mtime_ns, sha256, meta FROM models WHERE path = ?", (key,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            sha256, meta = row[2], json.loads(row[3] or "{}")
+        else:
+            sha256 = hash_file(path)
+            meta = self.meta_reader(path)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO models (path, size, mtime_ns, sha256, meta) VALUES (?, ?, ?, ?, ?)",
+                (key, st.st_size, st.st_mtime_ns, sha256, json.dumps(meta, ensure_ascii=False, default=str)),
+            )
+            self._conn.commit()
+        return {
+            "name": path.name,
+            "path": key,
+            "root": str(path.parent),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": sha256,
+            **meta,
+        }
+
+    def _reindex(self):
+        by_id, by_name, by_stem = {}, {}, {}
+        for entry in self._entries.values():
+            for table, key in ((by_name, entry["name"]), (by_stem, Path(entry["name"]).stem)):
+                table.setdefault(key, entry)
+        for entry in self._entries.values():
+            # mesmo conteúdo em duas pastas: o id aponta para a primeira raiz
+            entry["id"] = entry["sha256"][:MODEL_ID_LEN]
+            by_id.setdefault(entry["id"], entry)
+        self._index = (by_id, by_name, by_stem)
+
+    def refresh(self, force=False):
+        """
+        Relê as raízes cujo mtime mudou (arquivo adicionado, removido ou renomeado).
+        Retorna True se algo foi relido.
+        """
+        with self._lock:
+            changed = [r for r in self.roots if force or self._root_mtimes.get(r, -1) != self._root_mtime(r)]
+            if not changed:
+                return False
+            entries = {}
+            for root in self.roots:
+                if root not in changed:
+                    entries.update({k: e for k, e in self._entries.items() if Path(k).parent == root})
+                    continue
+                self._root_mtimes[root] = self._root_mtime(root)
+                if not root.is_dir():
+                    continue
+                for f in sorted(root.iterdir()):
+                    if f.suffix.lower() not in MODEL_EXT:
+                        continue
+                    try:
+                        st = f.stat()
+                        if not f.is_file():
+                            continue
+                        entries[str(f)] = self._describe(f, st)
+                    except OSError as e:
+                        print(f"[WARNING] Modelo ignorado no registro ({f}): {e}")
+            # dicionário na ordem das raízes (prioridade de nomes repetidos)
+            self._entries = {k: entries[k] for root in self.roots for k in sorted(entries) if Path(k).parent == root}
+            self._reindex()
+            self.scans += 1
+            return True
+
+    def register_file(self, path):
+        """
+        Registra (ou atualiza) um arquivo de modelo recém-gravado, sem esperar o watcher.
+        """
+        path = Path(path).resolve()
+        with self._lock:
+            self.refresh()
+            entry = self._describe(path, path.stat())
+            self._entries[str(path)] = entry
+            if path.parent in self.roots:
+                self._root_mtimes[path.parent] = self._root_mtime(path.parent)
+            self._reindex()
+            return dict(entry)
+
+    # ---------------------------------------
+    # Consultas
+    # ---------------------------------------
+    def _fresh(self, entry):
+        """
+        Confere com um stat() se o arquivo ainda é o registrado (pesos sobrescritos
+        no mesmo nome não mudam o mtime da pasta).
+        """
+        try:
+            st = os.stat(entry["path"])
+        except OSError:
+            self.refresh(force=True)
+            return None
+        if st.st_size != entry["size"] or st.st_mtime_ns != entry["mtime_ns"]:
+            return self.register_file(entry["path"])
+        return entry
+
+    def _watched(self):
+        """
+        Garante o registro carregado. Sem watcher rodando (MODEL_REGISTRY_POLL_S=0),
+        cada consulta faz a checagem de mtime das raízes que o watcher faria.
+        """
+        if not self.scans or self._watcher is None or not self._watcher.is_alive():
+            self.refresh()
+
+    def _find(self, key, ids_only=False):
+        by_id, by_name, by_stem = self._index
+        if ids_only:
+            return by_id.get(key)
+        return by_id.get(key) or by_name.get(key) or by_stem.get(key)
+
+    def get(self, model_id, verify=False):
+        self._watched()
+        entry = self._find(model_id, ids_only=True)
+        if entry is not None and verify:
+            with self._lock:
+                entry = self._fresh(entry)
+        return dict(entry) if entry else None
+
+    def lookup(self, name, verify=False):
+        """
+        Entrada do modelo por id, nome de arquivo exato ('01_best.pt') ou nome sem
+        extensão ('01_best'): consulta em memória, sem tocar no disco. Com verify=True
+        (quem vai carregar os pesos), confere com um stat() se o arquivo ainda é o
+        registrado e, se o nome não existir, relê as raízes alteradas antes de desistir. Caminho absoluto também é aceito, só dentro das raízes ou de
+        extra_dirs (ver _lookup_path).
+        Retorna None se não houver correspondência exata.
+        """
+        if not isinstance(name, str) or not name.strip():
+            return None
+        key = name.strip()
+        self._watched()
+        entry = self._find(key)
+        if entry is None and verify:
+            # quem vai carregar não espera o próximo ciclo do watcher (ex.: arquivo copiado agora)
+            with self._lock:
+                self.refresh()
+            entry = self._find(key)
+        if entry is None:
+            p = Path(key)
+            if not p.is_absolute():
+                return None
+            with self._lock:
+                return self._lookup_path(p)
+        if verify:
+            with self._lock:
+                entry = self._fresh(entry)
+        return dict(entry) if entry else None
+
+    def _lookup_path(self, path):
+        """
+        Caminho absoluto de pesos: numa raiz, entra no registro (como um upload); em
+        extra_dirs, é descrito sem ser registrado; fora deles, é recusado (None), para
+        que nenhum arquivo arbitrário seja listado, hasheado ou carregado com torch.load.
+        """
+        try:
+            path = path.resolve()
+            if path.suffix.lower() not in MODEL_EXT or not path.is_file():
+                return None
+            if path.parent in self.roots:
+                entry = self._entries.get(str(path))
+                entry = self._fresh(entry) if entry else self.register_file(path)
+                return dict(entry) if entry else None
+            if any(d == path.parent or d in path.parents for d in self.extra_dirs):
+                entry = self._describe(path, path.stat())
+                entry["id"] = entry["sha256"][:MODEL_ID_LEN]
+                return entry
+        except OSError as e:
+            print(f"[WARNING] Modelo não resolvido ({path}): {e}")
+            return None
+        print(f"[WARNING] Caminho de modelo fora das pastas de modelos recusado: {path}")
+        return None
+
+    def resolve(self, name):
+        """
+        Caminho dos pesos para carregar (lookup com verify=True).
+        """
+        entry = self.lookup(name, verify=True)
+        return entry["path"] if entry else None
+
+    def list(self):
+        with self._lock:
+            self.refresh()
+            seen = set()
+            result = []
+            for entry in self._entries.values():
+                # nome repetido em duas raízes: só o de maior prioridade é visível
+                if entry["name"] in seen:
+                    continue
+                seen.add(entry["name"])
+                result.append(dict(entry))
+            return result
+
+    # ---------------------------------------
+    # Watcher
+    # ---------------------------------------
+    def start_watcher(self, interval=None):
+        """
+        Thread que verifica o mtime das pastas a cada `interval` segundos
+        (MODEL_REGISTRY_POLL_S, padrão 10; 0 desliga).
+        """
+        interval = _poll_interval_from_env() if interval is None else interval
+        if interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return self._watcher
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    if self.refresh():
+                        print(f"[INFO] Registro de modelos atualizado: {len(self._entries)} modelo(s).")
+                except Exception as e:
+                    print(f"[WARNING] Falha ao atualizar o registro de modelos: {e}")
+
+        self._stop.clear()
+        self._watcher = threading.Thread(target=loop, name="model-registry-watcher", daemon=True)
+        self._watcher.start()
+        return self._watcher
+
+    def stop_watcher(self):
+        self._stop.set()
+
+
+_REGISTRY = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_registry():
+    """
+    Instância única do registro (criada sob demanda, com o watcher ligado).
+    """
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            _REGISTRY = ModelRegistry()
+            _REGISTRY.start_watcher()
+        return _REGISTRY
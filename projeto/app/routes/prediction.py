@@ -2,74 +2,282 @@ import os
 import shutil
 import logging
 import random
+import time
+from concurrent.futures import TimeoutError as FuturesTimeout
 from pathlib import Path
 from datetime import datetime
 from flask import Blueprint, request, jsonify
 from flask import current_app as app
+from werkzeug.utils import secure_filename
+
+from .model_cache import MODEL_CACHE, MODELS_DIR, MODEL_EXT
+from .model_registry import get_registry
+from . import model_export
+from . import inference
+from .run_index import get_run_index, PREDICTIONS_DIR, RUN_PREFIX
+from .run_manifest import write_manifest
+from .profiling import profiled
+from .history import record_prediction_run, summarize_metrics
+from .train_models import EvaluationFailed
 
 log = logging.getLogger(__name__)
 bp = Blueprint("predict", __name__)
 
+def resolve_model_path(name):
+    """
+    Resolve o nome enviado pelo frontend para um arquivo de modelo via registro:
+    id, nome exato do arquivo, nome sem extensão ou caminho absoluto.
+    Retorna None se nada corresponder exatamente.
+    """
+    return get_registry().resolve(name)
+
+@bp.route("/cache", methods=["GET"])
+def model_cache_stats():
+    """Modelos residentes no cache, uso de memória e taxa de acerto."""
+    return jsonify(MODEL_CACHE.stats())
+
+def _default_model_name():
+    models = get_registry().list()
+    return models[0]["name"] if models else None
+
+@bp.route("/models", methods=["GET"])
+def list_registered_models():
+    """Modelos registrados com hash, tamanho, classes, task, imgsz e treino de origem."""
+    return jsonify({"models": get_registry().list()})
+
+@bp.route("/models/<model_id>", methods=["GET"])
+def get_registered_model(model_id):
+    entry = get_registry().get(model_id) or get_registry().lookup(model_id)
+    if entry is None:
+        return jsonify({"detail": f"Modelo não encontrado: {model_id}"}), 404
+    return jsonify(entry)
+
+@bp.route("/models", methods=["POST"])
+def upload_model():
+    """
+    Envia um arquivo de pesos (multipart, campo 'file') para custom/models e o
+    registra na hora. Um arquivo com o mesmo nome é substituído.
+    """
+    f = request.files.get("file")
+    if f is None or not f.filename:
+        return jsonify({"detail": "Nenhum arquivo enviado (campo 'file')."}), 400
+    filename = secure_filename(os.path.basename(f.filename))
+    if not filename or Path(filename).suffix.lower() not in MODEL_EXT:
+        return jsonify({"detail": f"Extensão não suportada. Envie um arquivo {', '.join(MODEL_EXT)}."}), 400
+    MODELS_DIR.mkdir(parents=True, exist_ok=True)
+    target = MODELS_DIR / filename
+    tmp = target.with_name(f".{filename}.upload")
+    try:
+        f.save(str(tmp))
+        os.replace(tmp, target)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    entry = get_registry().register_file(target)
+    MODEL_CACHE.invalidate(target)
+    print(f"[INFO] Modelo registrado: {entry['name']} (id={entry['id']})")
+    return jsonify(entry), 201
+
+def _classify_uploads(files):
+    """
+    Roda os arquivos enviados pela fila de micro-batching. Retorna (resposta, status).
+    """
+    model_name = request.values.get("model") or os.environ.get("PREDICT_DEFAULT_MODEL") or _default_model_name()
+    model_path = resolve_model_path(model_name) if model_name else None
+    if not model_path:
+        return {"detail": f"Modelo não encontrado: {model_name}"}, 400
+
+    try:
+        k = int(request.values.get("top_k", inference.DEFAULT_TOP_K))
+    except ValueError:
+        return {"detail": "'top_k' deve ser inteiro."}, 400
+
+    files = [f for f in files if f and f.filename]
+    if not files:
+        return {"detail": "Nenhuma imagem enviada (campo 'file' ou 'files')."}, 400
+    if len(files) > inference.MAX_QUEUE:
+        return {"detail": f"Máximo de {inference.MAX_QUEUE} imagens por requisição."}, 400
+
+    started = time.perf_counter()
+    images = []
+    for f in files:
+        try:
+            images.append(inference.decode_image(f.read()))
+        except ModuleNotFoundError:
+            raise
+        except Exception as e:
+            return {"detail": f"Imagem inválida '{f.filename}': {e}"}, 400
+
+    backend_path = model_export.resolve_backend_path(model_path, request.values.get("backend"))
+    results = inference.predict_images(backend_path, images, k=k)
+    latency_ms = round((time.perf_counter() - started) * 1000, 2)
+    items = [{"filename": f.filename, **r} for f, r in zip(files, results)]
+    return {"model": os.path.basename(model_path), "latency_ms": latency_ms, "results": items}, 200
+
+def _run_classification(files):
+    try:
+        body, status = _classify_uploads(files)
+    except inference.QueueFull as e:
+        return jsonify({"detail": str(e)}), 503
+    except FuturesTimeout:
+        return jsonify({"detail": "Tempo limite da inferência excedido."}), 504
+    except ModuleNotFoundError as me:
+        log.warning("Dependência de inferência ausente: %s", me)
+        return jsonify({"detail": f"Inferência indisponível no servidor: {me}"}), 503
+    except ValueError as e:
+        return jsonify({"detail": str(e)}), 400
+    except Exception as e:
+        log.exception("Erro inesperado na inferência")
+        return jsonify({"detail": f"Erro interno inesperado: {e}"}), 500
+    return jsonify(body), status
+
+@bp.route("/image", methods=["POST"])
+def predict_image():
+    """
+    Classifica uma imagem (multipart, campo 'file'). Parâmetros opcionais:
+    'model' (nome em custom/models) e 'top_k'.
+    """
+    response, status = _run_classification([request.files.get("file")])
+    if status == 200:
+        body = response.get_json()
+        result = body.pop("results")[0]
+        body.update(result)
+        return jsonify(body), status
+    return response, status
+
+@bp.route("/batch", methods=["POST"])
+def predict_batch():
+    """
+    Classifica várias imagens (multipart, campo 'files' repetido).
+    """
+    return _run_classification(request.files.getlist("files") or request.files.getlist("file"))
+
+@bp.route("/inference-stats", methods=["GET"])
+def inference_stats():
+    """Tamanho médio dos lotes e fila por modelo."""
+    return jsonify(inference.batcher_stats())
+
+def _finalize_run(output_path, predictions_base, evaluation, started_at=None):
+    """
+    Grava o manifest.json da execução, atualiza o índice de execuções e registra
+    a execução no histórico. Retorna a URL do manifesto (None se não foi possível gerá-lo).
+    """
+    record_prediction_run(output_path, evaluation, started_at=started_at, finished_at=time.time())
+    try:
+        write_manifest(output_path, {"evaluation": evaluation})
+    except OSError as e:
+        print(f"[WARNING] Não foi possível gravar o manifesto de {output_path}: {e}")
+        return None
+    get_run_index(predictions_base).register(output_path)
+    return f"/predictions/{output_path.name}/manifest"
+
+@bp.route("/exports", methods=["GET"])
+def list_model_exports():
+    """Exportações em cache (custom/cache/exports)."""
+    return jsonify({"exports": model_export.list_exports()})
+
+@bp.route("/exports", methods=["POST"])
+def create_model_export():
+    """
+    Exporta um modelo registrado antecipadamente: {"model": ..., "backend": "onnx", "imgsz": 224}.
+    "force": true tenta de novo uma exportação que já falhou (ex.: depois de instalar onnx/openvino).
+    """
+    payload = request.get_json() or {}
+    model_path = resolve_model_path(payload.get("model"))
+    if not model_path:
+        return jsonify({"detail": f"Modelo não encontrado: {payload.get('model')}"}), 404
+    try:
+        info = model_export.export_model(model_path, payload.get("backend") or "onnx", payload.get("imgsz"),
+                                         force=bool(payload.get("force")))
+    except model_export.ExportFailed as e:
+        return jsonify({"detail": f"Exportação falhou anteriormente: {e}. Envie \"force\": true para tentar de novo."}), 409
+    except ValueError as e:
+        return jsonify({"detail": str(e)}), 400
+    except ModuleNotFoundError as me:
+        return jsonify({"detail": f"Exportação indisponível no servidor: {me}"}), 503
+    except Exception as e:
+        log.exception("Erro ao exportar modelo")
+        return jsonify({"detail": f"Falha na exportação: {e}"}), 500
+    return jsonify(info)
+
+@bp.route("/backends/compare", methods=["POST"])
+def compare_model_backends():
+    """
+    Relatório de latência, throughput e delta de top-1 de cada backend contra o .pt:
+    {"model": ..., "backends": ["onnx", "openvino"], "path": dataset, "split": "test", "limit": 200}.
+    """
+    payload = request.get_json() or {}
+    model_path = resolve_model_path(payload.get("model"))
+    if not model_path:
+        return jsonify({"detail": f"Modelo não encontrado: {payload.get('model')}"}), 404
+    dataset_path = payload.get("path") or str((Path(__file__).resolve().parent.parent / "storage" / "datasets_yolo" / "CM" / "01").resolve())
+    try:
+        report = model_export.compare_backends(
+            model_path,
+            dataset_path,
+            split=payload.get("split", "test"),
+            backends=payload.get("backends") or ["onnx"],
+            limit=int(payload.get("limit", 200)),
+            warmup=int(payload.get("warmup", 5)),
+            batch_size=int(payload.get("batch_size", 16)),
+            imgsz=payload.get("imgsz"),
+        )
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({"detail": str(e)}), 400
+    except ModuleNotFoundError as me:
+        return jsonify({"detail": f"Comparação indisponível no servidor: {me}"}), 503
+    except Exception as e:
+        log.exception("Erro na comparação de backends")
+        return jsonify({"detail": f"Erro interno inesperado: {e}"}), 500
+    return jsonify(report)
+
 @bp.route("/run", methods=["POST"])
+@profiled("predict_run")
 def run_predict():
+    started_at = time.time()
+    output_path = None
     payload = request.get_json() or {}
     models = payload.get("models", [])
     if not models or not isinstance(models, list):
         return jsonify({"detail": "Payload inválido: 'models' é obrigatório e deve ser lista."}), 400
 
-    # Resolve workspace root and prefer workspace-level custom models directory:
-    # prediction.py is at .../projeto/app/routes/prediction.py, so parents[3] reaches workspace root
-    workspace_root = Path(__file__).resolve().parents[3]
-    custom_models_dir = (workspace_root / "custom" / "models").resolve()
-    # fallback to legacy storage path inside the projeto folder
-    legacy_storage = (Path(__file__).resolve().parent.parent / "storage" / "models_yolo").resolve()
-    base = custom_models_dir if custom_models_dir.exists() else legacy_storage
-    print(f"Model base path: {base}")
     model_paths = []
     missing = []
 
     for m in models:
-        if not isinstance(m, str) or not m.strip():
-            missing.append(str(m))
-            continue
-        m_str = m.strip()
-        p = Path(m_str)
-        if p.is_absolute() and p.is_file():
-            model_paths.append(str(p))
-            continue
-        candidate = base / m_str
-        if candidate.is_file():
-            model_paths.append(str(candidate))
-            continue
-        found = None
-        if base.exists() and base.is_dir():
-            for f in os.listdir(base):
-                if m_str == f or m_str in f:
-                    fp = base / f
-                    if fp.is_file():
-                        found = fp
-                        break
+        found = resolve_model_path(m)
         if found:
-            model_paths.append(str(found))
+            model_paths.append(found)
         else:
-            missing.append(m_str)
+            missing.append(str(m).strip() if isinstance(m, str) else str(m))
 
-    print("Chegou aqui", model_paths)
     if not model_paths:
         print(f"No valid models found. Missing: {missing}")
         return jsonify({"detail": f"Nenhum modelo válido encontrado. Missing: {missing}"}), 400
-    print("Chegou aqu 222 ")
 
     dataset_path = None
+    parallel = False
+    workers = None
+    use_shards = False
+    backend = None
     options = payload.get("options") or {}
     if isinstance(options, dict):
         dataset_path = options.get("path")
-    print("Chegou aqu 2 ")
+        # avaliação paralela opcional (um processo por modelo, threads divididas entre eles)
+        parallel = bool(options.get("parallel", False))
+        workers = options.get("workers")
+        # lê o dataset a partir dos shards empacotados, se existirem
+        use_shards = bool(options.get("use_shards", False))
+        # backend de inferência (pt/onnx/openvino); padrão PREDICT_BACKEND
+        backend = options.get("backend")
+    try:
+        backend = model_export.normalize_backend(backend)
+    except ValueError as e:
+        return jsonify({"detail": str(e)}), 400
 
     # fallback para path de dataset padrão caso frontend não envie (evita dataset None)
     if not dataset_path:
         dataset_path = str((Path(__file__).resolve().parent.parent / "storage" / "datasets_yolo" / "CM" / "01").resolve())
-    print("Chegou aqu 3")
 
     try:
         # prefer local implementation (projeto/app/routes/train_models.py)
@@ -81,12 +289,14 @@ def run_predict():
             from backend.app.routes.train_models import function_test_yolo
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        predictions_base = Path.cwd() / "predictions"
+        # mesma pasta servida pelo app.py em /predictions (não depende do cwd)
+        predictions_base = PREDICTIONS_DIR
         predictions_base.mkdir(parents=True, exist_ok=True)
-        output_path = predictions_base / f"predicao_{timestamp}"
+        output_path = predictions_base / f"{RUN_PREFIX}{timestamp}"
         if output_path.exists():
             shutil.rmtree(output_path)
         output_path.mkdir(parents=True, exist_ok=True)
+        get_run_index(predictions_base).register(output_path)
         print('=-='*30)
         print(f"dataset_path: {dataset_path}")
         print(f"model_paths: {model_paths}")
@@ -97,16 +307,31 @@ def run_predict():
             dataset_path=dataset_path,
             split="test",
             project_name="predicao",
-            output_dir=str(output_path)
+            output_dir=str(output_path),
+            parallel=parallel,
+            workers=workers,
+            use_shards=use_shards,
+            backend=backend
         )
 
         evaluated = [os.path.basename(p) for p in model_paths]
         results_summary = {k: (type(v).__name__) for k, v in (results or {}).items()}
+        manifest_url = _finalize_run(output_path, predictions_base, {
+            "status": "completed",
+            "evaluated": evaluated,
+            "missing": missing,
+            "dataset_path": str(dataset_path),
+            "split": "test",
+            "backend": backend,
+            "metrics": {k: summarize_metrics(v) for k, v in (results or {}).items()},
+        }, started_at=started_at)
         return jsonify({
             "status": "completed",
             "evaluated": evaluated,
             "missing": missing,
-            "results_summary": results_summary
+            "results_summary": results_summary,
+            "run": output_path.name,
+            "manifest_url": manifest_url
         })
 
     except ModuleNotFoundError as me:
@@ -127,8 +352,33 @@ def run_predict():
             "results_summary": mock_results
         })
 
+    except EvaluationFailed as e:
+        # avaliação paralela com falhas: só os modelos que terminaram entram como avaliados
+        log.error("Avaliação parcial em /predict/run: %s", e)
+        _finalize_run(output_path, predictions_base, {
+            "status": "error",
+            "evaluated": list(e.results),
+            "failed": e.failures,
+            "missing": missing,
+            "dataset_path": str(dataset_path),
+            "split": "test",
+            "backend": backend,
+            "metrics": {k: summarize_metrics(v) for k, v in e.results.items()},
+        }, started_at=started_at)
+        return jsonify({
+            "status": "error",
+            "evaluated": list(e.results),
+            "failed": e.failures,
+            "missing": missing,
+            "run": output_path.name,
+            "detail": str(e)
+        }), 500
+
     except Exception as e:
         print(f"Unexpected error: {e}")
         log.exception("Erro inesperado ao processar /predict/run")
+        if output_path is not None and output_path.is_dir():
+            record_prediction_run(output_path, {"dataset_path": str(dataset_path), "missing": missing},
+                                  started_at=started_at, finished_at=time.time(), status="error")
         return jsonify({"detail": f"Erro interno inesperado: {e}"}), 500
 
@@ -0,0 +1,175 @@
+import os
+import io
+import time
+import random
+import pstats
+import cProfile
+import functools
+from pathlib import Path
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify, make_response, send_file, abort, Response
+
+# ============================================================
+# 🔧 Profiling opcional de requisições e jobs (cProfile)
+# ============================================================
+#
+# Liga por requisição com o header "X-Profile: 1" ou "?profile=1", ou por
+# amostragem com PROFILE_SAMPLE_RATE (0 a 1, padrão 0). Desligado, o custo é só
+# a checagem do header/parâmetro: nenhum profiler é instalado.
+# O perfil (.prof, abre com snakeviz/pstats) e um resumo em texto (.prof.txt)
+# ficam em runs/logs, ao lado dos logs dos jobs; jobs de treino usam o próprio
+# job_id como nome. Download em GET /profiles/<nome> (?format=txt para o resumo).
+#
+# O cProfile só enxerga a thread em que roda: o treino YOLO (subprocesso) e a
+# avaliação paralela (pool de processos) aparecem como espera (wait/result).
+
+PROFILES_DIR = Path(__file__).resolve().parents[3] / "runs" / "logs"
+PROFILE_EXT = ".prof"
+SUMMARY_EXT = ".prof.txt"
+SUMMARY_LINES = 60
+TRUTHY = ("1", "true", "yes", "on")
+
+
+def _sample_rate():
+    value = os.environ.get("PROFILE_SAMPLE_RATE")
+    try:
+        return min(1.0, max(0.0, float(value))) if value else 0.0
+    except ValueError:
+        print(f"[WARNING] PROFILE_SAMPLE_RATE='{value}' inválido. Profiling por amostragem desligado.")
+        return 0.0
+
+
+SAMPLE_RATE = _sample_rate()
+
+
+def wants_profile(req=None):
+    """
+    True se a requisição pediu profiling (header/parâmetro) ou caiu na amostragem.
+    """
+    req = req or request
+    flag = req.headers.get("X-Profile") or req.args.get("profile")
+    if flag is not None:
+        return flag.strip().lower() in TRUTHY
+    return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+
+def profile_name(prefix):
+    return f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+
+
+def profile_path(name):
+    return PROFILES_DIR / f"{name}{PROFILE_EXT}"
+
+
+def profile_url(name):
+    return f"/profiles/{name}"
+
+
+class ProfileCapture:
+    """
+    with ProfileCapture(nome): ... -> grava runs/logs/<nome>.prof e <nome>.prof.txt.
+    Se outro profiler já estiver ativo na thread, segue sem perfil (enabled=False).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.path = profile_path(name)
+        self.enabled = False
+        self.elapsed_s = None
+        self._profiler = cProfile.Profile()
+
+    def __enter__(self):
+        try:
+            self._profiler.enable()
+            self.enabled = True
+        except ValueError as e:
+            print(f"[WARNING] Profiling de '{self.name}' ignorado: {e}")
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed_s = time.perf_counter() - self._started
+        if not self.enabled:
+            return False
+        self._profiler.disable()
+        try:
+            self._save()
+            print(f"[INFO] Perfil de '{self.name}' salvo em {self.path} ({self.elapsed_s:.2f}s)")
+        except OSError as e:
+            print(f"[WARNING] Não foi possível salvar o perfil de '{self.name}': {e}")
+            self.enabled = False
+        return False
+
+    def _save(self):
+        PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+        self._profiler.dump_stats(str(self.path))
+        out = io.StringIO()
+        out.write(f"{self.name}: {self.elapsed_s:.3f}s\n\n")
+        stats = pstats.Stats(self._profiler, stream=out)
+        stats.sort_stats("cumulative").print_stats(SUMMARY_LINES)
+        out.write("\n")
+        stats.sort_stats("tottime").print_stats(SUMMARY_LINES // 2)
+        with open(PROFILES_DIR / f"{self.name}{SUMMARY_EXT}", "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+
+
+def profiled(prefix):
+    """
+    Decorador de rota: com profiling pedido, roda a view sob o cProfile e devolve
+    os headers X-Profile-Id / X-Profile-Url. Sem pedido, chama a view direto.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not wants_profile():
+                return view(*args, **kwargs)
+            with ProfileCapture(profile_name(prefix)) as capture:
+                rv = view(*args, **kwargs)
+            resp = make_response(rv)
+            if capture.enabled:
+                resp.headers["X-Profile-Id"] = capture.name
+                resp.headers["X-Profile-Url"] = profile_url(capture.name)
+            return resp
+        return wrapper
+    return decorator
+
+
+def _resolve(name):
+    # o nome vem da URL (job_id pode ter qualquer caractere): só aceita arquivos diretos de runs/logs
+    path = profile_path(name)
+    try:
+        if path.resolve().parent != PROFILES_DIR:
+            return None
+    except OSError:
+        return None
+    return path if path.is_file() else None
+
+
+bp = Blueprint("profiles", __name__)
+
+
+@bp.route("", methods=["GET"])
+def list_profiles():
+    items = []
+    if PROFILES_DIR.is_dir():
+        for entry in os.scandir(PROFILES_DIR):
+            if entry.is_file() and entry.name.endswith(PROFILE_EXT):
+                st = entry.stat()
+                name = entry.name[:-len(PROFILE_EXT)]
+                items.append({"name": name, "size": st.st_size, "mtime": st.st_mtime, "url": profile_url(name)})
+    items.sort(key=lambda p: p["mtime"], reverse=True)
+    return jsonify({"profiles": items, "sample_rate": SAMPLE_RATE})
+
+
+@bp.route("/<path:name>", methods=["GET"])
+def download_profile(name):
+    path = _resolve(name)
+    if path is None:
+        abort(404)
+    if request.args.get("format") == "txt":
+        summary = path.with_name(path.name[:-len(PROFILE_EXT)] + SUMMARY_EXT)
+        if not summary.is_file():
+            abort(404)
+        return Response(summary.read_text(encoding="utf-8"), content_type="text/plain; charset=utf-8")
+    return send_file(str(path), mimetype="application/octet-stream", as_attachment=True, download_name=path.name)
@@ -0,0 +1,182 @@
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+
+# ============================================================
+# 🔧 Índice em memória das execuções de predição (predictions/predicao_*)
+# ============================================================
+#
+# /predictions/runs, /predictions/last_dir e /predictions/<run>/models são
+# consultados pela UI o tempo todo. Em vez de iterdir()+stat() na árvore inteira
+# a cada requisição, o índice guarda as execuções e só reescaneia a pasta quando
+# o mtime dela muda (criação/remoção de uma predicao_*). A lista de modelos de
+# cada execução segue a mesma regra com o mtime da pasta da execução.
+# O run_predict registra a pasta nova direto no índice. Cada resposta carrega um
+# ETag derivado do conteúdo, para que o polling receba 304.
+
+RUN_PREFIX = "predicao_"
+
+# Pasta de predições do projeto (raiz do repositório, a mesma do BASE_DIR do app.py),
+# independente do diretório de onde o servidor foi iniciado
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+PREDICTIONS_DIR = PROJECT_ROOT / "predictions"
+
+
+def _mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _etag(*parts):
+    raw = json.dumps(parts, separators=(",", ":"), default=str).encode()
+    return hashlib.sha1(raw).hexdigest()[:20]
+
+
+class _Run:
+    def __init__(self, name, mtime_ns):
+        self.name = name
+        self.mtime_ns = mtime_ns
+        self.models = None
+        self.models_mtime_ns = None
+
+
+class RunIndex:
+    def __init__(self, base_dir):
+        self.base_dir = Path(base_dir)
+        self._lock = threading.Lock()
+        self._runs = {}
+        self._ordered = []
+        self._dir_mtime_ns = None
+        self.etag = _etag()
+        self.scans = 0
+
+    # --- varredura ---
+
+    def _rescan(self, dir_mtime_ns):
+        runs = {}
+        try:
+            with os.scandir(self.base_dir) as it:
+                for entry in it:
+                    if entry.name.startswith(RUN_PREFIX) and entry.is_dir():
+                        old = self._runs.get(entry.name)
+                        run = _Run(entry.name, entry.stat().st_mtime_ns)
+                        if old is not None and old.models_mtime_ns == run.mtime_ns:
+                            run.models, run.models_mtime_ns = old.models, old.models_mtime_ns
+                        runs[entry.name] = run
+        except OSError:
+            runs = {}
+        self._runs = runs
+        self._dir_mtime_ns = dir_mtime_ns
+        self.scans += 1
+        self._reorder()
+
+    def _reorder(self):
+        # mais recente primeiro (mesma ordem das rotas antigas: mtime decrescente)
+        self._ordered = sorted(self._runs.values(), key=lambda r: (r.mtime_ns, r.name), reverse=True)
+        self.etag = _etag([(r.name, r.mtime_ns) for r in self._ordered])
+
+    def _refresh(self):
+        current = _mtime_ns(self.base_dir)
+        if current != self._dir_mtime_ns:
+            self._rescan(current)
+
+    def _run_models(self, run):
+        run_dir = self.base_dir / run.name
+        current = _mtime_ns(run_dir)
+        if current is None:
+            return None
+        if run.models is None or current != run.models_mtime_ns:
+            try:
+                run.models = sorted(e.name for e in os.scandir(run_dir) if e.is_dir())
+            except OSError:
+                run.models = []
+            run.models_mtime_ns = current
+            if current != run.mtime_ns:
+                # a pasta mudou (modelo avaliado gravou a subpasta): atualiza a ordem
+                run.mtime_ns = current
+                self._reorder()
+        return run.models
+
+    # --- consultas ---
+
+    def list_runs(self, offset=0, limit=None):
+        """
+        (nomes da página, total, etag) com as execuções da mais recente para a mais antiga.
+        """
+        with self._lock:
+            self._refresh()
+            total = len(self._ordered)
+            end = total if limit is None else offset + limit
+            names = [r.name for r in self._ordered[offset:end]]
+            return names, total, self.etag
+
+    def latest(self):
+        """
+        (nome, [subpastas], etag) da execução mais recente, ou (None, [], etag).
+        """
+        with self._lock:
+            self._refresh()
+            if not self._ordered:
+                return None, [], self.etag
+            # _run_models só aumenta o mtime, então a execução continua sendo a primeira
+            run = self._ordered[0]
+            models = self._run_models(run) or []
+            return run.name, list(models), _etag(self.etag, run.name, models)
+
+    def models(self, run_name):
+        """
+        ([subpastas da execução], etag), ou (None, None) se a execução não existir.
+        """
+        with self._lock:
+            self._refresh()
+            run = self._runs.get(run_name)
+            if run is None:
+                # pasta fora do padrão predicao_*: consulta direto, sem entrar no índice
+                run_dir = self.base_dir / run_name
+                if not run_dir.is_dir():
+                    return None, None
+                run = _Run(run_name, _mtime_ns(run_dir))
+            models = self._run_models(run)
+            if models is None:
+                return None, None
+            return list(models), _etag(run_name, run.models_mtime_ns, models)
+
+    # --- atualização ---
+
+    def register(self, run_dir):
+        """
+        Registra uma pasta de execução recém-criada (chamado pelo run_predict),
+        sem esperar a próxima varredura. O mtime da pasta base não é atualizado
+        aqui: outras execuções criadas ao mesmo tempo continuam sendo vistas pela
+        próxima varredura.
+        """
+        run_dir = Path(run_dir)
+        with self._lock:
+            if self._dir_mtime_ns is None:
+                self._refresh()
+            self._runs[run_dir.name] = _Run(run_dir.name, _mtime_ns(run_dir) or 0)
+            self._reorder()
+
+    def invalidate(self):
+        with self._lock:
+            self._dir_mtime_ns = None
+
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_run_index(base_dir=PREDICTIONS_DIR):
+    """
+    Índice compartilhado da pasta de predições (um por caminho resolvido).
+    """
+    key = str(Path(base_dir).resolve())
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        if index is None:
+            index = _INDEXES[key] = RunIndex(key)
+        return index
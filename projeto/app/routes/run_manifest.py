@@ -0,0 +1,141 @@
+import os
+import json
+import mimetypes
+from pathlib import Path
+from datetime import datetime
+from urllib.parse import quote
+
+# ============================================================
+# 🔧 Manifesto JSON dos artefatos de uma execução de predição
+# ============================================================
+#
+# Ao fim do /predict/run, predictions/<run>/manifest.json lista de uma vez
+# todos os artefatos por modelo (matrizes de confusão, gráficos, lotes de
+# validação, CSVs), com tamanho, content-type e URL. O frontend lê esse arquivo
+# numa única requisição em vez de raspar listagens HTML e mandar um HEAD por
+# arquivo candidato. Execuções antigas sem manifesto ganham um na primeira leitura.
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+PREDICTIONS_URL = "/predictions"
+
+IMAGE_EXT = {".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp", ".svg"}
+DATA_EXT = {".csv", ".json", ".txt", ".yaml", ".yml"}
+
+
+def _kind(name):
+    lower = name.lower()
+    ext = os.path.splitext(lower)[1]
+    if ext in IMAGE_EXT:
+        if lower.startswith("confusion_matrix"):
+            return "confusion_matrix"
+        if lower.startswith(("val_batch", "train_batch")):
+            return "batch"
+        return "plot"
+    if ext in DATA_EXT:
+        return "data"
+    return "other"
+
+
+def _file_entry(run_dir, path, run_url):
+    rel = path.relative_to(run_dir).as_posix()
+    st = path.stat()
+    content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    return {
+        "name": path.name,
+        "path": rel,
+        "url": f"{run_url}/{quote(rel)}",
+        "size": st.st_size,
+        "mtime": int(st.st_mtime),
+        "content_type": content_type,
+        "kind": _kind(path.name),
+        "is_image": content_type.startswith("image/"),
+    }
+
+
+def build_manifest(run_dir, extra=None, url_prefix=PREDICTIONS_URL):
+    """
+    Monta o manifesto de predictions/<run>: uma entrada por subpasta de modelo
+    (arquivos em qualquer nível abaixo dela) e os arquivos soltos da execução.
+    """
+    run_dir = Path(run_dir)
+    run_url = f"{url_prefix}/{quote(run_dir.name)}"
+    models = []
+    loose = []
+    total_files = total_bytes = 0
+
+    for entry in sorted(run_dir.iterdir(), key=lambda p: p.name):
+        if entry.is_dir():
+            files = []
+            for dirpath, dirnames, filenames in os.walk(entry):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    files.append(_file_entry(run_dir, Path(dirpath) / name, run_url))
+            model_bytes = sum(f["size"] for f in files)
+            models.append({
+                "name": entry.name,
+                "url": f"{run_url}/{quote(entry.name)}",
+                "files": files,
+                "images": [f["url"] for f in files if f["is_image"]],
+                "confusion_matrices": [f["url"] for f in files if f["kind"] == "confusion_matrix"],
+                "plots": [f["url"] for f in files if f["kind"] == "plot"],
+                "file_count": len(files),
+                "bytes": model_bytes,
+            })
+            total_files += len(files)
+            total_bytes += model_bytes
+        elif entry.is_file() and entry.name != MANIFEST_NAME:
+            loose.append(_file_entry(run_dir, entry, run_url))
+            total_files += 1
+            total_bytes += loose[-1]["size"]
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "run": run_dir.name,
+        "url": run_url,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "models": models,
+        "files": loose,
+        "totals": {"models": len(models), "files": total_files, "bytes": total_bytes},
+    }
+    if extra:
+        manifest.update(extra)
+    return manifest
+
+
+def manifest_path(run_dir):
+    return Path(run_dir) / MANIFEST_NAME
+
+
+def write_manifest(run_dir, extra=None):
+    """
+    Gera e grava predictions/<run>/manifest.json (escrita atômica). Retorna o manifesto.
+    """
+    manifest = build_manifest(run_dir, extra)
+    target = manifest_path(run_dir)
+    tmp = target.with_suffix(".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, target)
+    return manifest
+
+
+def ensure_manifest(run_dir, refresh=False):
+    """
+    Caminho do manifesto da execução, gerando-o se ainda não existir (execuções
+    anteriores a este recurso) ou se refresh=True. Preserva os campos extras
+    gravados no fim da execução (modelos avaliados, dataset, etc.).
+    """
+    target = manifest_path(run_dir)
+    if target.is_file() and not refresh:
+        return target
+    extra = None
+    if target.is_file():
+        try:
+            with open(target, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+            extra = previous.get("evaluation") and {"evaluation": previous["evaluation"]}
+        except (OSError, ValueError):
+            extra = None
+    write_manifest(run_dir, extra)
+    return target
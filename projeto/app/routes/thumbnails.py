@@ -0,0 +1,97 @@
+import os
+import hashlib
+import threading
+from pathlib import Path
+
+from .image_catalog import CACHE_DIR
+
+# ============================================================
+# 🔧 Miniaturas dos artefatos de predição (?w=) com cache em disco
+# ============================================================
+#
+# Matrizes de confusão e lotes de validação são PNG/JPG em resolução cheia; a
+# página de resultados só precisa de uma versão pequena. A miniatura é gerada
+# na primeira requisição e guardada em custom/cache/thumbs, com chave
+# (caminho, mtime, tamanho, largura): se o artefato for regravado, a chave muda
+# e uma nova miniatura é gerada. A largura é arredondada para múltiplos de
+# THUMB_STEP para não encher o cache com uma variante por pixel.
+
+THUMBS_DIR = CACHE_DIR / 'thumbs'
+THUMB_EXT = {'.png', '.jpg', '.jpeg', '.bmp', '.webp'}
+THUMB_MIN_W = 32
+THUMB_MAX_W = 2048
+THUMB_STEP = 32
+JPEG_QUALITY = 85
+
+_LOCKS = {}
+_LOCKS_GUARD = threading.Lock()
+
+
+def normalize_width(value):
+    """
+    Largura pedida em ?w= limitada a [THUMB_MIN_W, THUMB_MAX_W] e arredondada
+    para cima em THUMB_STEP. ValueError se não for um inteiro.
+    """
+    w = int(value)
+    w = min(THUMB_MAX_W, max(THUMB_MIN_W, w))
+    return -(-w // THUMB_STEP) * THUMB_STEP
+
+
+def source_tag(path):
+    """
+    Identificador forte do conteúdo (caminho + mtime + tamanho), usado como ETag e chave do cache.
+    """
+    st = os.stat(path)
+    raw = f"{Path(path).resolve()}|{st.st_mtime_ns}|{st.st_size}".encode()
+    return hashlib.sha1(raw).hexdigest()
+
+
+def _lock_for(key):
+    with _LOCKS_GUARD:
+        lock = _LOCKS.get(key)
+        if lock is None:
+            lock = _LOCKS[key] = threading.Lock()
+        return lock
+
+
+def thumbnail_path(src, width, root=THUMBS_DIR):
+    tag = source_tag(src)
+    ext = '.png' if Path(src).suffix.lower() == '.png' else '.jpg'
+    return Path(root) / tag[:2] / f"{tag}_w{width}{ext}"
+
+
+def get_thumbnail(src, width, root=THUMBS_DIR):
+    """
+    Caminho da miniatura de `src` com a largura `width` (já normalizada), gerando-a
+    se ainda não existir. Imagens menores que `width` não são ampliadas.
+    """
+    dst = thumbnail_path(src, width, root)
+    if dst.exists():
+        return dst
+    with _lock_for(str(dst)):
+        if dst.exists():
+            return dst
+        from PIL import Image
+
+        with Image.open(src) as im:
+            im.draft(None, (width, width))
+            if im.mode == 'P':
+                # paleta: converte antes de redimensionar (LANCZOS não se aplica a 'P')
+                im = im.convert('RGBA' if 'transparency' in im.info else 'RGB')
+            if dst.suffix == '.jpg' and im.mode not in ('L', 'RGB'):
+                im = im.convert('RGB')
+            if im.width > width:
+                height = max(1, round(im.height * width / im.width))
+                im = im.resize((width, height), Image.LANCZOS)
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            tmp = dst.with_name(f"{dst.name}.{threading.get_ident()}.tmp")
+            try:
+                if dst.suffix == '.png':
+                    im.save(tmp, format='PNG', optimize=True)
+                else:
+                    im.save(tmp, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+            except Exception:
+                tmp.unlink(missing_ok=True)
+                raise
+        os.replace(tmp, dst)
+    return dst
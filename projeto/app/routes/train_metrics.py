@@ -0,0 +1,205 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+# ============================================================
+# 🔧 Métricas por época dos treinos (leitura incremental do results.csv)
+# ============================================================
+#
+# O Ultralytics acrescenta uma linha por época em <save_dir>/results.csv.
+# Cada job tem um leitor que guarda o offset já lido: a cada consulta só os
+# bytes novos são processados. As colunas do CSV são normalizadas para nomes
+# curtos (train_loss, top1, top5, val_loss, lr) e completadas com o tempo da
+# época e a vazão (imagens de treino por segundo).
+
+RESULTS_FILE = "results.csv"
+DEFAULT_PROJECT = Path("./runs/classify")
+# Leitores em memória (jobs ativos); os de jobs encerrados saem em drop_reader
+MAX_READERS = 64
+
+# O trainer do Ultralytics anuncia a pasta real do run (já com o sufixo 2, 3...)
+_SAVE_DIR_LINE = re.compile(r"(?:Logging results to|Results saved to)\s+(.+?)\s*$")
+_ANSI = re.compile(r"\x1b\[[0-9;]*m")
+
+# coluna do CSV (sem espaços) -> nome exposto na API
+COLUMN_MAP = {
+    "epoch": "epoch",
+    "time": "elapsed_s",
+    "train/loss": "train_loss",
+    "metrics/accuracy_top1": "top1",
+    "metrics/accuracy_top5": "top5",
+    "val/loss": "val_loss",
+    "lr/pg0": "lr",
+}
+
+IMG_EXT = {".jpg", ".jpeg", ".png", ".bmp", ".tiff"}
+
+
+def parse_save_dir(line, cwd=None):
+    """
+    Pasta do run anunciada numa linha do log do YOLO ("Logging results to ..."),
+    resolvida a partir do cwd do processo de treino. None se a linha não é essa.
+    """
+    match = _SAVE_DIR_LINE.search(_ANSI.sub("", line))
+    if not match:
+        return None
+    path = Path(match.group(1).strip().strip("'\""))
+    if not path.is_absolute() and cwd:
+        path = Path(cwd) / path
+    return path
+
+
+def find_save_dir(job):
+    """
+    Pasta do run do YOLO de um job: a gravada no registro (save_dir, lida do log
+    do processo de treino). Registros antigos, sem ela, só aceitam <project>/<name>
+    exato: com o nome incrementado pelo Ultralytics não dá para saber qual é o do job.
+    """
+    if not job:
+        return None
+    if job.get("save_dir"):
+        save_dir = Path(job["save_dir"])
+        return save_dir if save_dir.is_dir() else None
+    config = job.get("config") or {}
+    if not config.get("name"):
+        return None
+    save_dir = Path(config.get("project") or DEFAULT_PROJECT) / str(config["name"])
+    return save_dir if save_dir.is_dir() else None
+
+
+def count_train_images(data_dir):
+    train_dir = Path(data_dir) / "train" if data_dir else None
+    if train_dir is None or not train_dir.is_dir():
+        return None
+    total = 0
+    for _root, _dirs, files in os.walk(train_dir):
+        total += sum(1 for f in files if os.path.splitext(f)[1].lower() in IMG_EXT)
+    return total
+
+
+def _to_number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() and abs(number) < 1e15 else number
+
+
+class MetricsReader:
+    """
+    Leitor incremental do results.csv de um job.
+    """
+
+    def __init__(self, csv_path, train_images=None):
+        self.csv_path = Path(csv_path)
+        self.train_images = train_images
+        self.offset = 0
+        self.header = None
+        self.rows = []
+        self._partial = b""
+        self._lock = threading.Lock()
+
+    def _reset(self):
+        self.offset = 0
+        self.header = None
+        self.rows = []
+        self._partial = b""
+
+    def poll(self):
+        """
+        Processa as linhas novas do CSV. Se o arquivo encolheu (reescrito), relê do zero.
+        """
+        with self._lock:
+            try:
+                size = self.csv_path.stat().st_size
+            except OSError:
+                return self.rows
+            if size < self.offset:
+                self._reset()
+            if size == self.offset:
+                return self.rows
+            with open(self.csv_path, "rb") as f:
+                f.seek(self.offset)
+                chunk = f.read()
+            self.offset += len(chunk)
+            lines = (self._partial + chunk).split(b"\n")
+            # última linha sem \n ainda está sendo escrita
+            self._partial = lines.pop()
+            for line in lines:
+                self._parse_line(line.decode("utf-8", errors="replace"))
+            return self.rows
+
+    def _parse_line(self, line):
+        cells = [c.strip() for c in line.strip().split(",")]
+        if not any(cells):
+            return
+        if self.header is None:
+            self.header = cells
+            return
+        raw = dict(zip(self.header, cells))
+        row = {}
+        for column, key in COLUMN_MAP.items():
+            if column in raw:
+                row[key] = _to_number(raw[column])
+        if row.get("epoch") is None:
+            return
+
+        previous = self.rows[-1] if self.rows else None
+        elapsed = row.get("elapsed_s")
+        if elapsed is not None:
+            epoch_time = elapsed - (previous.get("elapsed_s") or 0) if previous else elapsed
+            row["epoch_time_s"] = round(epoch_time, 3) if epoch_time > 0 else None
+        else:
+            row["epoch_time_s"] = None
+        if row["epoch_time_s"] and self.train_images:
+            row["images_per_s"] = round(self.train_images / row["epoch_time_s"], 1)
+        else:
+            row["images_per_s"] = None
+        self.rows.append(row)
+
+    def since(self, epoch=None):
+        rows = self.poll()
+        if epoch is None:
+            return list(rows)
+        return [r for r in rows if r["epoch"] > epoch]
+
+
+_READERS = OrderedDict()
+_READERS_LOCK = threading.Lock()
+
+
+def get_reader(job):
+    """
+    Leitor do job (criado quando o results.csv aparece). Retorna None se o run
+    ainda não gravou nenhuma época. Só jobs em andamento ficam com o leitor em
+    memória (no máximo MAX_READERS, o menos usado sai primeiro); para jobs
+    encerrados o CSV é lido de novo a cada consulta.
+    """
+    job_id = job["job_id"]
+    with _READERS_LOCK:
+        reader = _READERS.get(job_id)
+        if reader is not None and reader.csv_path.exists():
+            _READERS.move_to_end(job_id)
+            return reader
+
+    save_dir = find_save_dir(job)
+    if save_dir is None or not (save_dir / RESULTS_FILE).exists():
+        return None
+    reader = MetricsReader(save_dir / RESULTS_FILE, count_train_images((job.get("config") or {}).get("data")))
+    if job.get("finished_at"):
+        return reader
+    with _READERS_LOCK:
+        _READERS[job_id] = reader
+        while len(_READERS) > MAX_READERS:
+            _READERS.popitem(last=False)
+    return reader
+
+
+def drop_reader(job_id):
+    """
+    Descarta o leitor de um job encerrado.
+    """
+    with _READERS_LOCK:
+        _READERS.pop(job_id, None)
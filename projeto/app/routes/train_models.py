@@ -144,10 +144,24 @@ def function_test_yolo(
     dataset_path=None,
     split="val",
     project_name="results",
-    output_dir=None
+    output_dir=None,
+    use_cache=True,
+    parallel=False,
+    workers=None,
+    use_shards=False,
+    backend=None
 ):
     """
     Avalia/testa um ou vários modelos YOLOv11 treinados.
+    Com use_cache=True os modelos vêm do cache residente (model_cache.MODEL_CACHE)
+    em vez de um YOLO(model_path) novo a cada chamada.
+    Com parallel=True os modelos são avaliados num pool de processos (ver
+    _evaluate_parallel); o cache residente não é usado nesse modo.
+    Com use_shards=True e shards presentes em dataset_path (dataset_shards),
+    as imagens são lidas direto do mmap dos shards (ShardReader), sem extrair
+    arquivos; as métricas (top1/top5/speed) são calculadas aqui, não pelo model.val.
+    backend ('pt', 'onnx', 'openvino'; padrão PREDICT_BACKEND) avalia a
+    exportação em cache dos pesos (model_export) em vez do .pt.
     """
 
     if model_paths is None:
@@ -167,11 +181,20 @@ def function_test_yolo(
     if output_dir is None:
         output_dir = get_path("predictions")
 
+    from_shards = False
+    if use_shards:
+        from .dataset_shards import has_shards
+
+        from_shards = has_shards(dataset_path)
+        if not from_shards:
+            print(f"[WARNING] use_shards sem shards em {dataset_path}: avaliando pelas pastas.")
+
     print(f"\n🔍 Iniciando avaliação de {len(model_paths)} modelo(s) YOLOv11")
-    print(f"📂 Dataset: {dataset_path} | Divisão: {split}")
+    print(f"📂 Dataset: {dataset_path} | Divisão: {split}" + (" | lido dos shards" if from_shards else ""))
     print(f"📁 Resultados serão salvos em: {output_dir}\n")
 
     all_results = {}
+    pending = []
 
     for model_path in model_paths:
         model_name = os.path.basename(model_path).replace(".pt", "")
@@ -183,25 +206,199 @@ def function_test_yolo(
         if not os.path.exists(model_path):
             print(f"❌ Modelo não encontrado: {model_path}")
             continue
+        from .model_export import resolve_backend_path
+
+        model_path = resolve_backend_path(model_path, backend)
+        if parallel and len(model_paths) > 1:
+            pending.append((model_name, model_path, model_output))
+            continue
         print(f"🔄 Carregando modelo de: {os.path.abspath(dataset_path)}")
-        model = YOLO(model_path)
-        results = model.val(
-            data=os.path.abspath(dataset_path),
-            split=split,
-            project=model_output,
-            name=project_name
-        )
+        if use_cache:
+            from .model_cache import MODEL_CACHE
+
+            with MODEL_CACHE.use(model_path) as model:
+                results = _validate(model, dataset_path, split, model_output, project_name, from_shards)
+        else:
+            model = YOLO(model_path)
+            results = _validate(model, dataset_path, split, model_output, project_name, from_shards)
 
         print(f"✅ Avaliação concluída para {model_name}!")
         print(f"📄 Resultados salvos em: {model_output}\n")
 
         all_results[model_name] = results
 
+    if pending:
+        all_results.update(_evaluate_parallel(pending, dataset_path, split, project_name, workers, from_shards))
+
     print(f"\n📊 Todas as avaliações concluídas! Resultados em: {output_dir}\n")
     print("Result: ", all_results)
     return all_results
 
 
+def _validate(model, dataset_path, split, model_output, project_name, from_shards=False):
+    """
+    model.val nas pastas do dataset, ou a avaliação direto dos shards.
+    """
+    if from_shards:
+        return evaluate_from_shards(model, dataset_path, split, os.path.join(model_output, project_name))
+    return model.val(
+        data=os.path.abspath(dataset_path),
+        split=split,
+        project=model_output,
+        name=project_name
+    )
+
+
+def evaluate_from_shards(model, dataset_path, split="val", save_dir=None, batch_size=None):
+    """
+    Avalia um modelo de classificação lendo as imagens do mmap dos shards
+    (uma leitura sequencial do .bin, nenhum arquivo extraído). As classes do
+    shard são casadas com model.names pelo nome. Retorna um dict com top1,
+    top5, speed (ms por imagem) e images; com save_dir grava metrics.json nele.
+    """
+    import json
+    import time
+    from .dataset_shards import ShardReader, shard_split, EVAL_BATCH
+    from .inference import decode_image, top_k
+
+    batch_size = max(1, int(batch_size or EVAL_BATCH))
+    correct1 = correct5 = total = 0
+    speed = {}
+    elapsed = 0.0
+
+    def run(batch):
+        nonlocal correct1, correct5, total, elapsed
+        images = [decode_image(data) for _, data in batch]
+        started = time.perf_counter()
+        predictions = model.predict(images, verbose=False)
+        elapsed += time.perf_counter() - started
+        for (expected, _), result in zip(batch, predictions):
+            ranked = [entry["class"] for entry in top_k(result, 5)]
+            correct1 += bool(ranked) and ranked[0] == expected
+            correct5 += expected in ranked
+            total += 1
+            for phase, ms in (getattr(result, "speed", None) or {}).items():
+                speed[phase] = speed.get(phase, 0.0) + float(ms)
+
+    with ShardReader(dataset_path, shard_split(dataset_path, split)) as shard:
+        batch = []
+        for _rel, class_idx, data in shard:
+            batch.append((shard.classes[class_idx], data))
+            if len(batch) >= batch_size:
+                run(batch)
+                batch = []
+        if batch:
+            run(batch)
+
+    if not total:
+        raise ValueError(f"Shard do split '{split}' vazio em {dataset_path}")
+    metrics = {
+        "top1": round(correct1 / total, 6),
+        "top5": round(correct5 / total, 6),
+        # o ultralytics reporta speed por imagem em cada resultado; sem isso, o tempo de parede do predict
+        "speed": {phase: round(ms / total, 3) for phase, ms in speed.items()} or {"inference": round(elapsed * 1000 / total, 3)},
+        "images": total,
+        "source": "shards",
+    }
+    if save_dir:
+        os.makedirs(save_dir, exist_ok=True)
+        with open(os.path.join(save_dir, "metrics.json"), "w", encoding="utf-8") as f:
+            json.dump(metrics, f, indent=2)
+    return metrics
+
+
+class EvaluationFailed(RuntimeError):
+    """
+    Um ou mais modelos falharam na avaliação paralela. `failures` mapeia
+    model_name -> mensagem; `results` traz as avaliações que terminaram.
+    """
+
+    def __init__(self, failures, results):
+        self.failures = failures
+        self.results = results
+        detail = "; ".join(f"{name}: {message}" for name, message in failures.items())
+        super().__init__(f"Falha ao avaliar {len(failures)} modelo(s): {detail}")
+
+
+def _metrics_dict(results):
+    """
+    top1/top5/speed de um resultado de avaliação como dict simples (o objeto de
+    métricas do Ultralytics não é enviado de volta pelos workers).
+    """
+    if isinstance(results, dict):
+        return results
+    speed = getattr(results, "speed", None)
+    return {
+        "top1": getattr(results, "top1", None),
+        "top5": getattr(results, "top5", None),
+        "speed": dict(speed) if isinstance(speed, dict) else None,
+    }
+
+
+def _init_eval_worker(threads):
+    """
+    Inicializador de cada processo do pool: divide os núcleos entre os workers
+    para que N avaliações simultâneas não disputem todas as threads do torch/OpenMP.
+    """
+    threads = str(max(1, int(threads)))
+    os.environ["OMP_NUM_THREADS"] = threads
+    os.environ["MKL_NUM_THREADS"] = threads
+    try:
+        import torch
+        torch.set_num_threads(int(threads))
+    except ImportError:
+        pass
+
+
+def _eval_model_worker(model_path, dataset_path, split, model_output, project_name, from_shards=False):
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+    return _metrics_dict(_validate(model, dataset_path, split, model_output, project_name, from_shards))
+
+
+def _evaluate_parallel(pending, dataset_path, split, project_name, workers=None, from_shards=False):
+    """
+    Avalia [(model_name, model_path, model_output), ...] num ProcessPoolExecutor
+    (contexto spawn, seguro com torch/OpenMP). Cada worker recebe
+    cpu_count // workers threads. Retorna {model_name: {top1, top5, speed}} na
+    ordem recebida. Como no caminho sequencial, falha não passa em silêncio: depois
+    que todos terminam, EvaluationFailed lista os modelos que falharam.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(int(workers or cpus), len(pending), cpus))
+    threads = max(1, cpus // workers)
+    print(f"⚡ Avaliação paralela: {len(pending)} modelo(s) em {workers} processo(s) x {threads} thread(s)")
+
+    results = {}
+    failures = {}
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_eval_worker,
+        initargs=(threads,)
+    ) as pool:
+        futures = [
+            (model_name, model_output, pool.submit(_eval_model_worker, model_path, dataset_path, split, model_output, project_name, from_shards))
+            for model_name, model_path, model_output in pending
+        ]
+        for model_name, model_output, future in futures:
+            try:
+                results[model_name] = future.result()
+            except Exception as e:
+                print(f"❌ Falha ao avaliar {model_name}: {e}")
+                failures[model_name] = str(e)
+                continue
+            print(f"✅ Avaliação concluída para {model_name}!")
+            print(f"📄 Resultados salvos em: {model_output}\n")
+    if failures:
+        raise EvaluationFailed(failures, results)
+    return results
+
+
 # ============================================================
 # 🔧 Exemplo de uso dinâmico
 # ============================================================
@@ -1,4 +1,5 @@
 import os
+import hashlib
 import shutil
 import random
 import json
@@ -7,48 +8,81 @@ import subprocess
 import shlex 
 import threading
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Union
 from math import ceil
 
 from pydantic import BaseModel
-# Nota: YOLO deve estar instalado globalmente ou no ambiente virtual do Flask
-try:
-    from ultralytics import YOLO 
-except ImportError:
-    class YOLO:
-        def __init__(self, *args, **kwargs): pass
-        def train(self, *args, **kwargs): raise RuntimeError("Ultralytics não está instalado.")
-
 from flask import Response, jsonify, request, Blueprint
 
+from .dataset_build import (
+    Materializer, BuildCancelled, write_build_info, read_build_info, compute_build_key, build_lock
+)
+from .image_catalog import get_catalog, TYPE_DIRS, IMG_EXT as CATALOG_IMG_EXT
+from .dataset_shards import export_shards, resolve_dataset_path, has_shards, release_lease
+from .derived_store import derive_many, derived_name, DEFAULT_QUALITY
+from .content_hash import (
+    DuplicateIndex, get_hash_cache, index_directory, admit_incoming, find_existing, normalize_dedup_mode,
+    DEFAULT_PHASH_DISTANCE,
+)
+from .train_metrics import get_reader, drop_reader, find_save_dir, parse_save_dir
+from .model_registry import get_registry
+from .chunked_upload import UploadError, uploads_root, upload_target, file_state, write_chunk, PART_SUFFIX, COPY_BUFFER
+from .archive_ingest import ingest_archive
+from .log_broadcast import LOG_BROADCASTS, append_log
+from .profiling import ProfileCapture, wants_profile, profile_url
+from .history import record_training_job
+from .metrics import REGISTRY, BUILD_PHASE_SECONDS, BUILD_FILES, BUILD_BYTES, BUILDS
+from .job_scheduler import (
+    JobScheduler, QUEUED, PREPARING, RUNNING, COMPLETE, ERROR, CANCELLED, ACTIVE_STATES, NEW_SESSION,
+    terminate_process, parse_priority, is_safe_job_id,
+)
+
 # --- CONFIGURAÇÃO DE ESTADO GLOBAL E LOGS ---
 bp = Blueprint("training", __name__, url_prefix='/train')
 
-TRAINING_STATE = {
-    "is_active": False,
-    "job_id": None,
-    "process": None, 
-    "log_path": None, 
-    "status": "idle"
-}
-
-LOGS_DIR = Path("./runs/logs").resolve()
+LOGS_DIR = Path(__file__).resolve().parents[3] / "runs" / "logs"
 LOGS_DIR.mkdir(parents=True, exist_ok=True)
 
+# Fila persistente de jobs (runs/jobs); o runner é resolvido na hora da execução
+SCHEDULER = JobScheduler(runner=lambda job_id: run_training_job(job_id))
+
+
+@REGISTRY.add_collector
+def _scheduler_metrics():
+    summary = SCHEDULER.summary()
+    return [
+        ("training_jobs_active", "gauge", "Jobs de treinamento em execução.", [({}, summary["active"])]),
+        ("training_jobs_queued", "gauge", "Jobs de treinamento aguardando na fila.", [({}, summary["queued"])]),
+        ("training_jobs_max_concurrent", "gauge", "Limite de jobs simultâneos.", [({}, summary["max_concurrent"])]),
+    ]
+
+
 class TrainPayload(BaseModel):
     dataset: str
     modelo_base: Optional[str] = None
     preprocess_list: Optional[List[str]] = []
     save_checkpoints: Optional[bool] = False
+    incremental: Optional[Union[bool, dict]] = None
     exp_name: Optional[str] = None
     full_config: Optional[dict] = {}
 
 
 # --- FUNÇÃO DE PREPARAÇÃO DE DADOS (CONF_DATASET) ---
-def conf_dataset(dataset_config: dict, dataset_path: str):
+def conf_dataset(dataset_config: dict, dataset_path: str, progress_callback=None, cancel_event=None):
     """
     Prepara o dataset localmente: divide o upload do usuário em T/V/T e
     adiciona classes negativas aleatórias (se configurado).
+    As imagens são materializadas conforme dataset_config["materialize_mode"]
+    (copy, hardlink, reflink, symlink ou auto) e o resumo do build, incluindo a
+    estratégia efetivamente usada, é gravado em build_info.json.
+    A materialização roda num pool de threads limitado (materialize_workers,
+    max_files_per_sec, max_mb_per_sec) e reporta progresso via progress_callback.
+    Com dataset_config["seed"] o split é determinístico e o build é reaproveitado
+    quando fontes, configuração e semente não mudaram (mesma build_key).
+    Com dataset_config["resize_imgsz"] as imagens entram já redimensionadas
+    (store derivado em custom/cache/derived, qualidade em resize_quality).
+    Com dataset_config["export_shards"] cada split também é empacotado em
+    shards/<split>.bin + .idx.json (ver dataset_shards).
     Retorna o caminho POSIX para o diretório de saída.
     """
     
@@ -62,13 +96,138 @@ def conf_dataset(dataset_config: dict, dataset_path: str):
         raise FileNotFoundError(f"Pasta do dataset de upload não encontrada: {dataset_path}")
 
     upload_folder_name = dataset_path.name
-    
+
+    # Variáveis de configuração
+    types_to_include = dataset_config.get("types_to_include", [])
+    IMG_EXT = [".jpg", ".png", ".jpeg", ".bmp", ".tiff"]
+
+    # Fase "scan" das métricas: listagem do upload + chave do build
+    scan_started = time.perf_counter()
+
+    # Ordenadas para que a mesma semente produza sempre o mesmo split
+    images = sorted(
+        f for f in dataset_path.iterdir()
+        if f.suffix.lower() in IMG_EXT
+    )
+
     # Define o caminho de saída do dataset customizado (onde as imagens serão copiadas)
     # base_output = Path(r"custom\datasets_custom")
     base_output = Path.cwd() / "custom" / "datasets_custom"
-    output_root = base_output / f"dataset_{upload_folder_name}_{time.strftime('%Y%m%d_%H%M%S')}"
-    
-    # Limpa a pasta de destino (importante para evitar mix de runs)
+
+    # Com semente explícita o build é determinístico e reaproveitável: a pasta de
+    # saída passa a ser nomeada pela chave (manifesto das fontes + config + semente).
+    seed = dataset_config.get("seed")
+    build_key = None
+    if seed is not None:
+        build_key = _dataset_build_key(dataset_config, upload_folder_name, images, types_to_include, seed)
+        output_root = base_output / f"dataset_{upload_folder_name}_{build_key[:16]}"
+    else:
+        output_root = base_output / f"dataset_{upload_folder_name}_{time.strftime('%Y%m%d_%H%M%S')}"
+    BUILD_PHASE_SECONDS.observe(time.perf_counter() - scan_started, phase="scan")
+    BUILD_FILES.inc(len(images), phase="scan")
+
+    with build_lock(str(output_root)):
+        if build_key is not None:
+            cached = _reuse_cached_build(output_root, build_key)
+            if cached:
+                BUILDS.inc(result="reused")
+                return cached
+
+        return _build_dataset(
+            dataset_config, output_root, upload_folder_name, images,
+            rng=random.Random(seed) if seed is not None else random,
+            build_key=build_key,
+            progress_callback=progress_callback,
+            cancel_event=cancel_event,
+        )
+
+
+def _dataset_build_key(dataset_config, upload_folder_name, images, types_to_include, seed):
+    """
+    Chave do build: lista de imagens positivas (nome, tamanho, mtime), manifesto
+    dos tipos negativos no catálogo (caminho, sha256), conteúdo do dataset de replay,
+    parâmetros do split e semente.
+    Opções que não alteram o conteúdo (materialize_mode, workers, limites de vazão) ficam de fora.
+    """
+    positives = []
+    for img in images:
+        st = img.stat()
+        positives.append((img.name, st.st_size, st.st_mtime_ns))
+
+    negatives = {}
+    if types_to_include:
+        catalog = get_catalog()
+        tipos = types_to_include.keys() if isinstance(types_to_include, dict) else types_to_include
+        for tipo in tipos:
+            tipo_short = TYPE_DIRS.get(tipo)
+            if tipo_short:
+                negatives[tipo] = catalog.manifest(tipo_short)
+
+    return compute_build_key({
+        "upload": upload_folder_name,
+        "positives": positives,
+        "negatives": negatives,
+        "config": {
+            k: dataset_config.get(k)
+            for k in ("train_percent", "val_percent", "test_percent", "types_to_include", "random_split", "random_count",
+                      "phash_distance", "resize_imgsz", "resize_quality", "export_shards", "replay")
+        } | {"dedup": normalize_dedup_mode(dataset_config.get("dedup"))},
+        "replay_source": _replay_source_identity(dataset_config.get("replay")),
+        "seed": seed,
+    })
+
+
+def _replay_source_identity(replay):
+    """
+    Identidade do conteúdo do dataset de replay: o build_key dele (se foi montado
+    aqui) ou a lista (split/classe/nome, tamanho, mtime) das imagens usadas no sorteio.
+    O caminho sozinho não basta: a mesma pasta pode ser reconstruída com outro conteúdo.
+    """
+    if not replay or not replay.get("source"):
+        return None
+    source = Path(replay["source"])
+    info = read_build_info(source)
+    if info and info.get("build_key"):
+        return {"build_key": info["build_key"]}
+    files = []
+    for _part, names in REPLAY_SPLITS:
+        split_dir = next((source / n for n in names if (source / n).is_dir()), None)
+        if split_dir is None:
+            continue
+        for class_dir in sorted(d for d in split_dir.iterdir() if d.is_dir()):
+            for img in sorted(f for f in class_dir.iterdir() if f.suffix.lower() in CATALOG_IMG_EXT):
+                st = img.stat()
+                files.append((f"{split_dir.name}/{class_dir.name}/{img.name}", st.st_size, st.st_mtime_ns))
+    return {"files": files}
+
+
+def _reuse_cached_build(output_root, build_key):
+    """
+    Se já existe um build completo com a mesma chave, reaproveita a pasta (incluindo
+    os .cache de labels do Ultralytics) e retorna o caminho POSIX; senão None.
+    Builds que registraram erros de materialização (arquivos faltando) não são
+    reaproveitados: o próximo job refaz o build.
+    """
+    info = read_build_info(output_root)
+    if not info or info.get("build_key") != build_key:
+        return None
+    if info.get("errors") or info.get("failures"):
+        print(f"[WARNING] Build em {output_root} teve {info.get('errors')} erro(s) de materialização: refazendo.")
+        return None
+    info["cache_hit"] = True
+    info["reuse_count"] = int(info.get("reuse_count", 0)) + 1
+    info["last_reused_at"] = time.strftime('%Y-%m-%d %H:%M:%S')
+    write_build_info(output_root, info)
+    print(f"[INFO] Reaproveitando dataset já materializado (build_key={build_key[:16]}): {output_root}")
+    return str(output_root).replace('\\', '/')
+
+
+def _build_dataset(dataset_config, output_root, upload_folder_name, images, rng=random, build_key=None,
+                   progress_callback=None, cancel_event=None):
+    """
+    Materializa um novo build em output_root (chamado por conf_dataset).
+    """
+    # Limpa a pasta de destino (importante para evitar mix de runs / builds incompletos)
     if output_root.exists():
          try:
              shutil.rmtree(output_root)
@@ -88,10 +247,14 @@ def conf_dataset(dataset_config: dict, dataset_path: str):
     for part in folders.values():
         part.mkdir(parents=True, exist_ok=True)
 
-    # Variáveis de configuração
     types_to_include = dataset_config.get("types_to_include", [])
-    IMG_EXT = [".jpg", ".png", ".jpeg", ".bmp", ".tiff"]
     class_name_positive = upload_folder_name
+    materializer = Materializer(dataset_config.get("materialize_mode"))
+    started_at = time.time()
+    # Fase "sample" das métricas: dedup, split e sorteio dos negativos até o plano pronto
+    phase_started = time.perf_counter()
+    # Lista de (origem, destino) materializada de uma vez no final
+    plan = []
 
     # ---------------------------------------
     # 2. PROCESSO DE CLASSE POSITIVA (UPLOAD DO USUÁRIO)
@@ -105,24 +268,45 @@ def conf_dataset(dataset_config: dict, dataset_path: str):
     for part in folders.values():
         (part / class_name_positive).mkdir(parents=True, exist_ok=True)
 
-    images = [
-        f for f in dataset_path.iterdir()
-        if f.suffix.lower() in IMG_EXT
-    ]
-    random.shuffle(images)
+    # Deduplicação por conteúdo (dataset_config["dedup"]: "off" padrão, "sha256"/true ou "phash"):
+    # a mesma imagem com outro nome entra uma vez só e nunca aparece também como negativo
+    dedup = DuplicateIndex(dataset_config.get("dedup"), dataset_config.get("phash_distance", DEFAULT_PHASH_DISTANCE))
+    hash_cache = get_hash_cache() if dedup.mode != "off" else None
+    dedup_report = {"mode": dedup.mode, "positive_duplicates": 0, "negative_duplicates": 0, "replay_duplicates": 0, "examples": []}
+
+    def _note_duplicate(kind, key, original):
+        dedup_report[f"{kind}_duplicates"] += 1
+        if len(dedup_report["examples"]) < 50:
+            dedup_report["examples"].append({"file": key, "duplicate_of": original})
+
+    if hash_cache is not None:
+        unique_images = []
+        for img in images:
+            sha, dhash = hash_cache.hashes(img, perceptual=dedup.perceptual)
+            key = f"{class_name_positive}/{img.name}"
+            original = dedup.check_add(key, sha, dhash)
+            if original is None:
+                unique_images.append(img)
+            else:
+                _note_duplicate("positive", key, original)
+        images = unique_images
+    else:
+        images = list(images)
+
+    rng.shuffle(images)
 
     total = len(images)
     train_n = int(ceil(total * train_pct / 100))
     val_n = int(ceil(total * val_pct / 100))
     test_n = total - train_n - val_n
 
-    # Copia imagens da classe positiva
+    # Planeja imagens da classe positiva
     for img in images[:train_n]:
-        shutil.copy(img, folders["train"] / class_name_positive / img.name)
+        plan.append((img, folders["train"] / class_name_positive / img.name))
     for img in images[train_n:train_n + val_n]:
-        shutil.copy(img, folders["val"] / class_name_positive / img.name)
+        plan.append((img, folders["val"] / class_name_positive / img.name))
     for img in images[train_n + val_n:]:
-        shutil.copy(img, folders["test"] / class_name_positive / img.name)
+        plan.append((img, folders["test"] / class_name_positive / img.name))
 
     # ---------------------------------------
     # 3. PROCESSO DE CLASSE NEGATIVA (DADOS FIXOS CM/HE/HI)
@@ -142,12 +326,9 @@ def conf_dataset(dataset_config: dict, dataset_path: str):
         for part in folders.values():
             (part / class_name_negative).mkdir(parents=True, exist_ok=True)
 
-        # Pontos base fixos para cada tipo (Ajuste o caminho base conforme a estrutura real do seu projeto)
-        TYPE_BASE_PATHS = {
-            "Cone": Path(r"./projeto/app/storage/imagens_implates/CM"),
-            "Hex Externo": Path(r"./projeto/app/storage/imagens_implates/HE"),
-            "Hex Interno": Path(r"./projeto/app/storage/imagens_implates/HI")
-        }
+        # As imagens de cada tipo (CM/HE/HI) vêm do catálogo persistente de
+        # projeto/app/storage/imagens_implates (consulta ao índice, sem rglob)
+        catalog = get_catalog()
 
         # Normalize types_to_include: pode ser lista (compat) ou dict (novo formato)
         if isinstance(types_to_include, dict):
@@ -160,21 +341,15 @@ def conf_dataset(dataset_config: dict, dataset_path: str):
         # Mantém um conjunto global de fontes já usadas para evitar duplicatas entre linhas/tipos
         used_sources = set()
         for tipo, line_spec in types_map.items():
-            tipo_path = TYPE_BASE_PATHS.get(tipo)
-            if not tipo_path or not tipo_path.exists():
-                print(f"[WARNING] Tipo negativo '{tipo}' não encontrado no disco: {tipo_path}")
+            tipo_short = TYPE_DIRS.get(tipo)
+            if not tipo_short or not catalog.has_type(tipo_short):
+                print(f"[WARNING] Tipo negativo '{tipo}' não encontrado no catálogo de imagens: {tipo_short}")
                 continue
 
-            # Descobre as linhas disponíveis (subpastas) e conta imagens por linha
-            available_lines = {}
-            for sub in tipo_path.iterdir():
-                if sub.is_dir():
-                    imgs = [f for f in sub.rglob('*') if f.suffix.lower() in IMG_EXT and f.is_file()]
-                    available_lines[sub.name] = imgs
-            # também considera arquivos soltos na raiz do tipo como linha 'root'
-            root_imgs = [f for f in tipo_path.iterdir() if f.is_file() and f.suffix.lower() in IMG_EXT]
-            if root_imgs:
-                available_lines['root'] = root_imgs
+            # Linhas disponíveis (subpastas) e suas imagens; arquivos soltos na raiz do tipo viram a linha 'root'
+            available_lines = catalog.images_by_line(tipo_short)
+            # sha256 já calculado pelo catálogo; o dHash (modo phash) vem do cache de hashes
+            known_sha = catalog.sha_map(tipo_short) if hash_cache is not None else {}
 
             if not available_lines:
                 continue
@@ -214,17 +389,28 @@ def conf_dataset(dataset_config: dict, dataset_path: str):
             for line_name in lines_to_process:
                 imgs_list = available_lines.get(line_name, [])
 
-                # Filtra imagens já usadas por linhas/tipos anteriores para evitar duplicações
+                # Filtra imagens já usadas por linhas/tipos anteriores para evitar duplicações,
+                # e (com dedup) imagens de mesmo conteúdo que um positivo ou negativo já escolhido
                 filtered_imgs = []
+                img_hashes = {}
+                line_seen = DuplicateIndex(dedup.mode, dedup.max_distance)
                 skipped = 0
                 for img in imgs_list:
-                    try:
-                        key = str(img.resolve())
-                    except Exception:
-                        key = str(img)
+                    # caminhos do catálogo já são canônicos (relativos à base), sem resolve()
+                    key = str(img)
                     if key in used_sources:
                         skipped += 1
                         continue
+                    if hash_cache is not None:
+                        sha = known_sha.get(img)
+                        dhash = None
+                        if sha is None or dedup.perceptual:
+                            sha, dhash = hash_cache.hashes(img, perceptual=dedup.perceptual)
+                        original = dedup.find(sha, dhash) or line_seen.check_add(key, sha, dhash)
+                        if original is not None:
+                            _note_duplicate("negative", key, original)
+                            continue
+                        img_hashes[key] = (sha, dhash)
                     filtered_imgs.append(img)
 
                 if skipped:
@@ -258,213 +444,647 @@ def conf_dataset(dataset_config: dict, dataset_path: str):
                 if requested >= available_count:
                     chosen = list(imgs_list)
                 else:
-                    chosen = random.sample(imgs_list, requested)
+                    chosen = rng.sample(imgs_list, requested)
 
                 # Registra as fontes escolhidas para evitar duplicatas futuras
                 for img in chosen:
-                    try:
-                        used_sources.add(str(img.resolve()))
-                    except Exception:
-                        used_sources.add(str(img))
+                    used_sources.add(str(img))
+                    if str(img) in img_hashes:
+                        dedup.add(str(img), *img_hashes[str(img)])
 
                 # Agora SPLIT por linha: aplica random_split aos itens escolhidos
                 total_line = len(chosen)
                 # Embaralha para garantir distribuição aleatória entre partes
-                random.shuffle(chosen)
+                rng.shuffle(chosen)
                 t_n = int(total_line * random_split.get('train', 70) / 100)
                 v_n = int(total_line * random_split.get('val', 20) / 100)
                 te_n = total_line - t_n - v_n
 
-                # Copia com nomes únicos para evitar colisões (tipo_linha_nome.ext)
+                # Planeja com nomes únicos para evitar colisões (tipo_linha_nome.ext)
                 prefix = tipo.replace(' ', '_')[:10]
-                # treino
-                for img in chosen[0:t_n]:
-                    unique_name = f"{prefix}_{line_name}_{img.name}"
-                    try:
-                        shutil.copy(img, folders['train'] / class_name_negative / unique_name)
-                    except Exception as e:
-                        print(f"[ERROR] copying negative image {img} -> {e}")
-                # validação
-                for img in chosen[t_n:t_n + v_n]:
-                    unique_name = f"{prefix}_{line_name}_{img.name}"
-                    try:
-                        shutil.copy(img, folders['val'] / class_name_negative / unique_name)
-                    except Exception as e:
-                        print(f"[ERROR] copying negative image {img} -> {e}")
-                # teste
-                for img in chosen[t_n + v_n:]:
-                    unique_name = f"{prefix}_{line_name}_{img.name}"
-                    try:
-                        shutil.copy(img, folders['test'] / class_name_negative / unique_name)
-                    except Exception as e:
-                        print(f"[ERROR] copying negative image {img} -> {e}")
+                parts = (
+                    ('train', chosen[0:t_n]),
+                    ('val', chosen[t_n:t_n + v_n]),
+                    ('test', chosen[t_n + v_n:]),
+                )
+                for part, part_imgs in parts:
+                    for img in part_imgs:
+                        unique_name = f"{prefix}_{line_name}_{img.name}"
+                        plan.append((img, folders[part] / class_name_negative / unique_name))
+
+    # ---------------------------------------
+    # 3a. AMOSTRA DE REPLAY (FINE-TUNING INCREMENTAL)
+    #     - dataset_config["replay"] = {"source": <dataset anterior>, "fraction": 0.2, "max_per_class": None}
+    # ---------------------------------------
+    replay_report = None
+    if dataset_config.get("replay"):
+        replay_plan, replay_report = _plan_replay(dataset_config["replay"], folders, rng, dedup, hash_cache, _note_duplicate)
+        plan.extend(replay_plan)
+        print(f"[INFO] Replay: {replay_report['images']} imagens de {replay_report['source']}")
+
+    BUILD_PHASE_SECONDS.observe(time.perf_counter() - phase_started, phase="sample")
+    BUILD_FILES.inc(len(plan), phase="sample")
+
+    # ---------------------------------------
+    # 3b. PRÉ-REDIMENSIONAMENTO (OPCIONAL, STORE DERIVADO)
+    # ---------------------------------------
+    resize_report = None
+    if dataset_config.get("resize_imgsz"):
+        phase_started = time.perf_counter()
+        plan, resize_report = _apply_derived_store(plan, dataset_config, progress_callback, cancel_event)
+        BUILD_PHASE_SECONDS.observe(time.perf_counter() - phase_started, phase="resize")
+
+    # ---------------------------------------
+    # 4. MATERIALIZAÇÃO (POOL DE THREADS)
+    # ---------------------------------------
+    phase_started = time.perf_counter()
+    materializer.place_many(
+        plan,
+        workers=dataset_config.get("materialize_workers"),
+        max_files_per_sec=dataset_config.get("max_files_per_sec"),
+        max_mb_per_sec=dataset_config.get("max_mb_per_sec"),
+        progress_callback=progress_callback,
+        cancel_event=cancel_event,
+    )
+    BUILD_PHASE_SECONDS.observe(time.perf_counter() - phase_started, phase="materialize")
+    BUILD_FILES.inc(materializer.throughput.get("files", 0), phase="materialize")
+    BUILD_BYTES.inc(materializer.throughput.get("bytes", 0))
+
+    # ---------------------------------------
+    # 5. SHARDS EMPACOTADOS (OPCIONAL)
+    # ---------------------------------------
+    shards_report = None
+    if dataset_config.get("export_shards"):
+        phase_started = time.perf_counter()
+        shards_report = export_shards(output_root)
+        BUILD_PHASE_SECONDS.observe(time.perf_counter() - phase_started, phase="shards")
+        print(f"[INFO] Shards exportados em {output_root / 'shards'}: {shards_report}")
+
+    if hash_cache is not None:
+        hash_cache.flush()
+
+    build_info = materializer.report()
+    build_info["elapsed_s"] = round(time.time() - started_at, 3)
+    build_info["build_key"] = build_key
+    build_info["seed"] = dataset_config.get("seed")
+    build_info["cache_hit"] = False
+    build_info["dedup"] = dedup_report
+    build_info["resize"] = resize_report
+    build_info["shards"] = shards_report
+    build_info["replay"] = replay_report
+    write_build_info(output_root, build_info)
+    BUILDS.inc(result="built")
+    if dedup_report["positive_duplicates"] or dedup_report["negative_duplicates"]:
+        print(f"[INFO] Duplicatas removidas ({dedup.mode}): {dedup_report['positive_duplicates']} positivas, "
+              f"{dedup_report['negative_duplicates']} negativas.")
+    print(f"[INFO] Dataset materializado em {output_root} via '{build_info['strategy']}' ({build_info['elapsed_s']}s).")
 
     # RETORNA O CAMINHO NORMALIZADO (POSIX)
     return str(output_root).replace('\\', '/')
 
+REPLAY_SPLITS = (("train", ("train",)), ("val", ("val", "valid")), ("test", ("test",)))
+
+
+def _plan_replay(replay, folders, rng, dedup, hash_cache, note_duplicate):
+    """
+    Plano da amostra de replay: de cada split/classe do dataset de origem, `fraction`
+    das imagens (no máximo `max_per_class`), na pasta da mesma classe com prefixo replay_.
+    Com dedup ligado, imagens de mesmo conteúdo que as novas ficam de fora.
+    """
+    source = Path(replay["source"])
+    fraction = float(replay.get("fraction") or 0)
+    max_per_class = replay.get("max_per_class")
+    plan = []
+    per_class = {}
+    for part, names in REPLAY_SPLITS:
+        split_dir = next((source / n for n in names if (source / n).is_dir()), None)
+        if split_dir is None:
+            continue
+        for class_dir in sorted(d for d in split_dir.iterdir() if d.is_dir()):
+            imgs = sorted(f for f in class_dir.iterdir() if f.suffix.lower() in CATALOG_IMG_EXT)
+            count = int(round(len(imgs) * fraction))
+            if max_per_class is not None:
+                count = min(count, int(max_per_class))
+            if count <= 0:
+                continue
+            dest = folders[part] / class_dir.name
+            dest.mkdir(parents=True, exist_ok=True)
+            for img in rng.sample(imgs, count):
+                if hash_cache is not None:
+                    key = f"replay/{class_dir.name}/{img.name}"
+                    sha, dhash = hash_cache.hashes(img, perceptual=dedup.perceptual)
+                    original = dedup.check_add(key, sha, dhash)
+                    if original is not None:
+                        note_duplicate("replay", key, original)
+                        continue
+                plan.append((img, dest / f"replay_{img.name}"))
+                per_class[class_dir.name] = per_class.get(class_dir.name, 0) + 1
+    return plan, {"source": str(source), "fraction": fraction, "max_per_class": max_per_class,
+                  "images": len(plan), "per_class": per_class}
+
+
+def _apply_derived_store(plan, dataset_config, progress_callback=None, cancel_event=None):
+    """
+    Troca as fontes do plano pelas versões já redimensionadas para resize_imgsz
+    (geradas sob demanda no store derivado e reaproveitadas entre builds).
+    Sem Pillow, o build segue com as imagens originais.
+    """
+    imgsz = int(dataset_config["resize_imgsz"])
+    quality = int(dataset_config.get("resize_quality") or DEFAULT_QUALITY)
+    hash_cache = get_hash_cache()
+    shas = [hash_cache.sha256(src) for src, _ in plan]
+    try:
+        derived, report = derive_many(
+            zip((src for src, _ in plan), shas), imgsz, quality,
+            workers=dataset_config.get("resize_workers"),
+            progress_callback=progress_callback,
+            cancel_event=cancel_event,
+        )
+    except ModuleNotFoundError as e:
+        print(f"[WARNING] Pré-redimensionamento desativado ({e}). Usando as imagens originais.")
+        return plan, {"imgsz": imgsz, "quality": quality, "enabled": False, "reason": str(e)}
+
+    new_plan = []
+    for (src, dst), sha in zip(plan, shas):
+        if sha in derived:
+            new_plan.append((derived[sha], dst.with_name(derived_name(dst.name))))
+        else:
+            new_plan.append((src, dst))
+    report["enabled"] = True
+    print(f"[INFO] Imagens redimensionadas para {imgsz}px: {report['generated']} novas, {report['reused']} do cache.")
+    return new_plan, report
+
 # --- FUNÇÃO DE TREINAMENTO EM PROCESSO SEPARADO (CLEAN) ---
 def run_training_job_process(job_id, config):
-    # ... (Seu código run_training_job_process, inalterado) ...
-    global TRAINING_STATE
-
-    log_file_path = TRAINING_STATE["log_path"]
+    job = SCHEDULER.get(job_id)
+    log_file_path = job["log_path"]
     
     # 1. Constrói o comando YOLO CLI
     YOLO_EXECUTABLE_PATH = "/content/myenv/bin/yolo" 
     
     # Argumentos passados diretamente para a CLI do YOLO (Ex: yolo classify train project=... epochs=...)
+    # Sem shell: cada argumento vai como está (sem quoting) e o pid é o do próprio yolo
     yolo_args = [
-        f"{k}={shlex.quote(str(v))}" 
+        f"{k}={v}"
         for k, v in config.items() 
         if k not in ['mode', 'task']
     ]
     
     # command = ["yolo", config.get('task', 'classify'), config.get('mode', 'train')] + yolo_args
     command = [YOLO_EXECUTABLE_PATH, config.get('task', 'classify'), config.get('mode', 'train')] + yolo_args
-    command_str = " ".join(command)
-    # CORREÇÃO CRÍTICA: Precede o comando com a variável de ambiente Matplotlib
-    command_str_with_backend = f"MPLBACKEND='Agg' {command_str}"
+    # CORREÇÃO CRÍTICA: Matplotlib sem display (antes era o prefixo MPLBACKEND='Agg' no shell)
+    env = {**os.environ, "MPLBACKEND": "Agg"}
+    command_str_with_backend = f"MPLBACKEND='Agg' {shlex.join(command)}"
+
+    log = LOG_BROADCASTS.get(job_id, log_file_path)
+    pump_thread = None
+    cwd = Path.cwd()
 
-    log_file_handle = None
+    def on_line(line):
+        # pasta real do run (o Ultralytics pode ter incrementado o nome): fica no registro do job
+        save_dir = parse_save_dir(line, cwd)
+        if save_dir is not None and SCHEDULER.get(job_id).get("save_dir") != str(save_dir):
+            SCHEDULER.update(job_id, save_dir=str(save_dir))
 
     try:
-        log_file_handle = open(log_file_path, 'w', encoding='utf-8') # FORÇA UTF-8 para escrita
-            
-        log_file_handle.write(f"--- COMANDO INICIADO ---\n{command_str_with_backend}\n------------------------\n")
-        log_file_handle.flush()
-            
+        # o log já contém a preparação do dataset; tudo a partir daqui também passa pelo broadcaster
+        log.write(f"--- COMANDO INICIADO ---\n{command_str_with_backend}\n------------------------")
+
+        # A saída do YOLO é lida direto do pipe: vai para o arquivo e para os streams SSE conectados
+        # sessão própria: o cancelamento encerra o grupo inteiro (yolo e seus filhos)
         process = subprocess.Popen(
-            command_str_with_backend, 
-            shell=True,
-            stdout=log_file_handle, 
+            command,
+            stdout=subprocess.PIPE, 
             stderr=subprocess.STDOUT,
-            cwd=Path.cwd()
+            cwd=cwd,
+            env=env,
+            start_new_session=NEW_SESSION,
         )
-            
-        TRAINING_STATE["process"] = process
-        TRAINING_STATE["status"] = "running"
+        pump_thread = threading.Thread(target=log.pump, args=(process.stdout, on_line), name=f"log-{job_id}", daemon=True)
+        pump_thread.start()
+
+        # cancel() e esta transição usam o mesmo lock: um cancelamento feito enquanto o
+        # processo subia não é sobrescrito por RUNNING, e o processo é encerrado aqui
+        if not SCHEDULER.attach_process(job_id, process, config=config):
+            terminate_process(process)
 
         return_code = process.wait() 
+        # netos do shell podem segurar o pipe aberto; não bloqueia o job por causa deles
+        pump_thread.join(timeout=5)
 
-        if TRAINING_STATE["status"] == "running": 
+        # A mensagem final entra no log antes de mudar o status (quem vê o status final já vê o log completo)
+        status = SCHEDULER.get(job_id)["status"]
+        if status == RUNNING: 
             if return_code == 0:
-                TRAINING_STATE["status"] = "complete"
-                log_file_handle.write("\n\n--- TREINAMENTO_COMPLETO ---\n")
+                log.write("\n\n--- TREINAMENTO_COMPLETO ---")
+                SCHEDULER.update(job_id, status=COMPLETE, return_code=return_code)
             else:
-                TRAINING_STATE["status"] = "error"
-                log_file_handle.write(f"\n\n--- ERRO_TREINAMENTO: Processo encerrado com código {return_code} ---\n")
-            log_file_handle.flush()
+                log.write(f"\n\n--- ERRO_TREINAMENTO: Processo encerrado com código {return_code} ---")
+                SCHEDULER.update(job_id, status=ERROR, return_code=return_code)
+        elif status == CANCELLED:
+            log.write("\n\n--- TREINAMENTO CANCELADO PELO USUÁRIO ---")
+            SCHEDULER.update(job_id, return_code=return_code)
                 
     except Exception as e:
-        TRAINING_STATE["status"] = "error"
-        if log_file_handle:
-            log_file_handle.write(f"\nERRO FATAL: Exceção na Thread Flask: {str(e)}\n")
+        try:
+            log.write(f"\nERRO FATAL: Exceção na Thread Flask: {str(e)}")
+        except OSError:
+            pass
+        SCHEDULER.update(job_id, status=ERROR, message=str(e))
         
     finally:
-        TRAINING_STATE["is_active"] = False
-        TRAINING_STATE["job_id"] = None
-        TRAINING_STATE["process"] = None
-        TRAINING_STATE["log_path"] = None
-        if log_file_handle:
-             log_file_handle.close()
+        SCHEDULER.update(job_id, finished_at=time.time())
+
+
+def _append_log(job_id, log_file_path, text):
+    append_log(job_id, log_file_path, text)
+
+
+def _format_progress(progress):
+    mb = 1024 * 1024
+    eta = f"{progress['eta_s']}s" if progress.get('eta_s') is not None else "--"
+    phase = " [REDIMENSIONANDO]" if progress.get('phase') == 'resize' else ""
+    return (
+        f"[DATASET]{phase} {progress['files_done']}/{progress['files_total']} arquivos | "
+        f"{progress['bytes_done'] / mb:.1f}/{progress['bytes_total'] / mb:.1f} MB | "
+        f"{progress['files_per_s']} arq/s, {progress['mb_per_s']} MB/s | ETA {eta}"
+    )
+
+
+# --- WARM-START E FINE-TUNING INCREMENTAL ---
+# Com modelo_base o treino parte de um checkpoint do registro de modelos (id, nome
+# ou caminho) em vez de full_config.model. Com "incremental" (true ou
+# {"replay_fraction", "replay_max_per_class", "replay_dataset", "epochs", "lr0"})
+# o dataset novo recebe uma amostra de replay do dataset em que o checkpoint foi
+# treinado e o treino usa um ciclo curto de fine-tuning. A linhagem (checkpoint
+# pai, replay) fica no job, no histórico e em <save_dir>/lineage.json.
+INCREMENTAL_DEFAULTS = {"epochs": 10, "lr0": 0.001, "warmup_epochs": 0}
+DEFAULT_REPLAY_FRACTION = 0.2
+LINEAGE_FILE = "lineage.json"
+
+
+def _read_args_data(args_yaml):
+    """
+    Campo data: do args.yaml gravado pelo Ultralytics no run (sem depender de PyYAML).
+    """
+    try:
+        with open(args_yaml, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("data:"):
+                    return line.split(":", 1)[1].strip().strip("'\"") or None
+    except OSError:
+        return None
+    return None
+
+
+def _replay_source(entry, explicit=None):
+    """
+    Dataset em que o checkpoint foi treinado: o informado, o args.yaml do run de
+    origem (<run>/weights/best.pt -> <run>/args.yaml) ou o 'data' gravado no checkpoint.
+    """
+    candidates = [explicit, _read_args_data(Path(entry["path"]).parent.parent / "args.yaml"), entry.get("train_data")]
+    if entry.get("train_run"):
+        candidates.append(_read_args_data(Path(entry["train_run"]) / "args.yaml"))
+    for candidate in candidates:
+        if candidate and (Path(candidate) / "train").is_dir():
+            return str(Path(candidate).resolve()).replace('\\', '/')
+    return None
+
+
+def _resolve_warm_start(payload):
+    """
+    Valida modelo_base/incremental e monta a linhagem do job (None sem modelo_base).
+    Levanta ValueError para checkpoint não registrado ou opções inválidas.
+    """
+    incremental = payload.get("incremental")
+    base = payload.get("modelo_base")
+    if not base:
+        if incremental:
+            raise ValueError("'incremental' exige 'modelo_base' (checkpoint de partida).")
+        return None
+    entry = get_registry().lookup(base, verify=True)
+    if entry is None:
+        raise ValueError(f"modelo_base não encontrado no registro de modelos: {base}")
+    lineage = {
+        "parent_model": entry["path"],
+        "parent_id": entry.get("id"),
+        "parent_sha256": entry.get("sha256"),
+        "parent_train_run": entry.get("train_run"),
+        "incremental": bool(incremental),
+    }
+    if not incremental:
+        return lineage
+
+    options = incremental if isinstance(incremental, dict) else {}
+    try:
+        fraction = float(options.get("replay_fraction", DEFAULT_REPLAY_FRACTION))
+        max_per_class = options.get("replay_max_per_class")
+        max_per_class = int(max_per_class) if max_per_class is not None else None
+    except (TypeError, ValueError):
+        raise ValueError("replay_fraction deve ser um número e replay_max_per_class um inteiro.")
+    if not 0 <= fraction <= 1:
+        raise ValueError("replay_fraction deve estar entre 0 e 1.")
+    explicit = options.get("replay_dataset")
+    if explicit and not (Path(explicit) / "train").is_dir():
+        raise ValueError(f"replay_dataset não é um dataset materializado (sem train/): {explicit}")
+    lineage.update({
+        "replay_source": _replay_source(entry, explicit) if fraction > 0 else None,
+        "replay_fraction": fraction,
+        "replay_max_per_class": max_per_class,
+        "overrides": {k: options[k] for k in INCREMENTAL_DEFAULTS if k in options},
+    })
+    return lineage
+
+
+def _write_lineage(job):
+    """
+    Grava <save_dir>/lineage.json do run YOLO (pai, replay, dataset) ao fim do job.
+    """
+    lineage = job.get("lineage")
+    save_dir = find_save_dir(job) if lineage else None
+    if save_dir is None:
+        return
+    info = {
+        "job_id": job["job_id"],
+        "status": job.get("status"),
+        "dataset": (job.get("config") or {}).get("data"),
+        "build_key": (job.get("dataset_build") or {}).get("build_key"),
+        "weights": str(save_dir / "weights" / "best.pt"),
+        **lineage,
+    }
+    try:
+        with open(save_dir / LINEAGE_FILE, "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+    except OSError as e:
+        print(f"[WARNING] Não foi possível gravar {LINEAGE_FILE} em {save_dir}: {e}")
+
+
+def _build_train_config(payload, dataset_customizations, job_id, lineage=None):
+    # Garante que o caminho seja POSIX antes de passar para a config
+    if isinstance(dataset_customizations, str):
+         dataset_customizations = dataset_customizations.replace('\\', '/')
+
+    config = dict(payload.get("full_config") or {})
+    config["data"] = dataset_customizations
+
+    invalid_args = [
+        'config_version', 'save_dir', 'format', 'source', 'split', 
+        'tracker', 'simplify', 'opset', 'device' 
+    ]
+    for arg in invalid_args:
+         if arg in config:
+            del config[arg]
+
+    if 'task' not in config: config['task'] = 'classify'
+    if 'mode' not in config: config['mode'] = 'train'
+
+    # save_checkpoints: checkpoint a cada época (save_period do Ultralytics), salvo se já configurado
+    if payload.get("save_checkpoints") and "save_period" not in config:
+        config["save_period"] = 1
+
+    # warm-start: parte do checkpoint escolhido; no modo incremental, ciclo curto de fine-tuning
+    # (os padrões só preenchem o que o full_config não definiu; opções do "incremental" valem sobre tudo)
+    if lineage:
+        config["model"] = lineage["parent_model"]
+        if lineage.get("incremental"):
+            for k, v in INCREMENTAL_DEFAULTS.items():
+                config.setdefault(k, v)
+            config.update(lineage.get("overrides") or {})
+
+    config['name'] = job_id
+    return config
+
+
+# --- THREAD DO JOB: PREPARA O DATASET E DISPARA O TREINAMENTO ---
+def run_training_job(job_id):
+    """
+    Executado pelo SCHEDULER numa thread própria: materializa o dataset (com
+    progresso no registro do job e no log) e depois inicia o processo YOLO.
+    Jobs enfileirados com profiling rodam sob o cProfile (runs/logs/<job_id>.prof).
+    """
+    job = SCHEDULER.get(job_id)
+    try:
+        if not job.get("profile"):
+            return _run_training_job(job_id, job)
+        with ProfileCapture(job_id) as capture:
+            _run_training_job(job_id, job)
+        if capture.enabled:
+            SCHEDULER.update(job_id, profile_url=profile_url(job_id))
+            _append_log(job_id, job["log_path"], f"[PROFILE] Perfil do job salvo ({capture.elapsed_s:.1f}s): {profile_url(job_id)}")
+    finally:
+        # job encerrado (completo, erro ou cancelado): linhagem no run YOLO e entrada no histórico
+        job = SCHEDULER.get(job_id)
+        release_lease(job.get("shard_copy"), job_id)
+        drop_reader(job_id)
+        _write_lineage(job)
+        record_training_job(job)
+
+
+def _run_training_job(job_id, job):
+    payload = job.get("payload") or {}
+    log_file_path = job["log_path"]
+    cancel_event = SCHEDULER.runtime(job_id)["cancel_event"]
+
+    def on_progress(progress):
+        SCHEDULER.update(job_id, progress=progress)
+        _append_log(job_id, log_file_path, _format_progress(progress))
+
+    try:
+        if cancel_event.is_set():
+            raise BuildCancelled("Cancelado antes do início do job.")
+        SCHEDULER.update(job_id, status=PREPARING)
+        dataset_config = dict(payload.get("dataset_config") or {})
+        # resize_imgsz: true/"auto" usa o imgsz do treino (full_config), padrão 224
+        if dataset_config.get("resize_imgsz") in (True, "auto"):
+            dataset_config["resize_imgsz"] = int((payload.get("full_config") or {}).get("imgsz") or 224)
+        # fine-tuning incremental: amostra do dataset de origem do checkpoint entra no build
+        lineage = job.get("lineage")
+        if lineage and lineage.get("replay_source"):
+            dataset_config["replay"] = {
+                "source": lineage["replay_source"],
+                "fraction": lineage["replay_fraction"],
+                "max_per_class": lineage.get("replay_max_per_class"),
+            }
+        elif lineage and lineage.get("incremental"):
+            _append_log(job_id, log_file_path, "[INCREMENTAL] Dataset de origem do checkpoint não encontrado: fine-tuning só com as imagens novas.")
+        dataset_customizations = conf_dataset(
+            dataset_config,
+            job["dataset_path"],
+            progress_callback=on_progress,
+            cancel_event=cancel_event,
+        )
+        build_info = read_build_info(dataset_customizations) or {}
+        SCHEDULER.update(job_id, dataset_build=build_info)
+        if lineage:
+            lineage = dict(lineage, replay=build_info.get("replay"))
+            SCHEDULER.update(job_id, lineage=lineage)
+            _append_log(job_id, log_file_path, f"[INCREMENTAL] Partindo de {lineage['parent_model']}"
+                        + (f" com {lineage['replay']['images']} imagens de replay" if lineage.get("replay") else ""))
+        if build_info.get("cache_hit"):
+            _append_log(job_id, log_file_path, f"[DATASET] Build reaproveitado (build_key={build_info['build_key'][:16]}): {dataset_customizations}")
+        else:
+            _append_log(job_id, log_file_path, f"[DATASET] Dataset pronto em {dataset_customizations}")
+
+        # train_from_shards: a CLI do YOLO só lê pastas, então treina numa cópia local reidratada
+        # dos shards (lida do disco de origem numa passada sequencial). A lease segura a cópia
+        # contra a remoção de cópias antigas até o job terminar (run_training_job)
+        if dataset_config.get("train_from_shards") and has_shards(dataset_customizations):
+            dataset_customizations = resolve_dataset_path(dataset_customizations, use_shards=True, lease=job_id)
+            SCHEDULER.update(job_id, shard_copy=dataset_customizations)
+            _append_log(job_id, log_file_path, f"[DATASET] Treinando na cópia reidratada dos shards em {dataset_customizations}")
+
+        if cancel_event.is_set():
+            raise BuildCancelled("Cancelado antes do início do treinamento.")
+    except BuildCancelled:
+        _append_log(job_id, log_file_path, "\n\n--- TREINAMENTO CANCELADO PELO USUÁRIO ---")
+        SCHEDULER.update(job_id, status=CANCELLED, finished_at=time.time())
+        return
+    except Exception as e:
+        print(f"[ERROR] Erro ao preparar dataset: {e}")
+        _append_log(job_id, log_file_path, f"\n\n--- ERRO_TREINAMENTO: Falha ao preparar o dataset: {e} ---")
+        SCHEDULER.update(job_id, status=ERROR, message=str(e), finished_at=time.time())
+        return
+
+    config = _build_train_config(payload, dataset_customizations, job_id, lineage)
+    run_training_job_process(job_id, config)
+
+
+def _current_job():
+    """
+    Job exibido por /train/status sem job_id: o ativo mais recente, senão o
+    próximo da fila.
+    """
+    active = sorted(SCHEDULER.active_jobs(), key=lambda j: j.get("started_at") or 0, reverse=True)
+    if active:
+        return active[0]
+    queued = SCHEDULER.list(status=QUEUED)
+    return queued[-1] if queued else None
+
+
+def _job_summary(job):
+    """
+    Visão pública de um job (sem o payload completo).
+    """
+    return {
+        "job_id": job["job_id"],
+        "status": job.get("status"),
+        "priority": job.get("priority", 0),
+        "created_at": job.get("created_at"),
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+        "dataset": (job.get("payload") or {}).get("dataset"),
+        "progress": job.get("progress"),
+        "return_code": job.get("return_code"),
+        "message": job.get("message"),
+        "log_url": f"/train/logs/{job['job_id']}",
+        "metrics_url": f"/train/jobs/{job['job_id']}/metrics",
+        "profile_url": job.get("profile_url"),
+    }
+
+
+@bp.before_app_request
+def _start_scheduler():
+    # Dispatcher só sobe em processo que atende requisições (não no pai do reloader)
+    SCHEDULER.start()
 
 @bp.route("/status", methods=["GET"])
 def get_training_status():
-    global TRAINING_STATE
-    if TRAINING_STATE["is_active"] and TRAINING_STATE["process"] and TRAINING_STATE["process"].poll() is not None:
-         TRAINING_STATE["is_active"] = False
+    job_id = request.args.get("job_id")
+    if job_id:
+        job = SCHEDULER.get(job_id)
+        if job is None:
+            return jsonify({"status": "not_found", "message": f"Job '{job_id}' não encontrado."}), 404
+    else:
+        job = _current_job()
+
+    summary = SCHEDULER.summary()
+    if job is None:
+        return jsonify({"is_active": False, "job_id": None, "status": "idle", **summary})
+
     return jsonify({
-        "is_active": TRAINING_STATE["is_active"],
-        "job_id": TRAINING_STATE["job_id"],
-        "status": TRAINING_STATE["status"]
+        "is_active": job["status"] in ACTIVE_STATES + (QUEUED,),
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "progress": job.get("progress"),
+        "dataset_build": job.get("dataset_build"),
+        "queue_position": SCHEDULER.queue_position(job["job_id"]),
+        **summary
     })
 
 @bp.route("/cancel", methods=["POST"])
 def cancel_train():
-    global TRAINING_STATE
-    if not TRAINING_STATE["is_active"] or not TRAINING_STATE["process"]:
+    body = request.get_json(silent=True) or {}
+    job_id = body.get("job_id") or request.args.get("job_id")
+    if not job_id:
+        current = _current_job()
+        job_id = current["job_id"] if current else None
+
+    if not job_id or not SCHEDULER.is_active(job_id):
         return jsonify({"status": "not_running", "message": "Nenhum treinamento ativo para cancelar."}), 409
     
-    process = TRAINING_STATE["process"]
-    job_id = TRAINING_STATE["job_id"]
-    log_file_path = TRAINING_STATE["log_path"]
-    TRAINING_STATE["status"] = "cancelled" 
-    
     try:
-        process.terminate()
-        process.wait(timeout=10)
-        
-        if process.poll() is None:
-            process.kill()
-            process.wait()
-            
-        with open(log_file_path, 'a') as f:
-            f.write("\n\n--- TREINAMENTO CANCELADO PELO USUÁRIO ---\n")
-            f.flush()
-        
+        SCHEDULER.cancel(job_id)
+        # cancelado ainda na fila: o runner nunca roda, então o histórico é gravado aqui
+        job = SCHEDULER.get(job_id)
+        if job and job.get("finished_at"):
+            record_training_job(job)
         return jsonify({"status": "cancelled", "job_id": job_id, "message": "Treinamento cancelado com sucesso."}), 200
 
     except Exception as e:
-        TRAINING_STATE["is_active"] = False
         return jsonify({"status": "error", "message": f"Erro ao tentar cancelar: {str(e)}"}), 500
 
 @bp.route("/start", methods=["POST"])
 def start_train():  
-    global TRAINING_STATE
-    
-    if TRAINING_STATE["is_active"]:
-        return jsonify({"status": "error", "message": f"Um treinamento ({TRAINING_STATE['job_id']}) já está em andamento. Cancele-o primeiro."}), 409
-        
     payload = request.get_json() or {}
     
     try:
         dataset_path = r'./custom/upload_folder_image/' + payload.get("dataset", "")
-        dataset_config = payload.get("dataset_config", {})
-        
-        dataset_customizations = conf_dataset(dataset_config, dataset_path)
-        
-        # Garante que o caminho seja POSIX antes de passar para a config
-        if isinstance(dataset_customizations, str):
-             dataset_customizations = dataset_customizations.replace('\\', '/')
-            
-        config = payload.get("full_config", {})
-        config["data"] = dataset_customizations
-        
-        invalid_args = [
-            'config_version', 'save_dir', 'format', 'source', 'split', 
-            'tracker', 'simplify', 'opset', 'device' 
-        ]
-        for arg in invalid_args:
-             if arg in config:
-                del config[arg]
-        
-        if 'task' not in config: config['task'] = 'classify'
-        if 'mode' not in config: config['mode'] = 'train'
-        
-        job_id = payload.get("exp_name", f"exp-{int(time.time() * 1000)}")
-        config['name'] = job_id
+        if not payload.get("dataset") or not Path(dataset_path).exists():
+            raise FileNotFoundError(f"Pasta do dataset de upload não encontrada: {dataset_path}")
+
+        try:
+            lineage = _resolve_warm_start(payload)
+        except ValueError as e:
+            return jsonify({"status": "error", "error": str(e)}), 400
+
+        try:
+            priority = parse_priority(payload.get("priority", 0))
+        except ValueError as e:
+            return jsonify({"status": "error", "error": str(e)}), 400
+
+        # exp_name vira nome de arquivo (runs/jobs, runs/logs): unique_job_id saneia
+        job_id = SCHEDULER.unique_job_id(payload.get("exp_name") or f"exp-{int(time.time() * 1000)}")
         
         log_file = LOGS_DIR / f"{job_id}.log"
-        TRAINING_STATE["is_active"] = True
-        TRAINING_STATE["job_id"] = job_id
-        TRAINING_STATE["log_path"] = log_file
-        TRAINING_STATE["status"] = "starting"
-        
-        thread = threading.Thread(target=run_training_job_process, args=(job_id, config))
-        thread.daemon = True
-        thread.start()
+        with open(log_file, 'w', encoding='utf-8') as f:
+            f.write(f"--- JOB NA FILA ---\n{dataset_path}\n------------------------\n")
+
+        # O build do dataset e o treino rodam em segundo plano, quando houver vaga na fila
+        # (X-Profile / ?profile=1 / amostragem: o job inteiro roda sob o cProfile)
+        profile = wants_profile()
+        SCHEDULER.submit(
+            job_id,
+            priority=priority,
+            payload=payload,
+            dataset_path=dataset_path,
+            log_path=str(log_file),
+            profile=profile,
+            lineage=lineage,
+        )
 
-        return jsonify({
+        response = {
             "status": "training_started_async",
             "job_id": job_id,
-            "message": "Treinamento iniciado em segundo plano."
-        }), 200
+            "queue_position": SCHEDULER.queue_position(job_id),
+            "message": "Treinamento enfileirado para execução em segundo plano."
+        }
+        if profile:
+            response["profile_url"] = profile_url(job_id)
+        if lineage:
+            response["lineage"] = lineage
+        return jsonify(response), 200
 
     except Exception as e:
-        TRAINING_STATE["is_active"] = False
-        TRAINING_STATE["job_id"] = None
-        TRAINING_STATE["status"] = "idle"
-        
         print(f"[ERROR] Erro ao iniciar treinamento: {e}")
         return jsonify({
             "status": "error",
@@ -473,46 +1093,40 @@ def start_train():
 
 @bp.route("/logs/<job_id>", methods=["GET"])
 def get_log_file(job_id):
+    if not is_safe_job_id(job_id):
+        return jsonify({"status": "error", "error": f"job_id inválido: {job_id}"}), 400
     log_file = LOGS_DIR / f"{job_id}.log"
     if not log_file.exists():
         return Response(f"data: [ERRO] Arquivo de log não encontrado: {log_file}\n\n", mimetype="text/event-stream")
 
+    # Reconexão: o EventSource reenvia o último id recebido; ?from=0 pede todo o buffer em memória
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("from")
+    try:
+        after = int(last_id) if last_id not in (None, "") else None
+    except ValueError:
+        after = None
+
+    broadcaster = LOG_BROADCASTS.get(job_id)
+    if broadcaster is None and SCHEDULER.is_active(job_id):
+        broadcaster = LOG_BROADCASTS.get(job_id, log_file)
+
     def generate():
+        if broadcaster is None:
+            # job encerrado antes deste processo subir: nada mais será escrito no log
+            yield "data: [INFO] Fim da conexão de log.\n\n"
+            return
         try:
-            # Tenta usar latin-1 para máxima compatibilidade com saída de console
-            with open(log_file, 'r', encoding='latin-1') as f:
-                # posiciona no final do arquivo para seguir por novas linhas
-                f.seek(0, 2)
-
-                while True:
-                    line = f.readline()
-
-                    if not line:
-                        time.sleep(0.1)
-                        # quando o job não está mais ativo e não é o mesmo job_id, finalize
-                        if not TRAINING_STATE["is_active"] and TRAINING_STATE["job_id"] != job_id:
-                            # leia qualquer linha residual antes de encerrar
-                            final_line = f.readline()
-                            if final_line:
-                                # garante que termine com dupla quebra de linha para completar o evento SSE
-                                yield f"data: {final_line.rstrip()}\n\n"
-                            yield "data: [INFO] Fim da conexão de log.\n\n"
-                            break
-                        continue
-
-                    # Para cada linha nova, envie um evento SSE corretamente terminado por uma linha em branco
-                    try:
-                        yield f"data: {line.rstrip()}\n\n"
-                    except Exception:
-                        # fallback simples caso haja caracteres estranhos
-                        yield f"data: {line.encode('utf-8', errors='replace')}\n\n"
+            # Cada assinante só lê do buffer em memória; a thread dorme até chegar linha nova
+            for item in broadcaster.follow(after=after):
+                if item is None:
+                    yield ": keepalive\n\n"
+                    continue
+                seq, line = item
+                yield f"id: {seq}\ndata: {line.rstrip()}\n\n"
+            yield "data: [INFO] Fim da conexão de log.\n\n"
         except Exception as e:
             yield f"data: [ERRO NO STREAM] {str(e)}\n\n"
 
-        # caso o servidor ainda refira este job_id, notifique encerramento do stream
-        if TRAINING_STATE["job_id"] == job_id:
-            yield "data: [INFO] Stream encerrado pelo servidor.\n\n"
-
     # Add no-cache and disable proxy buffering where possible to improve real-time delivery
     headers = {
         'Cache-Control': 'no-cache',
@@ -523,110 +1137,239 @@ def get_log_file(job_id):
 @bp.route('/negative-lines', methods=['GET'])
 def list_negative_lines():
     """Retorna um mapeamento do formato { "Cone": {"CM-A": 123, ...}, ... }
-    baseado nas subpastas encontradas em projeto/app/storage/imagens_implates.
+    baseado nas subpastas encontradas em projeto/app/storage/imagens_implates
+    (via catálogo persistente, revalidado pelos mtimes dos diretórios).
     """
-    BASE = Path('./projeto/app/storage/imagens_implates')
-    IMG_EXT = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff'}
     result = {}
-
-    # Mapeamento opcional de pastas para nomes legíveis
-    TYPE_MAP = {
-        'CM': 'Cone',
-        'HE': 'Hex Externo',
-        'HI': 'Hex Interno'
-    }
-
-    if not BASE.exists() or not BASE.is_dir():
-        return jsonify(result)
-
     try:
-        for type_dir in BASE.iterdir():
-            if not type_dir.is_dir():
-                continue
-            short = type_dir.name
-            type_name = TYPE_MAP.get(short, short)
-            lines = {}
-
-            # Cada subpasta representa uma 'linha' — contamos arquivos de imagem dentro dela
-            for sub in type_dir.iterdir():
-                if sub.is_dir():
-                    count = 0
-                    try:
-                        for f in sub.rglob('*'):
-                            if f.suffix.lower() in IMG_EXT and f.is_file():
-                                count += 1
-                    except Exception:
-                        count = 0
-                    lines[sub.name] = count
-
-            # Além disso, contemple arquivos soltos diretamente na pasta do tipo
-            root_count = 0
-            try:
-                for f in type_dir.iterdir():
-                    if f.is_file() and f.suffix.lower() in IMG_EXT:
-                        root_count += 1
-            except Exception:
-                root_count = 0
-
-            if root_count > 0:
-                lines['root'] = root_count
-
-            result[type_name] = lines
+        result = get_catalog().line_counts()
     except Exception as e:
         print('[ERROR] list_negative_lines failed:', e)
 
     return jsonify(result)
 
+@bp.route("/jobs", methods=["GET"])
+def list_jobs():
+    """Lista os jobs conhecidos (mais recentes primeiro). Filtros: ?status=&limit="""
+    status = request.args.get("status") or None
+    try:
+        limit = int(request.args.get("limit", 100))
+    except ValueError:
+        limit = 100
+    jobs = [_job_summary(j) for j in SCHEDULER.list(status=status)[:max(0, limit)]]
+    return jsonify({"jobs": jobs, **SCHEDULER.summary()})
+
 @bp.route("/jobs/<job_id>", methods=["GET"])
 def get_job(job_id):
-    pass
-    return {"job_id": job_id, "status": "placeholder", "logs": []}
+    job = SCHEDULER.get(job_id)
+    if job is None:
+        return jsonify({"job_id": job_id, "status": "not_found"}), 404
+    return jsonify({
+        **_job_summary(job),
+        "queue_position": SCHEDULER.queue_position(job_id),
+        "dataset_build": job.get("dataset_build"),
+        "config": job.get("config"),
+        "payload": job.get("payload"),
+    })
+
+@bp.route("/jobs/<job_id>/metrics", methods=["GET"])
+def get_job_metrics(job_id):
+    """Métricas por época do job (results.csv). ?since=<época> retorna só as épocas seguintes."""
+    job = SCHEDULER.get(job_id)
+    if job is None:
+        return jsonify({"job_id": job_id, "status": "not_found"}), 404
+    since = request.args.get("since")
+    try:
+        since = int(since) if since not in (None, "") else None
+    except ValueError:
+        return jsonify({"detail": "'since' deve ser o número de uma época."}), 400
+
+    reader = get_reader(job)
+    epochs = reader.since(since) if reader else []
+    last_epoch = epochs[-1]["epoch"] if epochs else since
+    return jsonify({
+        "job_id": job_id,
+        "status": job.get("status"),
+        "total_epochs": (job.get("config") or {}).get("epochs"),
+        "last_epoch": last_epoch,
+        "epochs": epochs,
+    })
 
 @bp.route('/upload-folder', methods=['POST'])
 def upload_folder():
-    import os
     from werkzeug.utils import secure_filename
     # Root uploads folder
-    base_root = os.path.abspath(os.path.join(os.getcwd(), 'custom', 'upload_folder_image', 'uploads'))
-    os.makedirs(base_root, exist_ok=True)
+    base_root = uploads_root()
     # dataset_name can be provided by frontend; used to ensure files go under that folder
     dataset_name = request.form.get('dataset_name') or request.args.get('dataset_name') or ''
     safe_dataset = secure_filename(dataset_name) if dataset_name else ''
 
+    # com ?dedup=sha256|phash (ou true), imagens com o mesmo conteúdo de outra já presente
+    # no dataset são descartadas antes de entrar nele
+    dataset_root = os.path.join(base_root, safe_dataset)
+    dedup = index_directory(dataset_root, request.values.get('dedup')) if safe_dataset else None
+
     files = request.files.getlist('files')
     saved = 0
+    duplicates = []
     errors = []
     print("STARTING UPLOAD...")
     for f in files:
         filename = getattr(f, 'filename', None) or ''
-        rel = filename.replace('\\', '/').lstrip('/')
-        parts = [p for p in rel.split('/') if p and p != '..']
-
-        if not parts:
-            # fallback simple filename
-            fname = secure_filename(filename) or 'file'
-            target = os.path.join(base_root, fname) if not safe_dataset else os.path.join(base_root, safe_dataset, fname)
-        else:
-            # If frontend provided dataset_name and the uploaded relative path already includes it as top folder,
-            # do not duplicate the folder name. Otherwise, prefix with dataset_name so files land under uploads/<dataset_name>/...
-            if safe_dataset:
-                if parts[0] == safe_dataset:
-                    target_parts = parts
-                else:
-                    target_parts = [safe_dataset] + parts
-            else:
-                target_parts = parts
-            safe_parts = [secure_filename(p) for p in target_parts]
-            target = os.path.join(base_root, *safe_parts)
         try:
+            target = upload_target(base_root, safe_dataset, filename)
             os.makedirs(os.path.dirname(target), exist_ok=True)
-            f.save(target)
+            if dedup is None or dedup.mode == 'off':
+                f.save(target)
+                saved += 1
+                continue
+            part = target + PART_SUFFIX
+            digest = hashlib.sha256()
+            try:
+                with open(part, 'wb') as out:
+                    for chunk in iter(lambda: f.stream.read(COPY_BUFFER), b''):
+                        digest.update(chunk)
+                        out.write(chunk)
+                original = admit_incoming(dedup, dataset_root, part, target, digest.hexdigest())
+            finally:
+                if os.path.exists(part):
+                    os.remove(part)
+            if original is not None:
+                duplicates.append({'file': filename, 'duplicate_of': original})
+                continue
             saved += 1
         except Exception as e:
-            print(f"[ERROR] Could not save uploaded file to {target}: {e}")
+            print(f"[ERROR] Could not save uploaded file {filename}: {e}")
             errors.append({'file': filename, 'error': str(e)})
+    if dedup is not None and dedup.mode != 'off':
+        get_hash_cache().flush()
     print("FINASHED")
-    return jsonify({'status': 'ok', 'saved': saved, 'errors': errors}), (200 if not errors else 207)
+    return jsonify({'status': 'ok', 'saved': saved, 'duplicates': duplicates, 'errors': errors}), (200 if not errors else 207)
+
+@bp.route('/upload/init', methods=['POST'])
+def upload_init():
+    """Início/retomada do upload em blocos.
+    Corpo: {"dataset_name": "...", "files": [{"path": "pasta/img.jpg", "size": 123, "sha256": "..."}]}
+    Retorna, por arquivo, status 'complete' (pular), 'partial' (retomar do offset) ou 'new'.
+    """
+    from werkzeug.utils import secure_filename
+    body = request.get_json(silent=True) or {}
+    dataset_name = body.get('dataset_name') or ''
+    safe_dataset = secure_filename(dataset_name) if dataset_name else ''
+    entries = body.get('files')
+    if not isinstance(entries, list):
+        return jsonify({'detail': "Payload inválido: 'files' deve ser lista."}), 400
+
+    base_root = uploads_root()
+    # Com sha256 informado, arquivos cujo conteúdo já existe no dataset (com outro nome) nem são enviados
+    dataset_root = os.path.join(base_root, safe_dataset)
+    # só sha256 aqui: o cliente manda o hash, não a imagem (phash cai para sha256)
+    dedup_mode = normalize_dedup_mode(body.get('dedup'))
+    dedup = index_directory(dataset_root, 'sha256') if safe_dataset and dedup_mode != 'off' else None
+    batch_seen = DuplicateIndex('sha256')
+    result = []
+    for entry in entries:
+        path = (entry or {}).get('path') or ''
+        try:
+            size = int(entry.get('size'))
+            target = upload_target(base_root, safe_dataset, path)
+            status, offset = file_state(target, size, entry.get('sha256'))
+            sha = entry.get('sha256')
+            if status != 'complete' and sha and dedup is not None:
+                key = os.path.relpath(target, dataset_root).replace('\\', '/')
+                # contra o dataset (sem registrar: o arquivo ainda não chegou) e contra o próprio lote
+                original = find_existing(dedup, dataset_root, sha.lower())
+                if original is None or original == key:
+                    original = batch_seen.check_add(key, sha.lower())
+                if original is not None and original != key:
+                    result.append({'path': path, 'status': 'duplicate', 'duplicate_of': original, 'offset': 0})
+                    continue
+            result.append({'path': path, 'status': status, 'offset': offset})
+        except (UploadError, TypeError, ValueError) as e:
+            result.append({'path': path, 'status': 'error', 'error': str(e)})
+    summary = {s: sum(1 for r in result if r['status'] == s) for s in ('complete', 'partial', 'new', 'duplicate', 'error')}
+    return jsonify({'dataset_name': safe_dataset, 'files': result, 'summary': summary})
+
+@bp.route('/upload/chunk', methods=['PUT', 'POST'])
+def upload_chunk():
+    """Grava um bloco de um arquivo. O corpo da requisição são os bytes crus do bloco.
+    Query: dataset_name, path, offset, size (total do arquivo), sha256 (opcional, conferido no final)
+    e dedup (ex.: sha256): no último bloco, conteúdo já presente no dataset não entra nele.
+    """
+    from werkzeug.utils import secure_filename
+    dataset_name = request.args.get('dataset_name') or ''
+    safe_dataset = secure_filename(dataset_name) if dataset_name else ''
+    path = request.args.get('path') or ''
+    try:
+        offset = int(request.args.get('offset', 0))
+        size = int(request.args['size'])
+    except (KeyError, ValueError):
+        return jsonify({'detail': "'offset' e 'size' devem ser inteiros."}), 400
+
+    duplicate_of = {}
+    try:
+        base_root = uploads_root()
+        target = upload_target(base_root, safe_dataset, path)
+        admit = None
+        if safe_dataset and normalize_dedup_mode(request.args.get('dedup')) != 'off':
+            # só sha256: mesmo modo do /upload/init (o índice é carregado só no último bloco)
+            dataset_root = os.path.join(base_root, safe_dataset)
+
+            def admit(part, final, sha):
+                dedup = index_directory(dataset_root, 'sha256')
+                duplicate_of['original'] = admit_incoming(dedup, dataset_root, part, final, sha)
+                get_hash_cache().flush()
+                if duplicate_of['original'] is not None:
+                    try:
+                        # pasta criada só para o .part descartado
+                        os.rmdir(os.path.dirname(final))
+                    except OSError:
+                        pass
+                return duplicate_of['original']
+
+        # request.stream lê direto do socket (sem o spool de multipart do Werkzeug)
+        status, current = write_chunk(target, offset, size, request.stream, request.args.get('sha256'), admit=admit)
+    except UploadError as e:
+        return jsonify({'path': path, 'status': 'error', 'error': str(e), **e.extra}), e.status
+    except OSError as e:
+        print(f"[ERROR] Could not write upload chunk for {path}: {e}")
+        return jsonify({'path': path, 'status': 'error', 'error': str(e)}), 500
+    if status == 'duplicate':
+        return jsonify({'path': path, 'status': status, 'offset': current, 'duplicate_of': duplicate_of['original']})
+    return jsonify({'path': path, 'status': status, 'offset': current})
+
+@bp.route('/upload-archive', methods=['POST', 'PUT'])
+def upload_archive():
+    """Recebe um .zip ou .tar(.gz/.bz2/.xz) e extrai as imagens em uploads/<dataset_name>/.
+    Aceita o arquivo no corpo cru (?dataset_name=&filename=) ou em multipart (campo 'file').
+    """
+    from werkzeug.utils import secure_filename
+    upload = request.files.get('file') if request.mimetype == 'multipart/form-data' else None
+    if upload is not None:
+        filename = upload.filename or ''
+        stream = upload.stream
+    else:
+        filename = request.args.get('filename') or ''
+        stream = request.stream
+
+    # sem dataset_name, usa o nome do arquivo sem extensão (ex.: meu_dataset.tar.gz -> meu_dataset)
+    dataset_name = request.values.get('dataset_name') or os.path.basename(filename).split('.')[0]
+    safe_dataset = secure_filename(dataset_name) if dataset_name else ''
+    if not safe_dataset:
+        return jsonify({'status': 'error', 'error': "Informe 'dataset_name'."}), 400
+
+    try:
+        base_root = uploads_root()
+        dedup = index_directory(os.path.join(base_root, safe_dataset), request.values.get('dedup'))
+        result = ingest_archive(stream, filename, base_root, safe_dataset, dedup=dedup)
+    except UploadError as e:
+        return jsonify({'status': 'error', 'error': str(e), **e.extra}), e.status
+    except Exception as e:
+        print(f"[ERROR] Falha ao extrair arquivo enviado: {e}")
+        return jsonify({'status': 'error', 'error': str(e)}), 500
+
+    print(f"[INFO] Upload compactado extraído em {safe_dataset}: {result['extracted']} imagens.")
+    return jsonify({'status': 'ok', 'dataset_name': safe_dataset, **result}), (200 if not result['rejected'] else 207)
 
 @bp.route('/datasets', methods=['GET'])
 def list_uploaded_datasets():
@@ -639,6 +1382,8 @@ def list_uploaded_datasets():
         if not os.path.isdir(root):
             return
         for dirpath, dirnames, filenames in os.walk(root):
+            # pastas ocultas (ex.: staging de uploads compactados em andamento) não são datasets
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
             if filenames:
                 rel = os.path.relpath(dirpath, base_root)
                 rel = rel.replace('\\', '/')
@@ -53,68 +53,23 @@
         }
     }
 
-    // parse HTML directory listing and return hrefs (relative/absolute)
-    function parseDirListingHtml(html, baseUrl) {
-        const links = [];
-        const re = /href=["']?([^"'>\s]+?)["']?/ig;
-        let m;
-        while ((m = re.exec(html)) !== null) {
-            let href = m[1];
-            // normalize relative hrefs into full URL
-            if (!/^https?:\/\//i.test(href) && !href.startsWith('/')) {
-                href = baseUrl.replace(/\/$/, '') + '/' + href.replace(/^\.\//, '');
-            } else if (href.startsWith('/')) {
-                href = window.location.origin + href;
-            }
-            links.push(href);
-        }
-        return links;
+    // returns list of timestamped runs e.g. ["predicao_20251110_153145", ...] (mais recente primeiro)
+    async function getPredictionsList() {
+        const r = await safeFetch(`${API_BASE}/predictions/runs`);
+        return r?.runs ?? [];
     }
 
-    // returns list of timestamped runs e.g. ["predicao_20251110_153145", ...]
-    async function getPredictionsList() {
-        try {
-            const res = await fetch(`${API_BASE}/predictions/`);
-            if (!res.ok) return [];
-            const txt = await res.text();
-            const links = parseDirListingHtml(txt, `${API_BASE}/predictions/`);
-            // extract folder names that start with predicao_
-            const runs = [];
-            for (const l of links) {
-                try {
-                    const u = new URL(l);
-                    const seg = u.pathname.replace(/\/+$/, '').split('/').pop();
-                    if (seg && seg.startsWith('predicao_')) runs.push(seg);
-                } catch (e) { /* ignore */ }
-            }
-            // unique, preserve order found
-            return Array.from(new Set(runs));
-        } catch (e) {
-            return [];
-        }
+    // manifesto JSON de uma execução: modelos, arquivos (tamanho, content_type, url) e matrizes de confusão
+    async function getRunManifest(runName) {
+        if (!runName) return null;
+        return await safeFetch(`${API_BASE}/predictions/${encodeURIComponent(runName)}/manifest`);
     }
 
     // list model subfolders inside a specific run: returns array of folder names (e.g. ["01_best","fabricante-1"])
     async function listModelsInRun(runName) {
         if (!runName) return [];
-        const baseUrl = `${API_BASE}/predictions/${encodeURIComponent(runName)}/`;
-        try {
-            const res = await fetch(baseUrl);
-            if (!res.ok) return [];
-            const txt = await res.text();
-            const links = parseDirListingHtml(txt, baseUrl);
-            const models = [];
-            for (const l of links) {
-                try {
-                    const u = new URL(l);
-                    const seg = u.pathname.replace(/\/+$/, '').split('/').pop();
-                    if (seg && !seg.startsWith('.')) models.push(seg);
-                } catch (e) { /* ignore */ }
-            }
-            return Array.from(new Set(models));
-        } catch (e) {
-            return [];
-        }
+        const r = await safeFetch(`${API_BASE}/predictions/${encodeURIComponent(runName)}/models`);
+        return r?.models ?? [];
     }
 
     async function getDatasets() {
@@ -148,11 +103,135 @@
         }
     }
 
+    // classificação online (micro-batching no backend): retorna top-k por imagem
+    async function predictImage(file, model, topK) {
+        const fd = new FormData();
+        fd.append('file', file);
+        if (model) fd.append('model', model);
+        if (topK) fd.append('top_k', String(topK));
+        return await safeFetch(`${API_BASE}/predict/image`, { method: 'POST', body: fd });
+    }
+    async function predictBatch(files, model, topK) {
+        const fd = new FormData();
+        for (const f of files) fd.append('files', f);
+        if (model) fd.append('model', model);
+        if (topK) fd.append('top_k', String(topK));
+        return await safeFetch(`${API_BASE}/predict/batch`, { method: 'POST', body: fd });
+    }
+
+    // métricas por época de um job; passe a última época recebida em `since` para pegar só o delta
+    async function getJobMetrics(jobId, since) {
+        const qs = (since !== undefined && since !== null) ? `?since=${encodeURIComponent(since)}` : '';
+        return await safeFetch(`${API_BASE}/train/jobs/${encodeURIComponent(jobId)}/metrics${qs}`);
+    }
+
+    // --- Upload em blocos, retomável (POST /train/upload/init + PUT /train/upload/chunk) ---
+    async function sha256Hex(file) {
+        // crypto.subtle só existe em contexto seguro (https/localhost); sem ele o servidor confere apenas o tamanho
+        if (!(global.crypto && global.crypto.subtle)) return null;
+        const digest = await global.crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+        return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    async function uploadDatasetChunked(files, datasetName, opts) {
+        const options = Object.assign({ concurrency: 4, chunkSize: 8 * 1024 * 1024, retries: 5, initBatch: 500, dedup: null, onProgress: null }, opts || {});
+        const entries = [];
+        for (const f of files) {
+            entries.push({ file: f, path: f.webkitRelativePath || f.name, size: f.size, sha256: await sha256Hex(f) });
+        }
+
+        // 1) pergunta ao servidor o que já existe (completo ou parcial)
+        const offsets = new Map();
+        for (let i = 0; i < entries.length; i += options.initBatch) {
+            const batch = entries.slice(i, i + options.initBatch);
+            const res = await fetch(`${API_BASE}/train/upload/init`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ dataset_name: datasetName, dedup: options.dedup, files: batch.map(e => ({ path: e.path, size: e.size, sha256: e.sha256 })) })
+            });
+            if (!res.ok) throw new Error(`upload/init falhou: ${res.status}`);
+            const data = await res.json();
+            data.files.forEach((r, j) => offsets.set(batch[j].path, r));
+        }
+
+        const result = { saved: 0, skipped: 0, duplicates: 0, errors: [] };
+        const pending = entries.filter(e => {
+            const st = offsets.get(e.path);
+            if (st && st.status === 'complete') { result.skipped += 1; return false; }
+            // mesmo conteúdo já existe no dataset com outro nome: não precisa enviar
+            if (st && st.status === 'duplicate') { result.skipped += 1; result.duplicates += 1; return false; }
+            return true;
+        });
+        const total = entries.length;
+        const report = () => { if (options.onProgress) options.onProgress({ done: result.saved + result.skipped, total, errors: result.errors.length }); };
+        report();
+
+        async function sendFile(e) {
+            let offset = offsets.get(e.path)?.offset || 0;
+            let attempt = 0;
+            while (true) {
+                const end = Math.min(offset + options.chunkSize, e.size);
+                const qs = new URLSearchParams({ dataset_name: datasetName, path: e.path, offset: String(offset), size: String(e.size) });
+                if (e.sha256) qs.set('sha256', e.sha256);
+                if (options.dedup) qs.set('dedup', options.dedup);
+                let res = null;
+                try {
+                    res = await fetch(`${API_BASE}/train/upload/chunk?${qs}`, { method: 'PUT', headers: { 'Content-Type': 'application/octet-stream' }, body: e.file.slice(offset, end) });
+                } catch (err) {
+                    res = null;
+                }
+                const data = res ? await res.json().catch(() => ({})) : {};
+                if (res && res.ok) {
+                    attempt = 0;
+                    offset = data.offset;
+                    // 'duplicate': o conteúdo já estava no dataset e o servidor descartou o arquivo montado
+                    if (data.status === 'complete' || data.status === 'duplicate') return data.status;
+                    continue;
+                }
+                // 409/422 trazem o offset que o servidor espera; erro de rede tenta de novo com backoff
+                if (res && typeof data.offset === 'number') offset = data.offset;
+                attempt += 1;
+                if (attempt > options.retries) throw new Error(data.error || `falha no envio (${res ? res.status : 'rede'})`);
+                await new Promise(r => setTimeout(r, Math.min(8000, 250 * 2 ** attempt)));
+            }
+        }
+
+        let next = 0;
+        async function worker() {
+            while (next < pending.length) {
+                const e = pending[next++];
+                try {
+                    if (await sendFile(e) === 'duplicate') { result.skipped += 1; result.duplicates += 1; }
+                    else result.saved += 1;
+                } catch (err) {
+                    result.errors.push({ file: e.path, error: String(err.message || err) });
+                }
+                report();
+            }
+        }
+        await Promise.all(Array.from({ length: Math.max(1, options.concurrency) }, worker));
+        result.status = result.errors.length ? 'partial' : 'ok';
+        return result;
+    }
+
+    // envia um .zip/.tar(.gz) inteiro; o servidor extrai as imagens em uploads/<datasetName>
+    async function uploadDatasetArchive(file, datasetName) {
+        try {
+            const qs = new URLSearchParams({ filename: file.name });
+            if (datasetName) qs.set('dataset_name', datasetName);
+            const res = await fetch(`${API_BASE}/train/upload-archive?${qs}`, { method: 'PUT', headers: { 'Content-Type': 'application/octet-stream' }, body: file });
+            return await res.json();
+        } catch (e) {
+            console.error('[API] uploadDatasetArchive error', e);
+            return null;
+        }
+    }
+
     async function getNegativeLines() {
         const r = await safeFetch(`${API_BASE}/train/negative-lines`);
         // espera um objeto { "Cone": {"CM-A": 123, ...}, ... }
         return r || {};
     }
 
-    global.API = Object.assign(global.API || {}, { API_BASE, safeFetch, testIsImage, getLastDir, getModels, postPredict, getPredictionsList, listModelsInRun, getDatasets, getNegativeLines, uploadDataset });
+    global.API = Object.assign(global.API || {}, { API_BASE, safeFetch, testIsImage, getLastDir, getModels, postPredict, getPredictionsList, getRunManifest, listModelsInRun, getDatasets, getNegativeLines, uploadDataset, predictImage, predictBatch, getJobMetrics, uploadDatasetChunked, uploadDatasetArchive });
 })(window);
@@ -13,7 +13,16 @@
             return [];
         }
 
-        // monta a base do caminho — sem subpasta "predicao/"
+        // manifesto da execução: uma requisição com todas as imagens de cada modelo
+        const manifest = await window.API.getRunManifest(lastDir).catch(() => null);
+        if (manifest && Array.isArray(manifest.models)) {
+            const entry = manifest.models.find(m => m.name === modelName);
+            const images = (entry?.images || []).map(u => /^https?:\/\//i.test(u) ? u : `${window.API.API_BASE}${u}`);
+            if (images.length === 0) console.warn(`Nenhuma imagem encontrada para modelo ${modelName}`);
+            return images;
+        }
+
+        // fallback (backend sem manifesto): testa os nomes esperados um a um
         const baseUrl = `${window.API.API_BASE}/predictions/${encodeURIComponent(lastDir)}/${encodeURIComponent(modelName)}/predicao/`;
 
         // nomes das imagens esperadas
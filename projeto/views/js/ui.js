@@ -813,8 +813,8 @@
                     modelCard.innerHTML = `
                         <div class="model-name-label">Modelo: <strong>${prediction.name}</strong></div>
                         <div class="card image-card">
-                            <img src="${prediction.url}" alt="Predição de ${prediction.name} para ${imageKey}" 
-                                onclick="UI.openImageModal(this.src, this.alt)"/>
+                            <img src="${prediction.url}${prediction.url.includes('?') ? '&' : '?'}w=640" loading="lazy" data-full="${prediction.url}" alt="Predição de ${prediction.name} para ${imageKey}" 
+                                onclick="UI.openImageModal(this.dataset.full, this.alt)"/>
                         </div>
                     `;
                     comparisonGrid.appendChild(modelCard);
@@ -1168,8 +1168,35 @@
 
                             showLog(`[UI] Upload local: ${files.length} arquivos selecionados, ${count} imagens detectadas. Dataset temporário: ${dsName}`);
 
+                            // Upload em blocos: retomável e pula arquivos que já estão no servidor
+                            if (window.API && typeof window.API.uploadDatasetChunked === 'function') {
+                                try {
+                                    showLog('[UI] Enviando upload para servidor (em blocos)...');
+                                    let lastLogged = 0;
+                                    const res = await window.API.uploadDatasetChunked(imageFiles, dsName, {
+                                        // imagens com o mesmo conteúdo de uma já enviada não entram de novo no dataset
+                                        dedup: 'sha256',
+                                        onProgress: (p) => {
+                                            if (p.done === p.total || p.done - lastLogged >= 100) {
+                                                lastLogged = p.done;
+                                                showLog(`[API] Upload: ${p.done}/${p.total} arquivos`);
+                                            }
+                                        }
+                                    });
+                                    if (res.errors.length) {
+                                        showLog(`[API] Upload com ${res.errors.length} falha(s); selecione a pasta de novo para retomar.`);
+                                    } else {
+                                        showLog(`[API] Upload concluído com sucesso (${res.saved} enviados, ${res.skipped} já existentes).`);
+                                    }
+                                    try { await loadDatasetsIntoSelect(); } catch (e) { /* ignore */ }
+                                    try { await updatePositiveCountForSelected(); } catch (e) { /* ignore */ }
+                                } catch (e) {
+                                    console.error('Erro durante upload via API', e);
+                                    showLog('[API] Erro no upload do dataset para o servidor.');
+                                }
+                            }
                             // Se houver API de upload, envie os arquivos (opcional)
-                            if (window.API && typeof window.API.uploadDataset === 'function') {
+                            else if (window.API && typeof window.API.uploadDataset === 'function') {
                                 try {
                                     const fd = new FormData();
                                     // Use webkitRelativePath when available to preserve folder structure inside the selected folder
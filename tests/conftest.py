@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# os testes importam projeto.app.routes.* a partir da raiz do repositório
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
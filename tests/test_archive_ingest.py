@@ -0,0 +1,79 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from projeto.app.routes import archive_ingest
+from projeto.app.routes.archive_ingest import ingest_archive
+from projeto.app.routes.chunked_upload import UploadError
+
+
+def _zip(entries):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _files(root):
+    return sorted(p.relative_to(root).as_posix() for p in root.rglob("*") if p.is_file())
+
+
+def test_zip_slip_paths_stay_inside_the_dataset(tmp_path):
+    base = tmp_path / "uploads"
+    data = _zip([("../../evil.jpg", b"a"), ("/abs/evil2.jpg", b"b"), ("ok/1.jpg", b"c"), ("notes.txt", b"d")])
+
+    result = ingest_archive(io.BytesIO(data), "ds.zip", str(base), "ds")
+
+    assert result["extracted"] == 3
+    assert result["skipped_non_images"] == 1
+    assert not (tmp_path / "evil.jpg").exists()
+    assert all(path.startswith("ds/") for path in _files(base))
+
+
+def test_tar_links_are_rejected(tmp_path):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        info = tarfile.TarInfo("x/1.jpg")
+        info.size = 3
+        tar.addfile(info, io.BytesIO(b"abc"))
+        link = tarfile.TarInfo("x/link.jpg")
+        link.type = tarfile.SYMTYPE
+        link.linkname = "/etc/passwd"
+        tar.addfile(link)
+
+    result = ingest_archive(io.BytesIO(buffer.getvalue()), "ds.tar", str(tmp_path), "ds")
+
+    assert result["extracted"] == 1
+    assert [r["file"] for r in result["rejected"]] == ["x/link.jpg"]
+    assert _files(tmp_path) == ["ds/x/1.jpg"]
+
+
+def test_size_limit_leaves_nothing_behind(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_ingest, "MAX_EXTRACTED_BYTES", 250)
+    data = _zip([("a/1.jpg", b"x" * 100), ("a/2.jpg", b"y" * 100), ("a/3.jpg", b"z" * 100)])
+
+    with pytest.raises(UploadError) as excinfo:
+        ingest_archive(io.BytesIO(data), "ds.zip", str(tmp_path), "ds")
+
+    assert excinfo.value.status == 413
+    assert _files(tmp_path) == []
+
+
+def test_corrupt_member_leaves_nothing_behind(tmp_path):
+    data = _zip([("a/1.jpg", b"x" * 100), ("a/2.jpg", b"z" * 100)])
+    at = data.rfind(b"z" * 100)
+    corrupt = data[:at] + b"Z" + data[at + 1:]
+
+    with pytest.raises(UploadError):
+        ingest_archive(io.BytesIO(corrupt), "ds.zip", str(tmp_path), "ds")
+
+    assert _files(tmp_path) == []
+
+
+def test_unknown_format_is_415(tmp_path):
+    with pytest.raises(UploadError) as excinfo:
+        ingest_archive(io.BytesIO(b"not an archive"), "ds.rar", str(tmp_path), "ds")
+    assert excinfo.value.status == 415
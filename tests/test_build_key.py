@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from projeto.app.routes.dataset_build import compute_build_key
+from projeto.app.routes.training import _dataset_build_key
+
+
+BASE_CONFIG = {"train_percent": 70, "val_percent": 20, "test_percent": 10, "random_split": True}
+
+
+@pytest.fixture
+def images(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"img{i}.jpg"
+        path.write_bytes(bytes([i]) * 32)
+        paths.append(path)
+    return paths
+
+
+def _key(images, seed=1, **config):
+    return _dataset_build_key(dict(BASE_CONFIG, **config), "UPLOAD", images, [], seed)
+
+
+def test_compute_build_key_ignores_dict_order():
+    a = compute_build_key({"config": {"x": 1, "y": 2}, "seed": 3})
+    b = compute_build_key({"seed": 3, "config": {"y": 2, "x": 1}})
+    assert a == b
+
+
+def test_same_inputs_give_the_same_key(images):
+    assert _key(images) == _key(list(images))
+
+
+def test_key_changes_with_split_seed_and_images(images):
+    key = _key(images)
+    assert _key(images, train_percent=60, val_percent=30) != key
+    assert _key(images, seed=2) != key
+    assert _key(images[:2]) != key
+
+    st = images[0].stat()
+    os.utime(images[0], ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert _key(images) != key
+
+
+def test_options_that_do_not_change_content_are_ignored(images):
+    key = _key(images)
+    assert _key(images, materialize_mode="hardlink", materialize_workers=8, max_files_per_sec=10) == key
+
+
+def test_dedup_is_keyed_by_normalized_mode(images):
+    assert _key(images) == _key(images, dedup=None) == _key(images, dedup="off") == _key(images, dedup=False)
+    assert _key(images, dedup=True) == _key(images, dedup="sha256")
+    assert _key(images, dedup="sha256") != _key(images, dedup="off")
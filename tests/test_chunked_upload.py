@@ -0,0 +1,95 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from projeto.app.routes.chunked_upload import UploadError, PART_SUFFIX, file_state, upload_target, write_chunk
+from projeto.app.routes.content_hash import DuplicateIndex, HashCache, admit_incoming
+
+
+DATA = bytes(range(256)) * 40
+SHA = hashlib.sha256(DATA).hexdigest()
+
+
+def _send(target, chunks, sha256=SHA, admit=None):
+    offset, status = 0, None
+    for chunk in chunks:
+        status, offset = write_chunk(target, offset, len(DATA), io.BytesIO(chunk), sha256, admit=admit)
+    return status, offset
+
+
+def _split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_chunks_are_reassembled_into_the_target(tmp_path):
+    target = upload_target(str(tmp_path), "ds", "pasta/img.jpg")
+
+    status, offset = _send(target, _split(DATA, 1000))
+
+    assert (status, offset) == ("complete", len(DATA))
+    with open(target, "rb") as f:
+        assert f.read() == DATA
+    assert not os.path.exists(target + PART_SUFFIX)
+    assert file_state(target, len(DATA), SHA) == ("complete", len(DATA))
+
+
+def test_resume_from_partial_offset(tmp_path):
+    target = upload_target(str(tmp_path), "ds", "img.jpg")
+    assert write_chunk(target, 0, len(DATA), io.BytesIO(DATA[:4096]), SHA) == ("partial", 4096)
+    assert file_state(target, len(DATA), SHA) == ("partial", 4096)
+
+    assert write_chunk(target, 4096, len(DATA), io.BytesIO(DATA[4096:]), SHA) == ("complete", len(DATA))
+    with open(target, "rb") as f:
+        assert f.read() == DATA
+
+
+def test_out_of_order_chunk_is_409_with_expected_offset(tmp_path):
+    target = upload_target(str(tmp_path), "ds", "img.jpg")
+    write_chunk(target, 0, len(DATA), io.BytesIO(DATA[:1000]))
+
+    with pytest.raises(UploadError) as excinfo:
+        write_chunk(target, 3000, len(DATA), io.BytesIO(DATA[3000:4000]))
+    assert excinfo.value.status == 409
+    assert excinfo.value.extra["offset"] == 1000
+
+
+def test_checksum_mismatch_discards_the_part(tmp_path):
+    target = upload_target(str(tmp_path), "ds", "img.jpg")
+
+    with pytest.raises(UploadError) as excinfo:
+        _send(target, _split(DATA, 5000), sha256="0" * 64)
+
+    assert excinfo.value.status == 422
+    assert not os.path.exists(target) and not os.path.exists(target + PART_SUFFIX)
+
+
+def test_chunk_past_declared_size_is_rejected(tmp_path):
+    target = upload_target(str(tmp_path), "ds", "img.jpg")
+    with pytest.raises(UploadError):
+        write_chunk(target, 0, 10, io.BytesIO(b"x" * 11))
+    assert os.path.getsize(target + PART_SUFFIX) == 0
+
+
+def test_upload_target_drops_traversal(tmp_path):
+    target = upload_target(str(tmp_path), "ds", "../../etc/img.jpg")
+    assert os.path.commonpath([target, str(tmp_path)]) == str(tmp_path)
+    assert target.endswith(os.path.join("ds", "etc", "img.jpg"))
+
+
+def test_duplicate_content_is_not_admitted(tmp_path):
+    root = tmp_path / "ds"
+    index = DuplicateIndex("sha256")
+    cache = HashCache(tmp_path / "hashes.sqlite")
+
+    def admit(part, final, sha256):
+        return admit_incoming(index, str(root), part, final, sha256, cache=cache)
+
+    first = upload_target(str(tmp_path), "ds", "a/1.jpg")
+    second = upload_target(str(tmp_path), "ds", "b/2.jpg")
+    assert _send(first, _split(DATA, 4000), admit=admit)[0] == "complete"
+    assert _send(second, _split(DATA, 4000), admit=admit)[0] == "duplicate"
+
+    assert os.path.exists(first)
+    assert not os.path.exists(second) and not os.path.exists(second + PART_SUFFIX)
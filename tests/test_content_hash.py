@@ -0,0 +1,46 @@
+import pytest
+
+from projeto.app.routes.content_hash import DuplicateIndex
+
+
+def _flip(value, bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+BASE = 0x0123456789ABCDEF
+
+
+def test_sha256_mode_matches_exact_content_only():
+    index = DuplicateIndex("sha256")
+    assert index.check_add("a.jpg", "h1", BASE) is None
+    assert index.check_add("b.jpg", "h1", BASE) == "a.jpg"
+    # dhash parecido não conta fora do modo phash
+    assert index.check_add("c.jpg", "h2", BASE) is None
+
+
+@pytest.mark.parametrize("bits", [[0], [3, 40], [1, 17, 33, 63]])
+def test_phash_bands_find_near_duplicates(bits):
+    index = DuplicateIndex("phash", max_distance=4)
+    index.add("a.jpg", "h1", BASE)
+    assert index.find("other", _flip(BASE, bits)) == "a.jpg"
+
+
+def test_phash_ignores_images_beyond_max_distance():
+    index = DuplicateIndex("phash", max_distance=4)
+    index.add("a.jpg", "h1", BASE)
+    assert index.find("other", _flip(BASE, [0, 9, 18, 27, 36])) is None
+
+
+def test_off_mode_never_reports_duplicates():
+    index = DuplicateIndex("off")
+    index.add("a.jpg", "h1")
+    assert index.find("h1") is None
+
+
+def test_discard_forgets_the_key():
+    index = DuplicateIndex("phash", max_distance=2)
+    index.add("a.jpg", "h1", BASE)
+    index.discard("a.jpg")
+    assert index.find("h1", BASE) is None
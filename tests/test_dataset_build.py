@@ -0,0 +1,45 @@
+import errno
+
+from projeto.app.routes import dataset_build
+from projeto.app.routes.dataset_build import Materializer
+
+
+def _source(tmp_path, name="src.jpg"):
+    path = tmp_path / name
+    path.write_bytes(b"image-bytes")
+    return path
+
+
+def test_capability_error_falls_back_and_leaves_the_chain(tmp_path, monkeypatch):
+    def cross_device(src, dst):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setitem(dataset_build._STRATEGIES, "hardlink", cross_device)
+    materializer = Materializer("hardlink")
+    src = _source(tmp_path)
+
+    assert materializer.place(src, tmp_path / "a.jpg") == "copy"
+    assert materializer.chain == ["copy"]
+    assert (tmp_path / "a.jpg").read_bytes() == b"image-bytes"
+    assert materializer.errors == 0
+
+
+def test_per_file_error_is_reported_without_dropping_the_strategy(tmp_path):
+    materializer = Materializer("hardlink")
+
+    materializer.place_many([(tmp_path / "missing.jpg", tmp_path / "out.jpg")], workers=1)
+
+    assert materializer.chain == ["hardlink", "copy"]
+    assert materializer.errors == 1
+    report = materializer.report()
+    assert report["errors"] == 1 and report["failures"][0]["src"].endswith("missing.jpg")
+
+
+def test_place_many_materializes_every_file(tmp_path):
+    sources = [_source(tmp_path, f"s{i}.jpg") for i in range(5)]
+    out = tmp_path / "out"
+    out.mkdir()
+
+    Materializer("copy").place_many([(s, out / s.name) for s in sources], workers=2)
+
+    assert sorted(p.name for p in out.iterdir()) == [s.name for s in sources]
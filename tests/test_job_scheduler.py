@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+
+import pytest
+
+from projeto.app.routes.job_scheduler import (
+    JobScheduler, QUEUED, RUNNING, CANCELLED, ACTIVE_STATES, parse_priority, safe_job_id,
+)
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def blocking_scheduler(tmp_path):
+    """
+    Scheduler com uma vaga e um runner que fica "rodando" até o teste liberar.
+    """
+    release = threading.Event()
+    started = []
+
+    def runner(job_id):
+        started.append(job_id)
+        scheduler.update(job_id, status=RUNNING)
+        release.wait(10)
+        scheduler.update(job_id, status="complete")
+
+    scheduler = JobScheduler(jobs_dir=tmp_path / "jobs", runner=runner, max_concurrent=1)
+    yield scheduler, started
+    release.set()
+
+
+def test_submit_persists_job_record(blocking_scheduler):
+    scheduler, started = blocking_scheduler
+    scheduler.submit("first", priority=0, payload={"dataset": "X"})
+    assert _wait_for(lambda: started == ["first"])
+
+    with open(scheduler.jobs_dir / "first.json", encoding="utf-8") as f:
+        record = json.load(f)
+    assert record["job_id"] == "first"
+    assert record["payload"] == {"dataset": "X"}
+    assert record["status"] in ACTIVE_STATES
+
+
+def test_priority_orders_the_queue(blocking_scheduler):
+    scheduler, started = blocking_scheduler
+    scheduler.submit("running")
+    assert _wait_for(lambda: started == ["running"])
+    scheduler.submit("low", priority=0)
+    scheduler.submit("high", priority="5")
+
+    assert scheduler.queue_position("high") == 1
+    assert scheduler.queue_position("low") == 2
+
+
+def test_cancel_queued_job(blocking_scheduler):
+    scheduler, started = blocking_scheduler
+    scheduler.submit("running")
+    assert _wait_for(lambda: started == ["running"])
+    scheduler.submit("waiting")
+
+    assert scheduler.cancel("waiting") == CANCELLED
+    job = scheduler.get("waiting")
+    assert job["status"] == CANCELLED and job["finished_at"] is not None
+    assert scheduler.queue_position("waiting") is None
+    assert json.loads((scheduler.jobs_dir / "waiting.json").read_text(encoding="utf-8"))["status"] == CANCELLED
+    # já encerrado: nada a cancelar
+    assert scheduler.cancel("waiting") is None
+
+
+def test_restart_requeues_interrupted_and_queued_jobs(blocking_scheduler):
+    scheduler, started = blocking_scheduler
+    scheduler.submit("interrupted")
+    assert _wait_for(lambda: scheduler.get("interrupted")["status"] == RUNNING)
+    scheduler.submit("pending")
+
+    # outro processo (servidor reiniciado) lendo a mesma pasta de jobs
+    restarted = JobScheduler(jobs_dir=scheduler.jobs_dir, runner=lambda job_id: None, max_concurrent=1)
+    restarted._load()
+
+    interrupted = restarted.get("interrupted")
+    assert interrupted["status"] == QUEUED
+    assert interrupted["restarts"] == 1
+    assert interrupted["pid"] is None
+    assert restarted.get("pending")["status"] == QUEUED
+    assert {restarted.queue_position("interrupted"), restarted.queue_position("pending")} == {1, 2}
+
+
+def test_unique_job_id_is_sanitized_and_stays_in_jobs_dir(tmp_path):
+    scheduler = JobScheduler(jobs_dir=tmp_path / "jobs", runner=lambda job_id: None, max_concurrent=1)
+    job_id = scheduler.unique_job_id("../../escape")
+    assert "/" not in job_id and not job_id.startswith(".")
+    assert scheduler._job_file(job_id).parent == scheduler.jobs_dir
+    with pytest.raises(ValueError):
+        scheduler._job_file("../escape")
+    assert safe_job_id("exp 1/a") == "exp_1_a"
+
+
+def test_load_ignores_records_with_unsafe_ids(tmp_path):
+    jobs_dir = tmp_path / "jobs"
+    jobs_dir.mkdir()
+    (jobs_dir / "evil.json").write_text(json.dumps({"job_id": "../../evil", "status": QUEUED}), encoding="utf-8")
+    scheduler = JobScheduler(jobs_dir=jobs_dir, runner=lambda job_id: None, max_concurrent=1)
+    scheduler._load()
+    assert scheduler.jobs == {}
+
+
+@pytest.mark.parametrize("value, expected", [(None, 0), ("", 0), ("3", 3), (2, 2), (-1, -1)])
+def test_parse_priority_accepts_integers(value, expected):
+    assert parse_priority(value) == expected
+
+
+@pytest.mark.parametrize("value", ["high", 1.5, True, [1]])
+def test_parse_priority_rejects_non_integers(value):
+    with pytest.raises(ValueError):
+        parse_priority(value)
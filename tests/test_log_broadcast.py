@@ -0,0 +1,42 @@
+import os
+
+from projeto.app.routes.log_broadcast import LogBroadcaster
+
+
+def _drain(broadcaster, after):
+    return [item for item in broadcaster.follow(after=after, keepalive=0.01) if item is not None]
+
+
+def test_resume_after_last_event_id(tmp_path):
+    broadcaster = LogBroadcaster(tmp_path / "job.log", capacity=100)
+    for i in range(5):
+        broadcaster.write(f"line {i}")
+    broadcaster.close()
+
+    assert _drain(broadcaster, after=3) == [(4, "line 3"), (5, "line 4")]
+    assert len(_drain(broadcaster, after=0)) == 5
+    assert (tmp_path / "job.log").read_text(encoding="utf-8").splitlines() == [f"line {i}" for i in range(5)]
+
+
+def test_ring_buffer_keeps_only_the_latest_lines(tmp_path):
+    broadcaster = LogBroadcaster(tmp_path / "job.log", capacity=3)
+    for i in range(10):
+        broadcaster.write(f"line {i}")
+    broadcaster.close()
+
+    # cliente muito atrasado recebe o que ainda está no buffer, sem repetir nem travar
+    assert _drain(broadcaster, after=2) == [(8, "line 7"), (9, "line 8"), (10, "line 9")]
+
+
+def test_pump_splits_carriage_returns_and_reports_lines(tmp_path):
+    broadcaster = LogBroadcaster(tmp_path / "job.log")
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, b"epoch 1\r\nbar 10%\rbar 20%\nLogging results to runs/x")
+    os.close(write_fd)
+    seen = []
+    with os.fdopen(read_fd, "rb") as stream:
+        broadcaster.pump(stream, on_line=seen.append)
+    broadcaster.close()
+
+    assert seen == ["epoch 1", "bar 10%", "bar 20%", "Logging results to runs/x"]
+    assert [line for _, line in _drain(broadcaster, after=0)] == seen